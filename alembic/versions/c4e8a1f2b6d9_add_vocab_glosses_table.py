@@ -0,0 +1,36 @@
+"""add vocab glosses table
+
+Revision ID: c4e8a1f2b6d9
+Revises: 8c2a1d4b7f90, 9a7b6c5d4e3f
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+# 同时合并 vocabulary_entries 与 notifications 两个分支，之后 `alembic upgrade head` 只有一个 head
+revision = 'c4e8a1f2b6d9'
+down_revision = ('8c2a1d4b7f90', '9a7b6c5d4e3f')
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vocab_glosses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('word', sa.String(length=255), nullable=False),
+        sa.Column('reading', sa.String(length=255), nullable=False),
+        sa.Column('meaning', sa.Text(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=False, server_default='llm'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('word', 'reading', name='uq_vocab_glosses_word_reading'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('vocab_glosses')
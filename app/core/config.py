@@ -19,10 +19,61 @@ class Settings:
     FURIGANA_MODE = os.getenv("FURIGANA_MODE", "hybrid")
     FURIGANA_LEVEL_FILTER = os.getenv("FURIGANA_LEVEL_FILTER", "1")
 
+    # 日志：LOG_FORMAT=text | json；DEBUG 级别高频日志按 LOG_DEBUG_SAMPLE_RATE 抽样（0~1）
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+    # Tracing：none（默认 no-op）| file（JSON Lines 写到 TRACING_FILE_PATH）| otlp（需 opentelemetry-sdk）
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+    TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "/tmp/yomu-traces.jsonl")
+    OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "yomutomo")
+
     # AI 请求层超时与重试配置
     AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "60"))
     AI_REQUEST_RETRIES = int(os.getenv("AI_REQUEST_RETRIES", "2"))
     AI_REQUEST_RETRY_DELAY_SECONDS = float(os.getenv("AI_REQUEST_RETRY_DELAY_SECONDS", "1"))
+    # 构造路径 404、fallback 成功后记住该 provider 直接走 fallback 的时长（秒）；0 = 不记忆
+    AI_ENDPOINT_MEMO_TTL_SECONDS = float(os.getenv("AI_ENDPOINT_MEMO_TTL_SECONDS", "3600"))
+    # 记忆的 fallback 连续失败多少次后作废、重新探测（404 立即作废）
+    AI_ENDPOINT_MEMO_MAX_FAILURES = int(os.getenv("AI_ENDPOINT_MEMO_MAX_FAILURES", "3"))
+    # AI 配置校验（"Hello" 探测）成功后的缓存时长（秒）；遇到 401/403 立即作废；0 = 每次都探测
+    AI_CONFIG_VALIDATION_TTL_SECONDS = float(os.getenv("AI_CONFIG_VALIDATION_TTL_SECONDS", "1800"))
+    # 文章生成各子任务的时限（秒），超时的请求会被取消；title / emoji 超时降级为本地结果
+    AI_SUBTASK_DEADLINES = os.getenv("AI_SUBTASK_DEADLINES", "ruby=180,vocab=120,translation=90,title=20,emoji=10")
+    # 对冲请求：同一 provider/model/子任务 的请求超过近期 p95 仍未返回时再发一份，取先返回的
+    AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() == "true"
+    # 至少积累这么多次成功耗时后才开始对冲
+    AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+    # 额外的 AI provider（JSON 列表，每项 name / api_url / api_key 或 api_key_env / model / weight）
+    AI_PROVIDERS = os.getenv("AI_PROVIDERS", "")
+    # 子任务 → provider 候选链，如 "emoji=cheap,title=cheap,vocab=cheap,translation=strong|user"；
+    # 用户自己的配置叫 user，总是最后兜底
+    AI_SUBTASK_ROUTES = os.getenv("AI_SUBTASK_ROUTES", "")
+    # provider 连续失败多少次进入冷却、冷却多久（秒）
+    AI_PROVIDER_FAILURE_THRESHOLD = int(os.getenv("AI_PROVIDER_FAILURE_THRESHOLD", "3"))
+    AI_PROVIDER_COOLDOWN_SECONDS = float(os.getenv("AI_PROVIDER_COOLDOWN_SECONDS", "60"))
+    # 前缀缓存提示：auto（按 host 判断）| openai（prompt_cache_key）| anthropic（cache_control）| off
+    AI_PROMPT_CACHE_HINTS = os.getenv("AI_PROMPT_CACHE_HINTS", "auto")
+    # 标题 / emoji：llm（默认，各调一次模型）| local（译文首句 / 关键名词 + 关键词表，不调模型）
+    AI_TITLE_EMOJI_MODE = os.getenv("AI_TITLE_EMOJI_MODE", "llm")
+    # local 模式下本地取不到结果时是否再调模型
+    AI_TITLE_EMOJI_LLM_FALLBACK = os.getenv("AI_TITLE_EMOJI_LLM_FALLBACK", "false").lower() == "true"
+    # 生词表：llm（默认，整篇交给模型挑词）| local（本地分词按等级选词，只用一次模型批量补释义；
+    # 内置汉字表只覆盖常用字，等级区分度有限，接入完整 JLPT 词表前保持可选）
+    AI_VOCAB_MODE = os.getenv("AI_VOCAB_MODE", "llm")
+    # 生词释义共享表（vocab_glosses，按 词 + 读音 跨用户复用，llm / local 两种模式都用）；关掉后每次都问模型
+    VOCAB_GLOSS_CACHE_ENABLED = os.getenv("VOCAB_GLOSS_CACHE_ENABLED", "true").lower() == "true"
+    # 共享表里模型给的释义多少天后视为过期：查询时当作未命中，重新问到的释义覆盖旧的；0 表示不过期
+    VOCAB_GLOSS_TTL_DAYS = int(os.getenv("VOCAB_GLOSS_TTL_DAYS", "90"))
+    # 可选的离线释义词典（TSV：词<TAB>读音<TAB>中文释义），优先于数据库
+    VOCAB_GLOSS_DATASET = os.getenv("VOCAB_GLOSS_DATASET", "")
+    # 抓取文章的按等级简化：原文汉字至少这个比例落在用户等级的常用表内时跳过简化（表只到 N3，N2 / N1 按 N3 算）
+    SIMPLIFY_SKIP_ENABLED = os.getenv("SIMPLIFY_SKIP_ENABLED", "true").lower() == "true"
+    SIMPLIFY_SKIP_COVERAGE = float(os.getenv("SIMPLIFY_SKIP_COVERAGE", "0.95"))
+    # 简化结果缓存（按 源地址 + 正文哈希 + 等级 + 模型），多个同等级用户抓同一条目时复用
+    SIMPLIFY_CACHE_MAX_ENTRIES = int(os.getenv("SIMPLIFY_CACHE_MAX_ENTRIES", "512"))
+    SIMPLIFY_CACHE_TTL_SECONDS = float(os.getenv("SIMPLIFY_CACHE_TTL_SECONDS", "86400"))
 
     # TTS (MeloTTS) 配置
     # device: auto | cpu | cuda | mps。auto 时 MeloTTS 自己探测
@@ -33,6 +84,33 @@ class Settings:
     TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/app/static/audio_cache")
     # 启动时是否预热模型（False 则懒加载；首次 /api/tts 请求会慢 30-60s）
     TTS_PRELOAD_ON_STARTUP = os.getenv("TTS_PRELOAD_ON_STARTUP", "false").lower() == "true"
+    # 缓存容量上限（字节），超出按 LRU 淘汰；0 = 不限
+    TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+    # 缓存索引（SQLite）位置，默认放在 TTS_CACHE_DIR 下
+    TTS_CACHE_INDEX_PATH = os.getenv("TTS_CACHE_INDEX_PATH", "")
+    # 最近这么多秒内访问过的文件不淘汰（可能正在拼接 / 流式读取）
+    TTS_CACHE_MIN_AGE_SECONDS = float(os.getenv("TTS_CACHE_MIN_AGE_SECONDS", "60"))
+    # 缓存命中的 last_access 先记在内存，每隔这么多秒批量写回索引
+    TTS_CACHE_ACCESS_FLUSH_SECONDS = float(os.getenv("TTS_CACHE_ACCESS_FLUSH_SECONDS", "30"))
+    # 推理池：0 = 进程内单线程（共享 _infer_lock）；N = N 个子进程各持一份模型
+    TTS_WORKERS = int(os.getenv("TTS_WORKERS", "0"))
+    # 每个 worker 的 torch 线程数；0 = cpu 核数 / worker 数
+    TTS_WORKER_TORCH_THREADS = int(os.getenv("TTS_WORKER_TORCH_THREADS", "0"))
+    # 除正在执行的任务外最多排队多少个，超出返回 429
+    TTS_QUEUE_SIZE = int(os.getenv("TTS_QUEUE_SIZE", "16"))
+    # Retry-After 的初始估算（秒），之后按实际推理耗时滑动更新
+    TTS_RETRY_AFTER_SECONDS = float(os.getenv("TTS_RETRY_AFTER_SECONDS", "2"))
+    # 压缩格式码率（ffmpeg -b:a）；语音单声道 32k Opus / 64k MP3 已足够清晰
+    TTS_OPUS_BITRATE = os.getenv("TTS_OPUS_BITRATE", "32k")
+    TTS_MP3_BITRATE = os.getenv("TTS_MP3_BITRATE", "64k")
+    # 文章保存后在后台按句预合成（默认语速），首次播放直接命中缓存；只在推理池空闲时运行
+    TTS_PRESYNTH_ENABLED = os.getenv("TTS_PRESYNTH_ENABLED", "false").lower() == "true"
+    # 每篇文章最多预合成的句数，以及全局待合成句子上限（超出的丢弃）
+    TTS_PRESYNTH_MAX_SENTENCES = int(os.getenv("TTS_PRESYNTH_MAX_SENTENCES", "200"))
+    TTS_PRESYNTH_QUEUE_SIZE = int(os.getenv("TTS_PRESYNTH_QUEUE_SIZE", "2000"))
+    # 句级推理微批：最多攒多少句 / 等多久（毫秒）；<= 1 = 不攒批，逐句推理
+    TTS_BATCH_MAX_SIZE = int(os.getenv("TTS_BATCH_MAX_SIZE", "1"))
+    TTS_BATCH_MAX_WAIT_MS = float(os.getenv("TTS_BATCH_MAX_WAIT_MS", "20"))
 
 
 settings = Settings()
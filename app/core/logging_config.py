@@ -0,0 +1,164 @@
+"""
+日志配置
+
+设计要点：
+- 非阻塞：业务线程 / 事件循环只把 LogRecord 放进内存队列（QueueHandler），
+  时间戳格式化、JSON 序列化和 stdout 写入都在 QueueListener 的后台线程完成
+- 结构化：LOG_FORMAT=json 时每行一个 JSON 对象，带 request_id / task_id；
+  默认 text 格式与旧 log_with_time 输出保持一致（北京时间）
+- 采样：DEBUG 级别的高频日志（每次 AI 调用、缓存命中等）按 LOG_DEBUG_SAMPLE_RATE 抽样
+- request_id / task_id 走 contextvars，跨线程时需要用 contextvars.copy_context() 传递
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from app.core.config import settings
+from app.utils.time import BEIJING
+
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+task_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("task_id", default=None)
+
+_LEVEL_NAMES = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+_listener: QueueListener | None = None
+
+
+def level_from_name(level: str | int | None) -> int:
+    """兼容旧代码里 "INFO" / "warn" / "ERROR" 这类字符串级别。"""
+    if isinstance(level, int):
+        return level
+    return _LEVEL_NAMES.get(str(level or "INFO").upper(), logging.INFO)
+
+
+class _ContextFilter(logging.Filter):
+    """在调用方线程把 contextvars 里的 ID 固化到 record 上（listener 线程拿不到上下文）。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.task_id = task_id_var.get()
+        return True
+
+
+class _DebugSampler(logging.Filter):
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = max(0.0, min(rate, 1.0))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _LightQueueHandler(QueueHandler):
+    """只合并 msg/args 与异常文本，不在调用方线程跑完整 Formatter。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """每次写入时取当前 sys.stdout（与 logging.lastResort 同样做法），stdout 被替换后也不会写到失效流。"""
+
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        logging.Handler.__init__(self, level)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+class BeijingTextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("[%(asctime)s] [%(levelname)s] %(message)s")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        return datetime.fromtimestamp(record.created, BEIJING).strftime("%Y-%m-%d %H:%M:%S")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        ids = [
+            f"{name}={value}"
+            for name, value in (("rid", getattr(record, "request_id", None)), ("task", getattr(record, "task_id", None)))
+            if value
+        ]
+        return f"{text} [{' '.join(ids)}]" if ids else text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, BEIJING).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key in ("request_id", "task_id"):
+            value = getattr(record, key, None)
+            if value:
+                payload[key] = value
+        exc_text = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc_text:
+            payload["exc"] = exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def configure_logging() -> None:
+    """给 root logger 挂 QueueHandler 并启动后台 listener。重复调用无副作用。"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _LightQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    queue_handler.addFilter(_DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE))
+
+    stream_handler = _StdoutHandler()
+    if settings.LOG_FORMAT.lower() == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(BeijingTextFormatter())
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level_from_name(settings.LOG_LEVEL))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """停止 listener 并刷完队列里剩余的日志。"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
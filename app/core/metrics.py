@@ -0,0 +1,228 @@
+"""
+Prometheus 指标
+
+设计要点：
+- 软依赖：prometheus_client 未安装时所有指标退化为 no-op，/metrics 返回 503，
+  业务代码不需要判断
+- 多 worker：设置 PROMETHEUS_MULTIPROC_DIR（必须在进程启动前设置，且每次部署前清空）
+  后 prometheus_client 会把样本写到共享目录，/metrics 汇总所有 worker 的数据
+- 标签只用低基数值（subtask / provider / status / 路由模板），不要塞 URL 或用户 ID
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import prometheus_client as _prom
+    from prometheus_client import multiprocess as _prom_multiprocess
+except Exception:  # noqa: BLE001 - import-time guard
+    _prom = None
+    _prom_multiprocess = None
+
+
+# AI / TTS 都是秒级到分钟级；HTTP 请求里也包含同步生成文章的长请求
+_SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+_HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _NoopMetric:
+    """prometheus_client 缺失时的占位对象，接口与 Histogram/Counter 子集一致。"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, amount: float) -> None:
+        return None
+
+    def inc(self, amount: float = 1) -> None:
+        return None
+
+    def set(self, value: float) -> None:
+        return None
+
+
+def _histogram(name: str, documentation: str, labelnames=(), buckets=_SLOW_BUCKETS):
+    if _prom is None:
+        return _NoopMetric()
+    return _prom.Histogram(name, documentation, labelnames=labelnames, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labelnames=()):
+    if _prom is None:
+        return _NoopMetric()
+    return _prom.Counter(name, documentation, labelnames=labelnames)
+
+
+def _gauge(name: str, documentation: str, labelnames=(), multiprocess_mode: str = "livesum"):
+    if _prom is None:
+        return _NoopMetric()
+    # 多进程模式下默认把各 worker 的值求和；各进程报告同一个全局量时用 max
+    return _prom.Gauge(name, documentation, labelnames=labelnames, multiprocess_mode=multiprocess_mode)
+
+
+# ---- 指标定义 -------------------------------------------------------------
+
+AI_SUBTASK_SECONDS = _histogram(
+    "yomu_ai_subtask_seconds",
+    "generate_all_content 中每个生成子任务的耗时",
+    ["subtask", "outcome"],
+)
+AI_CHAT_SECONDS = _histogram(
+    "yomu_ai_chat_seconds",
+    "AIClient.chat 单次调用耗时（含重试与 404 fallback）",
+    ["provider", "status"],
+)
+AI_ENDPOINT_MEMO_TOTAL = _counter(
+    "yomu_ai_endpoint_memo_total",
+    "AI 端点记忆事件（result=learned / hit / expired / invalidated）",
+    ["provider", "result"],
+)
+AI_CONFIG_VALIDATION_TOTAL = _counter(
+    "yomu_ai_config_validation_total",
+    "AI 配置校验次数（result=probed 实际探测 / cached 命中缓存 / invalidated 因 401/403 作废）",
+    ["result"],
+)
+AI_HEDGE_TOTAL = _counter(
+    "yomu_ai_hedge_total",
+    "AI 对冲请求（result=sent 已发出 / hedge_won 对冲先返回 / primary_won 原请求先返回）",
+    ["provider", "result"],
+)
+AI_SUBTASK_DEGRADED_TOTAL = _counter(
+    "yomu_ai_subtask_degraded_total",
+    "AI 子任务失败或超时后改用本地降级结果的次数",
+    ["subtask"],
+)
+AI_ROUTE_TOTAL = _counter(
+    "yomu_ai_route_total",
+    "多 provider 路由下各 provider 的调用结果（provider 为 AI_PROVIDERS 里的名字或 user）",
+    ["provider", "subtask", "result"],
+)
+AI_PROMPT_TOKENS_TOTAL = _counter(
+    "yomu_ai_prompt_tokens_total",
+    "AI 请求的输入 token 数（kind=prompt 全部 / cached 命中 provider 前缀缓存）",
+    ["provider", "kind"],
+)
+AI_LOCAL_CONTENT_TOTAL = _counter(
+    "yomu_ai_local_content_total",
+    "本地模式下标题 / emoji 的来源（source=translation / nouns / keywords / llm / default）",
+    ["subtask", "source"],
+)
+AI_VOCAB_WORDS_TOTAL = _counter(
+    "yomu_ai_vocab_words_total",
+    "各生词释义的来源（source=dataset 离线词典 / gloss 共享释义表 / llm 模型给出 / missing 占位）",
+    ["source"],
+)
+AI_SIMPLIFY_TOTAL = _counter(
+    "yomu_ai_simplify_total",
+    "抓取文章按等级简化的结果（result=skipped 原文已够简单 / cache_hit / generated / failed 回退原文）",
+    ["result"],
+)
+TTS_SYNTH_SECONDS = _histogram(
+    "yomu_tts_synthesize_seconds",
+    "MeloTTS 推理耗时（不含锁等待）",
+    ["language"],
+)
+TTS_INFER_LOCK_WAIT_SECONDS = _histogram(
+    "yomu_tts_infer_lock_wait_seconds",
+    "等待 TTS 推理锁的耗时",
+)
+TTS_CACHE_TOTAL = _counter(
+    "yomu_tts_cache_total",
+    "TTS 磁盘缓存命中/未命中次数（scope=text 整段 / sentence 单句 / encoded 压缩格式）",
+    ["scope", "result"],
+)
+TTS_CACHE_EVICTIONS_TOTAL = _counter(
+    "yomu_tts_cache_evictions_total",
+    "TTS 缓存因超出容量预算被淘汰的文件数",
+)
+TTS_CACHE_BYTES = _gauge(
+    "yomu_tts_cache_bytes",
+    "TTS 缓存索引中登记的总字节数",
+    # 每个进程 set 的都是共享目录的总量，求和会放大 N 倍
+    multiprocess_mode="max",
+)
+TTS_DEDUPED_TOTAL = _counter(
+    "yomu_tts_deduped_total",
+    "与进行中的相同合成合并（singleflight）的请求数",
+)
+TTS_QUEUE_DEPTH = _gauge(
+    "yomu_tts_queue_depth",
+    "TTS 推理池中执行中 + 排队的任务数",
+)
+TTS_REJECTED_TOTAL = _counter(
+    "yomu_tts_rejected_total",
+    "TTS 推理池队列已满被拒绝（429）的请求数",
+)
+TTS_BATCH_SIZE = _histogram(
+    "yomu_tts_batch_size",
+    "TTS 微批每次前向包含的句子数",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+TTS_BATCH_WAIT_SECONDS = _histogram(
+    "yomu_tts_batch_wait_seconds",
+    "句子从进入微批队列到所在批次开始推理的等待时间",
+    buckets=_HTTP_BUCKETS,
+)
+TTS_BATCH_SECONDS = _histogram(
+    "yomu_tts_batch_seconds",
+    "TTS 微批单批推理耗时（含锁等待）",
+)
+TTS_PRESYNTH_TOTAL = _counter(
+    "yomu_tts_presynth_total",
+    "文章预合成的句子数（result=queued / synthesized / cached / dropped / failed）",
+    ["result"],
+)
+TTS_PRESYNTH_PENDING = _gauge(
+    "yomu_tts_presynth_pending",
+    "等待预合成的句子数",
+)
+RSSHUB_FETCH_SECONDS = _histogram(
+    "yomu_rsshub_fetch_seconds",
+    "fetch_rsshub_feed_items 耗时（含重试与 XML fallback）",
+    ["outcome"],
+)
+RSSHUB_ITEMS_TOTAL = _counter(
+    "yomu_rsshub_items_total",
+    "RSSHub 抓取到的条目数",
+)
+HTTP_REQUEST_SECONDS = _histogram(
+    "yomu_http_request_seconds",
+    "HTTP 请求耗时，按路由模板聚合",
+    ["method", "route", "status"],
+    buckets=_HTTP_BUCKETS,
+)
+
+
+# ---- 工具函数 -------------------------------------------------------------
+
+@contextmanager
+def track_duration(metric, **labels) -> Iterator[None]:
+    """记录代码块耗时，自动附加 outcome=ok|error 标签。"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        metric.labels(**labels, outcome=outcome).observe(time.perf_counter() - start)
+
+
+def is_enabled() -> bool:
+    return _prom is not None
+
+
+def render_latest() -> tuple[bytes, str]:
+    """序列化当前指标。多 worker 模式下汇总共享目录中所有进程的样本。"""
+    if _prom is None:
+        raise RuntimeError("prometheus_client 未安装")
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = _prom.CollectorRegistry()
+        _prom_multiprocess.MultiProcessCollector(registry)
+        return _prom.generate_latest(registry), _prom.CONTENT_TYPE_LATEST
+    return _prom.generate_latest(), _prom.CONTENT_TYPE_LATEST
@@ -0,0 +1,217 @@
+"""
+请求级 tracing
+
+设计要点：
+- 默认 no-op（TRACING_EXPORTER=none），span() 只多一次生成器调用，不分配 span 对象
+- TRACING_EXPORTER=file：进程内轻量 span，结束后丢进队列，由后台线程按 JSON Lines
+  写到 TRACING_FILE_PATH；字段命名与 OTLP 一致（trace_id / span_id / parent_span_id /
+  start_time_unix_nano ...），方便离线导入 Jaeger / Tempo 或直接 jq 找关键路径
+- TRACING_EXPORTER=otlp：交给 opentelemetry-sdk + OTLP/HTTP exporter（软依赖，未安装时
+  打 warning 退回 no-op），endpoint 走标准的 OTEL_EXPORTER_OTLP_ENDPOINT
+- 父子关系走 contextvars；跨线程（生成线程池、爬虫后台线程）必须用
+  contextvars.copy_context().run 启动，span 才能挂到发起请求的 trace 下
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_ATTRIBUTE_TYPES = (str, bool, int, float)
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        return None
+
+    def update_name(self, name: str) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """进程内 span，接口取 OpenTelemetry Span 的子集（set_attribute / update_name）。"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, name: str, parent: "_Span | None", attributes: dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.status = "OK"
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = _clean_value(value)
+
+    def update_name(self, name: str) -> None:
+        self.name = name
+
+    def to_dict(self) -> dict[str, Any]:
+        payload = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "thread": threading.current_thread().name,
+        }
+        if self.error:
+            payload["error"] = self.error
+        return payload
+
+
+class _FileExporter:
+    """后台线程批量写 JSON Lines，span 结束时只做一次 queue.put。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: _Span) -> None:
+        self._queue.put(span.to_dict())
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [json.dumps(entry, ensure_ascii=False) for entry in batch if entry is not None]
+            if lines:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as fh:
+                        fh.write("\n".join(lines) + "\n")
+                except OSError as exc:
+                    logger.warning("写入 trace 文件失败 path=%s: %s", self.path, exc)
+            if stop:
+                return
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_current_span: contextvars.ContextVar[_Span | None] = contextvars.ContextVar("current_span", default=None)
+_exporter: _FileExporter | None = None
+_otel_tracer = None
+
+
+def _clean_value(value: Any) -> Any:
+    if value is None or isinstance(value, _ATTRIBUTE_TYPES):
+        return value
+    return str(value)
+
+
+def _clean_attributes(attributes: dict[str, Any]) -> dict[str, Any]:
+    return {key: _clean_value(value) for key, value in attributes.items() if value is not None}
+
+
+def _configure_otlp():
+    from opentelemetry import trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    atexit.register(provider.shutdown)
+    return trace.get_tracer("yomutomo")
+
+
+def configure_tracing(exporter: str | None = None) -> None:
+    """按 TRACING_EXPORTER 选择后端。重复调用会替换之前的配置。"""
+    global _exporter, _otel_tracer
+    mode = (exporter or settings.TRACING_EXPORTER or "none").lower()
+    if _exporter is not None:
+        _exporter.shutdown()
+    _exporter = None
+    _otel_tracer = None
+
+    if mode == "file":
+        _exporter = _FileExporter(settings.TRACING_FILE_PATH)
+        atexit.register(_exporter.shutdown)
+    elif mode == "otlp":
+        try:
+            _otel_tracer = _configure_otlp()
+        except Exception as exc:  # noqa: BLE001 - 软依赖
+            logger.warning("OTLP tracing 不可用（需安装 opentelemetry-sdk / opentelemetry-exporter-otlp）：%s", exc)
+
+
+def is_enabled() -> bool:
+    return _exporter is not None or _otel_tracer is not None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """开启一个子 span；异常会记录到 span 上再原样抛出。"""
+    if _otel_tracer is not None:
+        with _otel_tracer.start_as_current_span(name, attributes=_clean_attributes(attributes)) as otel_span:
+            yield otel_span
+        return
+
+    exporter = _exporter
+    if exporter is None:
+        yield _NOOP_SPAN
+        return
+
+    current = _Span(name, _current_span.get(), _clean_attributes(attributes))
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.status = "ERROR"
+        current.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.export(current)
+
+
+def traced(name: str):
+    """装饰器版本的 span()，用于同步函数。"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
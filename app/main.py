@@ -3,6 +3,7 @@ import asyncio
 import logging
 import os
 import time
+import uuid
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
@@ -13,15 +14,22 @@ from starlette.responses import Response
 
 # 加载环境变量
 load_dotenv()
+from app.core import metrics
 from app.core.config import settings
+from app.core import tracing
+from app.core.logging_config import configure_logging, request_id_var
 from app.db import engine, Base
 from app.routers import pages
 from app.routers import auth
 from app.routers import articles
 from app.routers import evaluation
 from app.routers import notifications
+from app.routers import metrics as metrics_router
 from app.routers import tts as tts_router
 from app.services.notifications import create_notification
+from app.services.tts import reconcile_tts_cache
+from app.services.tts_pool import get_tts_pool, shutdown_tts_pool
+from app.services.tts_presynth import shutdown_tts_presynthesizer
 
 
 class ExtensionCompatibilityMiddleware(BaseHTTPMiddleware):
@@ -40,6 +48,58 @@ class ExtensionCompatibilityMiddleware(BaseHTTPMiddleware):
         return response
 
 
+configure_logging()
+tracing.configure_tracing()
+
+
+class RequestContextMiddleware(BaseHTTPMiddleware):
+    """为每个请求绑定 request_id（沿用上游 X-Request-ID），日志与响应头都带上它"""
+
+    async def dispatch(self, request, call_next):
+        incoming = request.headers.get("x-request-id", "")
+        request_id = incoming[:64] if incoming.isprintable() and incoming.strip() else uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        try:
+            response = await call_next(request)
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            request_id_var.reset(token)
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """每个请求一个根 span，路由匹配后再改成 "METHOD /route/{param}" 形式的名字"""
+
+    async def dispatch(self, request, call_next):
+        with tracing.span(f"HTTP {request.method}", request_id=request_id_var.get(), path=request.url.path) as span:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if getattr(route, "path", None):
+                span.update_name(f"HTTP {request.method} {route.path}")
+            span.set_attribute("status_code", response.status_code)
+            return response
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """按路由模板记录请求耗时，避免 /articles/{id} 之类的路径把标签基数撑爆"""
+
+    async def dispatch(self, request, call_next):
+        start = time.perf_counter()
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            metrics.HTTP_REQUEST_SECONDS.labels(
+                method=request.method,
+                route=route_path,
+                status=status,
+            ).observe(time.perf_counter() - start)
+
+
 tags_metadata = [
     {"name": "主页", "description": "首页与静态页面相关接口。"},
     {"name": "认证", "description": "用户注册、登录、退出登录。"},
@@ -71,8 +131,18 @@ async def lifespan(app: FastAPI):
         logging.getLogger("startup").error("DB connect failed after retries, raising exception")
         raise last_err
 
+    # TTS 缓存索引对账要扫目录，放到线程里，不阻塞事件循环
+    await asyncio.to_thread(reconcile_tts_cache)
+
+    # 多进程推理池需要提前拉起并预热 worker；进程内模式只在 TTS_PRELOAD_ON_STARTUP 时预热
+    if settings.TTS_WORKERS > 0 or settings.TTS_PRELOAD_ON_STARTUP:
+        get_tts_pool()
+
     yield
 
+    shutdown_tts_presynthesizer()
+    shutdown_tts_pool()
+
 
 app = FastAPI(
     title=settings.APP_TITLE,
@@ -87,6 +157,9 @@ app = FastAPI(
 
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 app.add_middleware(ExtensionCompatibilityMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
@@ -97,6 +170,7 @@ app.include_router(articles.router)
 app.include_router(evaluation.router)
 app.include_router(notifications.router)
 app.include_router(tts_router.router)
+app.include_router(metrics_router.router)
 
 
 @app.middleware("http")
@@ -61,6 +61,22 @@ class VocabularyEntry(Base):
     article = relationship("Article", back_populates="vocabulary_entries")
 
 
+class VocabGloss(Base):
+    """跨用户共享的词义表：同一个 (词, 读音) 的中文释义只问一次模型。"""
+    __tablename__ = "vocab_glosses"
+    __table_args__ = (
+        UniqueConstraint("word", "reading", name="uq_vocab_glosses_word_reading"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    word = Column(String(255), nullable=False)
+    reading = Column(String(255), nullable=False)  # 平假名
+    meaning = Column(Text, nullable=False)
+    source = Column(String(50), default="llm", nullable=False)  # llm, dataset
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, nullable=False)
+
+
 class CrawlTask(Base):
     __tablename__ = "crawl_tasks"
 
@@ -5,14 +5,16 @@ from fastapi import APIRouter, Request, Form, Depends, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from app.core import tracing
 from app.core.config import settings
 from app.db import get_db
 from app.model.models import User, Article
 from app.routers.context import get_current_user
-from app.services.ai_client_async import AIClient, AIClientError
+from app.services.ai_client_async import AIClient, AIClientError, validate_provider
 from app.services import services as service_module
 from app.services.notifications import create_notification
-from app.services.vocabulary import seed_vocabulary_entries, attach_vocab_state, build_vocabulary_view_rows, toggle_vocabulary_status
+from app.services.vocabulary import seed_vocabulary_entries, attach_vocab_state, build_vocabulary_view_rows, list_mastered_words, toggle_vocabulary_status
+from app.services.tts_presynth import schedule_article_presynthesis
 from app.services.rsshub_feed import RSSHubFetchError, fetch_rsshub_feed_items, normalize_rsshub_source_url
 from app.utils.templates import create_templates
 from app.utils.time import datetime_to_isoformat, utc_now
@@ -224,7 +226,7 @@ async def process_text_async(
     # Debug: mask API key to help trace missing-config issues
     try:
         masked = (req_api_key[:6] + '***' + req_api_key[-4:]) if req_api_key and len(req_api_key) > 10 else ('None' if not req_api_key else '***')
-        log_with_time(f"[DEBUG] resolved req_api_key={masked}; req_base_url={req_base_url or 'None'}; final_model={final_model}")
+        log_with_time(f"[DEBUG] resolved req_api_key={masked}; req_base_url={req_base_url or 'None'}; final_model={final_model}", level="DEBUG")
     except Exception:
         pass
 
@@ -238,7 +240,7 @@ async def process_text_async(
                 final_model = final_model or fresh.openai_model
                 try:
                     masked2 = (req_api_key[:6] + '***' + req_api_key[-4:]) if req_api_key and len(req_api_key) > 10 else ('None' if not req_api_key else '***')
-                    log_with_time(f"[DEBUG-fallback] reloaded user.id={user.id} req_api_key={masked2}; req_base_url={req_base_url or 'None'}; final_model={final_model}")
+                    log_with_time(f"[DEBUG-fallback] reloaded user.id={user.id} req_api_key={masked2}; req_base_url={req_base_url or 'None'}; final_model={final_model}", level="DEBUG")
                 except Exception:
                     pass
         except Exception:
@@ -251,8 +253,12 @@ async def process_text_async(
     log_with_time(f"[TRACE] process_text_async model={final_model} user_id={user.id}")
 
     try:
+        # 已掌握的词只在本地选词模式下用得上
+        known_words = list_mastered_words(db, user.id) if service_module.uses_local_vocab() else None
         # 使用多线程并发生成所有内容
-        ruby_text, vocab, translation, title, emoji = generate_all_content(text, final_model, client)
+        ruby_text, vocab, translation, title, emoji = generate_all_content(
+            text, final_model, client, level=user.level, known_words=known_words
+        )
     except Exception as e:
         # 返回错误信息
         try:
@@ -271,20 +277,21 @@ async def process_text_async(
 
     user = get_current_user(request, db)
     if user:
-        article = Article(
-            user_id=user.id,
-            title=title,
-            emoji_cover=emoji,  # 直接使用并发生成的结果
-            original=text,
-            ruby_html=ruby_text,
-            translation=translation,
-            vocab_json=json.dumps(vocab, ensure_ascii=False),
-            created_at=utc_now(),
-            updated_at=utc_now(),
-        )
-        db.add(article)
-        db.commit()
-        db.refresh(article)
+        with tracing.span("db.save_article", user_id=user.id):
+            article = Article(
+                user_id=user.id,
+                title=title,
+                emoji_cover=emoji,  # 直接使用并发生成的结果
+                original=text,
+                ruby_html=ruby_text,
+                translation=translation,
+                vocab_json=json.dumps(vocab, ensure_ascii=False),
+                created_at=utc_now(),
+                updated_at=utc_now(),
+            )
+            db.add(article)
+            db.commit()
+            db.refresh(article)
 
         try:
             seed_vocabulary_entries(db, user.id, article.id, vocab)
@@ -293,6 +300,8 @@ async def process_text_async(
             db.rollback()
             log_with_time(f"[VOCAB] seed entries failed article_id={article.id}: {e}", level="ERROR")
 
+        schedule_article_presynthesis(article.id, article.original)
+
         try:
             create_notification(
                 db,
@@ -454,9 +463,11 @@ async def test_ai_config(
 
     # Use unified async AI client factory so Gemini (Google) endpoints are handled correctly
     provider = {"api_url": base_url or '', "api_key": api_key, "model": final_model, "extra": {}}
-    client = AIClient.factory(provider)
     try:
-        resp = await client.chat([{"role": "user", "content": "Hello"}])
+        # 同一配置近期校验过则不再探测
+        resp = await validate_provider(provider)
+        if resp is None:
+            return {"success": True, "model": final_model, "text": None, "cached": True}
         return {"success": True, "model": final_model, "text": resp.get('text')}
     except AIClientError as e:
         return {"success": False, "error": str(e)}
@@ -523,9 +534,8 @@ async def crawl_news(request: Request, db: Session = Depends(get_db)):
         try:
             # Use async AI client directly to avoid asyncio.run() in running event loop
             provider = {"api_url": user.openai_base_url or '', "api_key": user.openai_api_key, "model": user.openai_model, "extra": {}}
-            client = AIClient.factory(provider)
-            resp = await client.chat([{"role": "user", "content": "Hello"}])
-            log_with_time(f"[AI] 配置验证成功: {user.openai_model}")
+            if await validate_provider(provider) is not None:
+                log_with_time(f"[AI] 配置验证成功: {user.openai_model}")
         except Exception as e:
             return {"success": False, "message": f"AI配置验证失败: {str(e)}"}
         
@@ -587,8 +597,7 @@ async def crawl_custom_url_endpoint(request: Request, db: Session = Depends(get_
             return {"success": False, "message": "请先在设置中配置AI参数（API Key等）"}
 
         provider = {"api_url": user.openai_base_url or '', "api_key": user.openai_api_key, "model": user.openai_model, "extra": {}}
-        client = AIClient.factory(provider)
-        await client.chat([{"role": "user", "content": "Hello"}])
+        await validate_provider(provider)
 
         from spider.rsshub_spider import crawl_custom_url
 
@@ -629,9 +638,8 @@ async def save_ai_config(
         # Use the unified async AI client to validate provider (handles Gemini/Google GL correctly)
         test_model = openai_model
         provider = {"api_url": openai_base_url or '', "api_key": openai_api_key, "model": test_model, "extra": {}}
-        client = AIClient.factory(provider)
         try:
-            resp = await client.chat([{"role": "user", "content": "Hello"}])
+            await validate_provider(provider)
         except AIClientError as e:
             db.rollback()
             return {"success": False, "message": f"AI配置验证失败: {str(e)}"}
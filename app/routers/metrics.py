@@ -0,0 +1,26 @@
+"""
+监控路由
+
+GET /metrics
+  resp: Prometheus text exposition format
+
+- prometheus_client 未安装时返回 503，方便抓取端区分"没装"和"挂了"
+- 多 worker 部署需设置 PROMETHEUS_MULTIPROC_DIR，详见 app/core/metrics.py
+"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, Response
+
+from app.core import metrics
+
+router = APIRouter(prefix="", tags=["监控"])
+
+
+@router.get("/metrics", summary="Prometheus 指标", include_in_schema=False)
+def prometheus_metrics():
+    if not metrics.is_enabled():
+        return PlainTextResponse("prometheus_client 未安装", status_code=503)
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
@@ -2,26 +2,52 @@
 TTS 路由
 
 POST /api/tts
-  body: {"text": "...", "speed": 1.0, "language": "JP"}
-  resp: audio/wav 字节流
+  body: {"text": "...", "speed": 1.0, "language": "JP", "format": "opus"}
+  resp: 音频字节流，默认 audio/wav
 
-- 命中磁盘缓存：直接 FileResponse，秒开
-- 未命中：调 MeloTTSService 推理，落盘后再 FileResponse
-- 推理是阻塞操作，丢到 ThreadPoolExecutor 跑，不阻塞事件循环
+- 格式：body.format（wav / opus / mp3 / flac）优先，否则按 Accept 头协商；
+  压缩格式在 WAV 基础上转码并缓存，当前环境没有对应编码器时显式 format 返回 406
+- body.timings=true：同时生成词级时间轴，响应头 X-TTS-Timings 给出它的 URL
+
+GET /api/tts/timings/{key}
+  resp: 词级时间轴 JSON（tokens: char_start/char_end → start_ms/end_ms），按 key 永久缓存
+
+- 命中磁盘缓存：直接 FileResponse，秒开，不占推理队列
+- 未命中：提交到 TTS 推理池（app.services.tts_pool），落盘后再 FileResponse
+- 推理池队列满：429 + Retry-After
 - 错误：返回 JSON {success:false, message:...}，HTTP 4xx/5xx
+
+POST /api/tts/stream
+  body 同上；resp: 流式 audio/wav（chunked，头部长度字段为 0xFFFFFFFF）
+- 按句合成，每句就绪后立即写出 PCM，首句合成完即可开始播放
+- 句间插入与整段合成相同的静音，拼起来与 /api/tts 的结果一致
 """
 
 from __future__ import annotations
 
 import asyncio
-from typing import Optional
+import logging
+import os
+import re
+from typing import AsyncIterator, Literal, Optional
 
 from fastapi import APIRouter, Body, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
-from app.services.tts import TTSError, get_tts_service
+from app.services.tts import (
+    SENTENCE_GAP_SECONDS,
+    TTSError,
+    get_tts_service,
+    read_wav_frames,
+    silence_frames,
+    wav_stream_header,
+)
+from app.services.tts_encoding import AUDIO_FORMATS, UnsupportedFormatError, negotiate_format
+from app.services.tts_pool import TTSBusyError, TTSSentenceStream, get_tts_pool
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["TTS"])
@@ -31,6 +57,21 @@ class TTSRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=2000, description="要合成的文本")
     speed: float = Field(default=None, ge=0.1, le=5.0, description="语速倍率，默认从 settings 读")
     language: Optional[str] = Field(default=None, description="语言代码，默认 JP")
+    format: Optional[Literal["wav", "opus", "mp3", "flac"]] = Field(
+        default=None, description="输出格式；不填则按 Accept 头协商，默认 wav（/api/tts/stream 只支持 wav）"
+    )
+    timings: bool = Field(default=False, description="是否生成词级时间轴（响应头 X-TTS-Timings 给出地址）")
+
+
+_CACHE_KEY_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _busy_response(exc: TTSBusyError) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "message": str(exc), "error": "tts_busy"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 @router.post("/tts", summary="服务端 TTS 合成（MeloTTS）")
@@ -40,15 +81,26 @@ async def synthesize_tts(request: Request, payload: TTSRequest = Body(...)):
         raise HTTPException(status_code=400, detail="text 不能为空")
     speed = payload.speed if payload.speed is not None else settings.TTS_DEFAULT_SPEED
     language = (payload.language or settings.TTS_DEFAULT_LANGUAGE).upper()
+    try:
+        audio_format = negotiate_format(payload.format, request.headers.get("accept"))
+    except UnsupportedFormatError as exc:
+        return JSONResponse(
+            status_code=406,
+            content={"success": False, "message": str(exc), "error": "tts_format_unavailable"},
+        )
 
     service = get_tts_service()
-    loop = asyncio.get_running_loop()
+    # 查索引是 SQLite 读，放到线程里，不占事件循环
+    cached_path = await asyncio.to_thread(service.get_cached_path, text, speed, language)
 
     try:
-        # 推理是 CPU/GPU bound，丢到默认 executor
-        path = await loop.run_in_executor(
-            None, service.synthesize_to_file, text, speed, language
-        )
+        path = cached_path or await get_tts_pool().synthesize(text, speed, language, align=payload.timings)
+        timings_key = await asyncio.to_thread(service.ensure_timings, text, speed, language) if payload.timings else None
+        if audio_format != "wav":
+            # 转码是 ffmpeg 子进程 / soundfile，放到线程里跑，不占推理队列
+            path = await asyncio.to_thread(service.encode_variant, path, audio_format)
+    except TTSBusyError as exc:
+        return _busy_response(exc)
     except TTSError as exc:
         return JSONResponse(
             status_code=400,
@@ -66,12 +118,79 @@ async def synthesize_tts(request: Request, payload: TTSRequest = Body(...)):
         )
 
     # FileResponse 走 Starlette，会自动加 Content-Length / Accept-Ranges / ETag
+    spec = AUDIO_FORMATS[audio_format]
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept",
+        "X-TTS-Cache": "hit" if cached_path else "miss",
+    }
+    if timings_key:
+        headers["X-TTS-Timings"] = f"/api/tts/timings/{timings_key}"
+    return FileResponse(
+        path=path,
+        media_type=spec.media_type,
+        filename=f"tts-{language}{spec.extension}",
+        headers=headers,
+    )
+
+
+@router.get("/tts/timings/{key}", summary="TTS 词级时间轴")
+async def get_tts_timings(key: str):
+    service = get_tts_service()
+    path = service.timings_path(key) if _CACHE_KEY_RE.match(key) else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="时间轴不存在或已被淘汰，请重新请求 /api/tts")
     return FileResponse(
         path=path,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+async def _stream_wav(stream: TTSSentenceStream) -> AsyncIterator[bytes]:
+    audio_format = None
+    try:
+        async for _sentence, path in stream:
+            # 读文件放到线程里，不阻塞事件循环
+            current, frames = await asyncio.to_thread(read_wav_frames, path)
+            if audio_format is None:
+                audio_format = current
+                yield wav_stream_header(audio_format) + frames
+            elif current == audio_format:
+                yield silence_frames(audio_format, SENTENCE_GAP_SECONDS / stream.speed) + frames
+            else:
+                raise TTSError(f"句级音频格式不一致：{path}")
+    except Exception as exc:  # noqa: BLE001
+        # 响应头已经发出，只能截断流；客户端据此停止播放
+        logger.warning("[TTS] 流式合成中断：%s", exc)
+    finally:
+        await stream.aclose()
+
+
+@router.post("/tts/stream", summary="服务端 TTS 流式合成（按句输出 chunked WAV）")
+async def stream_tts(request: Request, payload: TTSRequest = Body(...)):
+    text = (payload.text or "").strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="text 不能为空")
+    speed = payload.speed if payload.speed is not None else settings.TTS_DEFAULT_SPEED
+    language = (payload.language or settings.TTS_DEFAULT_LANGUAGE).upper()
+
+    try:
+        # 提交时会逐句查缓存索引，同样放到线程里
+        stream = await asyncio.to_thread(get_tts_pool().stream_sentences, text, speed, language)
+    except TTSBusyError as exc:
+        return _busy_response(exc)
+    except TTSError as exc:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": str(exc), "error": "tts_failed"},
+        )
+
+    return StreamingResponse(
+        _stream_wav(stream),
         media_type="audio/wav",
-        filename=f"tts-{language}.wav",
         headers={
-            "Cache-Control": "public, max-age=31536000, immutable",
-            "X-TTS-Cache": "hit" if service.get_cached_path(text, speed, language) == path else "miss",
+            "Cache-Control": "no-store",
+            "X-TTS-Sentences": str(len(stream.sentences)),
         },
     )
@@ -1,10 +1,17 @@
 import asyncio
+import collections
+import contextlib
+import contextvars
+import hashlib
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
 
 import httpx
 
+from app.core import metrics, tracing
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -40,6 +47,325 @@ class AIClientError(Exception):
     pass
 
 
+# ---- 子任务时限与对冲请求 ---------------------------------------------------
+
+# 当前子任务名与绝对截止时间（time.monotonic）；generate_all_content 的工作线程里设置，
+# SyncCompatClient 的 asyncio.run 会把上下文带进 chat()
+_current_subtask: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ai_subtask", default=None)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("ai_deadline", default=None)
+
+
+def current_subtask() -> Optional[str]:
+    return _current_subtask.get()
+
+
+def subtask_deadline_seconds(subtask: str) -> Optional[float]:
+    """从 AI_SUBTASK_DEADLINES（"emoji=10,translation=90"）里取子任务时限；未配置返回 None。"""
+    raw = getattr(settings, "AI_SUBTASK_DEADLINES", "") or ""
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == subtask:
+            try:
+                seconds = float(value)
+            except ValueError:
+                return None
+            return seconds if seconds > 0 else None
+    return None
+
+
+def deadline_expired() -> bool:
+    """当前子任务的截止时间是否已过；没设时限时总是 False。"""
+    deadline = _deadline.get()
+    return deadline is not None and deadline <= time.monotonic()
+
+
+@contextlib.contextmanager
+def subtask_budget(subtask: str, seconds: Optional[float] = None):
+    """在代码块内给 AI 调用设定子任务名与截止时间；块内多次 chat 共享同一个截止时间。"""
+    if seconds is None:
+        seconds = subtask_deadline_seconds(subtask)
+    subtask_token = _current_subtask.set(subtask)
+    deadline_token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(deadline_token)
+        _current_subtask.reset(subtask_token)
+
+
+class _LatencyTracker:
+    """按 (provider, model, subtask) 记录最近的成功耗时，用于估计对冲触发点（p95）。"""
+
+    def __init__(self, window: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[tuple, collections.deque] = {}
+        self._window = window
+
+    def record(self, key: tuple, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, collections.deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, key: tuple, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key) or ())
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+latency_tracker = _LatencyTracker()
+
+
+async def _hedged(make_call, delay: float, provider: str):
+    """先发一次；delay 秒内没返回再发一份相同请求，取先成功的，另一个取消（连接随之关闭）。"""
+    primary = asyncio.ensure_future(make_call())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    metrics.AI_HEDGE_TOTAL.labels(provider=provider, result="sent").inc()
+    hedge = asyncio.ensure_future(make_call())
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.AI_HEDGE_TOTAL.labels(provider=provider, result="hedge_won" if task is hedge else "primary_won").inc()
+                    return task.result()
+        # 两份都失败：按原请求的错误报
+        raise primary.exception()
+    finally:
+        for task in (primary, hedge):
+            if not task.done():
+                task.cancel()
+
+
+def _chat_status_label(exc: BaseException) -> str:
+    """把 chat 失败归一成低基数的 status 标签：HTTP 状态码 / timeout / error"""
+    if isinstance(exc, asyncio.CancelledError):
+        return "cancelled"
+    cause = exc.__cause__ or exc
+    if isinstance(cause, asyncio.TimeoutError):
+        return "deadline"
+    if isinstance(cause, httpx.HTTPStatusError) and getattr(cause, "response", None) is not None:
+        return str(cause.response.status_code)
+    if isinstance(cause, _RETRYABLE_HTTPX_ERRORS):
+        return "timeout"
+    return "error"
+
+
+class _EndpointMemo:
+    """记住哪些 provider 的构造路径 404、需要直接走 fallback URL。
+
+    key 为 (provider_name, 构造出的 URL)；记忆 AI_ENDPOINT_MEMO_TTL_SECONDS 后过期重新探测。
+    走记忆的 fallback 时：404 立即作废；其它失败连续 AI_ENDPOINT_MEMO_MAX_FAILURES 次作废，
+    下次重新按「构造路径 → fallback」的顺序探测。进程内共享，线程安全。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # key -> [expires_at, consecutive_failures]
+        self._entries: Dict[tuple, list] = {}
+
+    def uses_fallback(self, key: tuple, count: bool = True) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                metrics.AI_ENDPOINT_MEMO_TOTAL.labels(provider=key[0], result="expired").inc()
+                return False
+        if count:
+            metrics.AI_ENDPOINT_MEMO_TOTAL.labels(provider=key[0], result="hit").inc()
+        return True
+
+    def remember(self, key: tuple) -> None:
+        ttl = float(getattr(settings, "AI_ENDPOINT_MEMO_TTL_SECONDS", 3600))
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = [time.monotonic() + ttl, 0]
+        metrics.AI_ENDPOINT_MEMO_TOTAL.labels(provider=key[0], result="learned").inc()
+
+    def succeeded(self, key: tuple) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = 0
+
+    def failed(self, key: tuple, status_code: int) -> bool:
+        """记一次失败，返回这条记忆是否因此作废。"""
+        max_failures = max(1, int(getattr(settings, "AI_ENDPOINT_MEMO_MAX_FAILURES", 3)))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return True
+            entry[1] += 1
+            if status_code != 404 and entry[1] < max_failures:
+                return False
+            del self._entries[key]
+        metrics.AI_ENDPOINT_MEMO_TOTAL.labels(provider=key[0], result="invalidated").inc()
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+endpoint_memo = _EndpointMemo()
+
+
+class _ValidationCache:
+    """AI 配置校验结果缓存，避免每次抓取前都发一次 "Hello" 探测。
+
+    key 为 (sha256(api_key), api_url, model)，只缓存成功结果，AI_CONFIG_VALIDATION_TTL_SECONDS 后过期；
+    任何一次真实调用遇到 401 / 403 都会把对应配置作废。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._valid_until: Dict[tuple, float] = {}
+
+    @staticmethod
+    def _key(provider: Dict[str, Any]) -> tuple:
+        api_key = str(provider.get("api_key") or provider.get("api_key_enc") or "")
+        return (
+            hashlib.sha256(api_key.encode("utf-8")).hexdigest(),
+            (provider.get("api_url") or "").rstrip("/"),
+            provider.get("model") or "",
+        )
+
+    def is_valid(self, provider: Dict[str, Any]) -> bool:
+        key = self._key(provider)
+        with self._lock:
+            until = self._valid_until.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._valid_until[key]
+                return False
+            return True
+
+    def mark_valid(self, provider: Dict[str, Any]) -> None:
+        ttl = float(getattr(settings, "AI_CONFIG_VALIDATION_TTL_SECONDS", 1800))
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._valid_until[self._key(provider)] = time.monotonic() + ttl
+
+    def invalidate(self, provider: Dict[str, Any]) -> None:
+        with self._lock:
+            removed = self._valid_until.pop(self._key(provider), None)
+        if removed is not None:
+            metrics.AI_CONFIG_VALIDATION_TOTAL.labels(result="invalidated").inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._valid_until.clear()
+
+
+validation_cache = _ValidationCache()
+
+
+def _response_text(resp) -> str:
+    try:
+        return resp.text
+    except Exception:
+        return '<no body>'
+
+
+def _openai_text(data: Any) -> Optional[str]:
+    """从 OpenAI chat/completions 响应里取出文本。"""
+    text = None
+    if isinstance(data, dict):
+        choices = data.get("choices") or []
+        if choices:
+            delta = choices[0].get("message") or choices[0].get("delta")
+            if delta and isinstance(delta, dict):
+                text = delta.get("content")
+            text = text or choices[0].get("text") or choices[0].get("message", {}).get("content")
+    return text
+
+
+def _gemini_text(data: Any) -> Optional[str]:
+    """从 Gemini generateContent / streamGenerateContent 事件里取出文本。"""
+    text = None
+    if isinstance(data, dict) and "candidates" in data:
+        c = data.get("candidates")
+        if c and isinstance(c, list):
+            first = c[0].get("content") or {}
+            # Common Gemini/GL shape: content.parts -> [{text: ...}, ...]
+            parts = first.get("parts") or []
+            if parts and isinstance(parts, list):
+                try:
+                    text = ''.join([p.get('text', '') for p in parts if isinstance(p, dict)])
+                except Exception:
+                    text = None
+            # fallback: some vendors put text directly
+            if not text:
+                text = first.get("text")
+    return text
+
+
+def _usage_tokens(raw: Any) -> Optional[Dict[str, int]]:
+    """从响应里取 prompt / 命中前缀缓存的 token 数；各家字段名不同，取不到返回 None。"""
+    if not isinstance(raw, dict):
+        return None
+    usage = raw.get("usage")
+    if isinstance(usage, dict):
+        prompt = usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        cached = (
+            (details.get("cached_tokens") if isinstance(details, dict) else None)  # OpenAI
+            or usage.get("prompt_cache_hit_tokens")  # DeepSeek
+            or usage.get("cache_read_input_tokens")  # Anthropic 兼容层
+            or 0
+        )
+        return {"prompt_tokens": int(prompt), "cached_tokens": int(cached)}
+    meta = raw.get("usageMetadata")
+    if isinstance(meta, dict):  # Gemini
+        return {
+            "prompt_tokens": int(meta.get("promptTokenCount") or 0),
+            "cached_tokens": int(meta.get("cachedContentTokenCount") or 0),
+        }
+    return None
+
+
+def _cache_hint_style(api_url: str, model: Optional[str]) -> str:
+    """AI_PROMPT_CACHE_HINTS=auto 时按 host 判断：OpenAI 官方发 prompt_cache_key，
+    Anthropic / OpenRouter 上的 Claude 用 cache_control，其它兼容接口不加字段（未知字段可能被拒）。"""
+    mode = (getattr(settings, "AI_PROMPT_CACHE_HINTS", "auto") or "auto").lower()
+    if mode != "auto":
+        return mode
+    low = (api_url or "").lower()
+    if "api.openai.com" in low:
+        return "openai"
+    if "anthropic.com" in low or ("openrouter.ai" in low and "claude" in (model or "").lower()):
+        return "anthropic"
+    return "off"
+
+
+def _apply_cache_hints(body: Dict[str, Any], api_url: str) -> None:
+    """给 OpenAI 兼容请求体加前缀缓存提示；可缓存的前缀是第一条 system 消息（文章上下文）。"""
+    messages = body.get("messages") or []
+    if not messages or messages[0].get("role") != "system" or not isinstance(messages[0].get("content"), str):
+        return
+    style = _cache_hint_style(api_url, body.get("model"))
+    prefix = messages[0]["content"]
+    if style == "openai":
+        body.setdefault("prompt_cache_key", hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:16])
+    elif style == "anthropic":
+        body["messages"] = [
+            {"role": "system", "content": [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]},
+            *messages[1:],
+        ]
+
+
 class AIClient:
     @staticmethod
     def detect_format(api_url: str) -> str:
@@ -65,6 +391,8 @@ class AIClient:
 
 
 class BaseClient:
+    provider_name = "unknown"
+
     def __init__(self, provider: Dict[str, Any]):
         self.provider = provider
         self.api_url = provider.get("api_url")
@@ -80,24 +408,210 @@ class BaseClient:
             headers["Authorization"] = f"Bearer {self.api_key}"
         return headers
 
-    async def chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        raise NotImplementedError()
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        extra: Optional[Dict[str, Any]] = None,
+        *,
+        stream: bool = False,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        max_chunks: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """发一次对话请求，返回 {"text", "raw"}。
+
+        stream=True 时按 SSE 逐块读取，stop_when(已收到的文本) 为真或收到 max_chunks 块后
+        立即断开连接，返回值多一个 stopped_early；provider 不支持流式时退回普通请求。
+        max_chunks 只在本地计数，不作为 token 上限下发：各家参数名不一（max_tokens /
+        max_completion_tokens / maxOutputTokens），推理模型的上限还包含思考 token，
+        给短子任务设小了反而拿不到输出。
+        """
+        start = time.perf_counter()
+        status = "ok"
+        subtask = _current_subtask.get()
+        with tracing.span("ai.chat", provider=self.provider_name, model=self.model, stream=stream, subtask=subtask) as chat_span:
+            try:
+                call = self._dispatch(messages, extra, stream, stop_when, max_chunks)
+                deadline = _deadline.get()
+                if deadline is None:
+                    result = await call
+                else:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            call.close()
+                            raise asyncio.TimeoutError()
+                        # 超时会取消进行中的请求（含对冲的那一份）
+                        result = await asyncio.wait_for(call, remaining)
+                    except asyncio.TimeoutError as e:
+                        raise AIClientError(f"AI 子任务 {subtask or 'chat'} 超过时限") from e
+                usage = _usage_tokens(result.get("raw"))
+                if usage is not None:
+                    result["usage"] = usage
+                    chat_span.set_attribute("cached_tokens", usage["cached_tokens"])
+                    metrics.AI_PROMPT_TOKENS_TOTAL.labels(provider=self.provider_name, kind="prompt").inc(usage["prompt_tokens"])
+                    metrics.AI_PROMPT_TOKENS_TOTAL.labels(provider=self.provider_name, kind="cached").inc(usage["cached_tokens"])
+                return result
+            except BaseException as e:
+                status = _chat_status_label(e)
+                if status in ("401", "403"):
+                    # 凭据失效：下次抓取前重新校验
+                    validation_cache.invalidate(self.provider)
+                raise
+            finally:
+                chat_span.set_attribute("status", status)
+                metrics.AI_CHAT_SECONDS.labels(provider=self.provider_name, status=status).observe(time.perf_counter() - start)
+
+    async def _dispatch(self, messages, extra, stream, stop_when, max_chunks) -> Dict[str, Any]:
+        if stream:
+            request = self._stream_request(messages, extra)
+            if request is not None:
+                result = await self._chat_stream(request, stop_when, max_chunks)
+                if result is not None:
+                    return result
+        return await self._chat_hedged(messages, extra)
+
+    async def _chat_hedged(self, messages, extra) -> Dict[str, Any]:
+        """AI_HEDGE_ENABLED 时，超过该 (provider, model, subtask) 近期 p95 仍未返回就发对冲请求。"""
+        key = (self.provider_name, self.model, _current_subtask.get())
+        delay = None
+        if getattr(settings, "AI_HEDGE_ENABLED", False):
+            delay = latency_tracker.percentile(key, 0.95, int(getattr(settings, "AI_HEDGE_MIN_SAMPLES", 20)))
+        started = time.perf_counter()
+        if delay is None:
+            result = await self._chat(messages, extra)
+        else:
+            result = await _hedged(lambda: self._chat(messages, extra), delay, self.provider_name)
+        latency_tracker.record(key, time.perf_counter() - started)
+        return result
 
+    async def _chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        raise NotImplementedError()
 
-class OpenAICompatClient(BaseClient):
-    async def chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        body = {
-            "model": self.model,
-            "messages": messages,
-        }
-        # merge extras
+    def _merged_extra(self, extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         merged = {}
         if isinstance(self.extra, dict):
             merged.update(self.extra)
         if extra:
             merged.update(extra)
-        merged and body.update(merged)
+        return merged
+
+    def _stream_request(self, messages, extra) -> Optional[tuple]:
+        """返回流式请求的 (url, headers, body, params)；不支持流式时返回 None。"""
+        return None
+
+    def _stream_delta(self, event: Dict[str, Any]) -> str:
+        return ""
+
+    def _parse_response(self, data: Any) -> Dict[str, Any]:
+        raise NotImplementedError()
+
+    async def _chat_stream(self, request: tuple, stop_when, max_chunks) -> Optional[Dict[str, Any]]:
+        """流式读取；满足 stop_when / max_chunks 时跳出 async with，httpx 随即关闭连接。
 
+        返回 None 表示流式端点 404（交给普通请求走 404 fallback）。
+        """
+        url, headers, body, params = request
+        if endpoint_memo.uses_fallback((self.provider_name, url), count=False):
+            # 该 provider 只认 fallback 端点，不走流式
+            return None
+        retries = _ai_request_retries()
+        async with httpx.AsyncClient(timeout=_ai_request_timeout_seconds()) as client:
+            for attempt in range(1, retries + 1):
+                try:
+                    with tracing.span("ai.chat.stream", provider=self.provider_name, attempt=attempt, url=url) as span:
+                        async with client.stream("POST", url, headers=headers, json=body, params=params) as r:
+                            span.set_attribute("status_code", r.status_code)
+                            if r.status_code == 404:
+                                logger.warning('%s stream endpoint %s returned 404, falling back to plain request', type(self).__name__, url)
+                                return None
+                            if r.status_code >= 400:
+                                await r.aread()
+                                r.raise_for_status()
+                            if "text/event-stream" not in (r.headers.get("content-type") or ""):
+                                # provider 忽略了 stream 参数，按普通响应解析
+                                await r.aread()
+                                return self._parse_response(r.json())
+                            text = ""
+                            chunks = 0
+                            stopped = False
+                            async for line in r.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                payload = line[len("data:"):].strip()
+                                if payload == "[DONE]":
+                                    break
+                                try:
+                                    event = json.loads(payload)
+                                except ValueError:
+                                    continue
+                                delta = self._stream_delta(event)
+                                if not delta:
+                                    continue
+                                text += delta
+                                chunks += 1
+                                if (stop_when is not None and stop_when(text)) or (max_chunks and chunks >= max_chunks):
+                                    stopped = True
+                                    break
+                            span.set_attribute("stopped_early", stopped)
+                    return {"text": text, "raw": None, "stopped_early": stopped}
+                except _RETRYABLE_HTTPX_ERRORS as e:
+                    if attempt < retries:
+                        logger.info("%s stream retry %s/%s after transient error for %s: %s", type(self).__name__, attempt, retries, url, e)
+                        await asyncio.sleep(_ai_retry_delay_seconds(attempt))
+                        continue
+                    raise AIClientError("AI 接口请求超时，请稍后重试") from e
+                except httpx.HTTPStatusError as e:
+                    logger.error('%s stream non-2xx response: %s %s', type(self).__name__, e.response.status_code, _response_text(e.response))
+                    raise AIClientError(f'HTTP {e.response.status_code} at {url}: {_response_text(e.response)}') from e
+        return None
+
+    async def _post_resolved(self, attempt: int, full: str, fallback_url: str, post) -> tuple:
+        """POST 到构造路径，404 时再试 fallback_url；返回 (是否用了 fallback, response)。
+
+        fallback 成功后记入 endpoint_memo，之后的调用直接打 fallback，省掉一次必然 404 的往返。
+        post(url, use_fallback) 返回 awaitable response。
+        """
+        memo_key = (self.provider_name, full)
+        if endpoint_memo.uses_fallback(memo_key):
+            with tracing.span("ai.chat.attempt", provider=self.provider_name, attempt=attempt, url=fallback_url, memoized=True) as span:
+                r = await post(fallback_url, True)
+                span.set_attribute("status_code", r.status_code)
+            if 200 <= r.status_code < 300:
+                endpoint_memo.succeeded(memo_key)
+                return True, r
+            if not endpoint_memo.failed(memo_key, r.status_code):
+                return True, r
+            logger.warning('%s remembered endpoint %s returned %s, re-probing %s', type(self).__name__, fallback_url, r.status_code, full)
+
+        with tracing.span("ai.chat.attempt", provider=self.provider_name, attempt=attempt, url=full) as attempt_span:
+            r = await post(full, False)
+            attempt_span.set_attribute("status_code", r.status_code)
+        if r.status_code != 404 or fallback_url == full:
+            return False, r
+        logger.warning('%s got 404 for %s, retrying fallback %s', type(self).__name__, full, fallback_url)
+        try:
+            with tracing.span("ai.chat.fallback_404", provider=self.provider_name, attempt=attempt, url=fallback_url) as fb_span:
+                fb = await post(fallback_url, True)
+                fb_span.set_attribute("status_code", fb.status_code)
+        except Exception as e:
+            # fallback 本身出错时按原来的 404 报
+            logger.error('%s fallback post to %s failed: %s', type(self).__name__, fallback_url, e)
+            return False, r
+        if 200 <= fb.status_code < 300:
+            endpoint_memo.remember(memo_key)
+            return True, fb
+        logger.error(
+            '%s primary(%s) and fallback(%s) failed: %s / %s',
+            type(self).__name__, full, fallback_url, _response_text(r), _response_text(fb),
+        )
+        return False, r
+
+
+class OpenAICompatClient(BaseClient):
+    provider_name = "openai"
+
+    def _endpoints(self) -> tuple:
+        """返回 (原始 api_url, 构造出的 chat/completions URL)。"""
         base = (self.api_url or '').rstrip('/')
         # Normalize common shapes:
         # - if provider gave a root like https://.../compatible-mode/v1 we should POST to .../v1/chat/completions
@@ -109,6 +623,37 @@ class OpenAICompatClient(BaseClient):
         else:
             # default fallback: append full path
             full = base + '/v1/chat/completions'
+        return base, full
+
+    def _stream_request(self, messages, extra) -> Optional[tuple]:
+        _base, full = self._endpoints()
+        body = {"model": self.model, "messages": messages}
+        body.update(self._merged_extra(extra))
+        body["stream"] = True
+        _apply_cache_hints(body, self.api_url or '')
+        return full, self._headers(), body, None
+
+    def _stream_delta(self, event: Dict[str, Any]) -> str:
+        choices = event.get("choices") or []
+        if not choices:
+            return ""
+        delta = choices[0].get("delta") or {}
+        return (delta.get("content") if isinstance(delta, dict) else None) or ""
+
+    def _parse_response(self, data: Any) -> Dict[str, Any]:
+        return {"text": _openai_text(data) or json.dumps(data, ensure_ascii=False), "raw": data}
+
+    async def _chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = {
+            "model": self.model,
+            "messages": messages,
+        }
+        # merge extras
+        merged = self._merged_extra(extra)
+        merged and body.update(merged)
+        _apply_cache_hints(body, self.api_url or '')
+
+        base, full = self._endpoints()
 
         timeout_seconds = _ai_request_timeout_seconds()
         retries = _ai_request_retries()
@@ -116,58 +661,20 @@ class OpenAICompatClient(BaseClient):
         async with httpx.AsyncClient(timeout=timeout_seconds) as client:
             for attempt in range(1, retries + 1):
                 try:
-                    r = await client.post(full, headers=self._headers(), json=body)
-                    # If provider returns 404 for constructed path, attempt a fallback to the raw base url
-                    if r.status_code == 404:
-                        logger.warning('OpenAICompatClient got 404 for %s, retrying raw api_url %s', full, base)
-                        try:
-                            fb = await client.post(base, headers=self._headers(), json=body)
-                            if fb.status_code >= 200 and fb.status_code < 300:
-                                data = fb.json()
-                            else:
-                                # include both response bodies for debugging
-                                txt1 = None
-                                txt2 = None
-                                try:
-                                    txt1 = r.text
-                                except Exception:
-                                    txt1 = '<no body>'
-                                try:
-                                    txt2 = fb.text
-                                except Exception:
-                                    txt2 = '<no body>'
-                                logger.error('OpenAICompatClient primary(%s) and fallback(%s) failed: %s / %s', full, base, txt1, txt2)
-                                fb.raise_for_status()
-                        except Exception:
-                            # bubble up original r content if fallback also fails
-                            try:
-                                logger.error('OpenAICompatClient fallback post to %s failed: %s', base, fb.text if 'fb' in locals() else '<no body>')
-                            except Exception:
-                                pass
-                            r.raise_for_status()
-                    else:
-                        try:
-                            r.raise_for_status()
-                        except Exception:
-                            # Log response text to aid debugging (some providers return useful JSON errors)
-                            txt = None
-                            try:
-                                txt = r.text
-                            except Exception:
-                                txt = '<could not read response body>'
-                            logger.error('OpenAICompatClient async chat non-2xx response: %s %s', r.status_code, txt)
-                            r.raise_for_status()
-                        data = r.json()
-                    text = None
-                    if isinstance(data, dict):
-                        choices = data.get("choices") or []
-                        if choices:
-                            delta = choices[0].get("message") or choices[0].get("delta")
-                            if delta:
-                                if isinstance(delta, dict):
-                                    text = delta.get("content") or delta.get("content", None)
-                            text = text or choices[0].get("text") or choices[0].get("message", {}).get("content")
-                    return {"text": text or json.dumps(data, ensure_ascii=False), "raw": data}
+                    # 构造路径 404 时回退到用户填写的原始 api_url
+                    _used_fallback, r = await self._post_resolved(
+                        attempt,
+                        full,
+                        base,
+                        lambda url, _fb: client.post(url, headers=self._headers(), json=body),
+                    )
+                    try:
+                        r.raise_for_status()
+                    except Exception:
+                        # Log response text to aid debugging (some providers return useful JSON errors)
+                        logger.error('OpenAICompatClient async chat non-2xx response: %s %s', r.status_code, _response_text(r))
+                        r.raise_for_status()
+                    return self._parse_response(r.json())
                 except AIClientError:
                     raise
                 except _RETRYABLE_HTTPX_ERRORS as e:
@@ -208,7 +715,41 @@ class OpenAICompatClient(BaseClient):
 
 
 class GeminiClient(BaseClient):
-    async def chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    provider_name = "gemini"
+
+    def _is_google_gl(self) -> bool:
+        return 'generativelanguage.googleapis.com' in (self.api_url or '')
+
+    def _google_auth(self) -> tuple:
+        """Google GL 的 API key 走 ?key= 且不带 Authorization；OAuth token（ya29.）仍走 Bearer。"""
+        headers = self._headers()
+        params = None
+        if self._is_google_gl() and self.api_key and not str(self.api_key).startswith('ya29.'):
+            params = {'key': self.api_key}
+            headers.pop('Authorization', None)
+        return headers, params
+
+    def _stream_request(self, messages, extra) -> Optional[tuple]:
+        # 只有 Google GL 的 generateContent 有对应的 streamGenerateContent
+        if not self._is_google_gl() or not self.model:
+            return None
+        base = (self.api_url or '').rstrip('/')
+        seg = self.model[len('models/'):] if self.model.startswith('models/') else self.model
+        body = {"contents": [{"role": "user", "parts": [{"text": str(m.get("content"))} for m in messages]}]}
+        body.update(self._merged_extra(extra))
+        headers, params = self._google_auth()
+        return f"{base}/v1/models/{seg}:streamGenerateContent", headers, body, {**(params or {}), "alt": "sse"}
+
+    def _stream_delta(self, event: Dict[str, Any]) -> str:
+        return _gemini_text(event) or ""
+
+    def _parse_response(self, data: Any) -> Dict[str, Any]:
+        text = _gemini_text(data)
+        if not text and isinstance(data, dict):
+            text = json.dumps(data, ensure_ascii=False)
+        return {"text": text or "", "raw": data}
+
+    async def _chat(self, messages: List[Dict[str, str]], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         base = (self.api_url or '').rstrip('/')
         # Normalize model: if user supplied a short id like 'text-bison', make it 'models/text-bison'
         model_segment = self.model or ''
@@ -263,13 +804,14 @@ class GeminiClient(BaseClient):
                 }
             except Exception:
                 body = {"messages": [{"author": (m.get("role", "user")), "content": {"text": str(m.get("content"))}} for m in messages]}
-        merged = {}
-        if isinstance(self.extra, dict):
-            merged.update(self.extra)
-        if extra:
-            merged.update(extra)
+        merged = self._merged_extra(extra)
         merged and body.update(merged)
 
+        # Fallback for 404: OpenAI-compatible chat completions path (some providers support compat layer)
+        openai_compat_url = base.rstrip('/') + '/v1/chat/completions'
+        oa_body = {"model": self.model, "messages": messages}
+        merged and oa_body.update(merged)
+
         timeout_seconds = _ai_request_timeout_seconds()
         retries = _ai_request_retries()
 
@@ -279,21 +821,8 @@ class GeminiClient(BaseClient):
                     # For Google Generative Language API, many users use API keys instead of OAuth tokens.
                     # If the api_url indicates generativelanguage.googleapis.com and the provided api_key
                     # looks like an API key (heuristic: does not start with 'ya29.'), send it as query param `key=`.
-                    params = None
-                    try:
-                        low_base = (base or '').lower()
-                        if 'generativelanguage.googleapis.com' in low_base and self.api_key:
-                            # heuristic for API key vs OAuth token
-                            if not str(self.api_key).startswith('ya29.'):
-                                params = {'key': self.api_key}
-                    except Exception:
-                        params = None
-
                     # Build headers: if using Google Generative Language with API key, DO NOT send Authorization header
-                    headers_local = self._headers()
-                    if is_google_gl and params:
-                        # API key in query param should be used instead of Authorization header
-                        headers_local.pop('Authorization', None)
+                    headers_local, params = self._google_auth()
 
                     # Log the final target and request body for debugging
                     try:
@@ -302,66 +831,19 @@ class GeminiClient(BaseClient):
                         final_url_debug = full
                     logger.debug('GeminiClient POST %s body=%s headers=%s', final_url_debug, json.dumps(body, ensure_ascii=False), {k: ('<redacted>' if k.lower()=='authorization' else v) for k,v in headers_local.items()})
 
-                    r = await client.post(full, headers=headers_local, json=body, params=params)
-                    if r.status_code == 404:
-                        # Try OpenAI-compatible chat completions path as a fallback (some providers support compat layer)
-                        try:
-                            logger.warning('GeminiClient primary generateMessage returned 404, trying /v1/chat/completions fallback')
-                            openai_compat_url = base.rstrip('/') + '/v1/chat/completions'
-                            # construct OpenAI-style body
-                            oa_body = {"model": self.model, "messages": messages}
-                            oa_merged = {}
-                            if isinstance(self.extra, dict):
-                                oa_merged.update(self.extra)
-                            if extra:
-                                oa_merged.update(extra)
-                            oa_merged and oa_body.update(oa_merged)
-                            # For fallback, reuse header policy (remove Authorization if using API key)
-                            fb = await client.post(openai_compat_url, headers=headers_local, json=oa_body, params=params)
-                            if fb.status_code >= 200 and fb.status_code < 300:
-                                data = fb.json()
-                                # parse as OpenAI response
-                                text = None
-                                if isinstance(data, dict):
-                                    choices = data.get('choices') or []
-                                    if choices:
-                                        delta = choices[0].get('message') or choices[0].get('delta')
-                                        if delta and isinstance(delta, dict):
-                                            text = delta.get('content') or delta.get('content', None)
-                                        text = text or choices[0].get('text') or choices[0].get('message', {}).get('content')
-                                return {"text": text or json.dumps(data, ensure_ascii=False), "raw": data}
-                            else:
-                                logger.error('GeminiClient fallback also failed: %s %s', fb.status_code, fb.text if hasattr(fb, 'text') else str(fb))
-                                fb.raise_for_status()
-                        except Exception:
-                            # re-raise original 404 if fallback fails
-                            try:
-                                logger.error('GeminiClient fallback post failed: %s', r.text if hasattr(r, 'text') else str(r))
-                            except Exception:
-                                pass
-                            r.raise_for_status()
-                    else:
-                        r.raise_for_status()
-                        data = r.json()
-                    text = None
-                    if isinstance(data, dict):
-                        if "candidates" in data:
-                            c = data.get("candidates")
-                            if c and isinstance(c, list):
-                                first = c[0].get("content") or {}
-                                # Common Gemini/GL shape: content.parts -> [{text: ...}, ...]
-                                parts = first.get("parts") or []
-                                if parts and isinstance(parts, list):
-                                    try:
-                                        text = ''.join([p.get('text', '') for p in parts if isinstance(p, dict)])
-                                    except Exception:
-                                        text = None
-                                # fallback: some vendors put text directly
-                                if not text:
-                                    text = first.get("text") or first.get('text', None)
-                        if not text:
-                            text = json.dumps(data, ensure_ascii=False)
-                    return {"text": text or "", "raw": data}
+                    used_fallback, r = await self._post_resolved(
+                        attempt,
+                        full,
+                        openai_compat_url,
+                        lambda url, fb: client.post(
+                            url, headers=headers_local, json=oa_body if fb else body, params=params
+                        ),
+                    )
+                    r.raise_for_status()
+                    data = r.json()
+                    if used_fallback:
+                        return {"text": _openai_text(data) or json.dumps(data, ensure_ascii=False), "raw": data}
+                    return self._parse_response(data)
                 except AIClientError:
                     raise
                 except _RETRYABLE_HTTPX_ERRORS as e:
@@ -397,3 +879,18 @@ class GeminiClient(BaseClient):
                     except Exception:
                         pass
                     raise AIClientError(msg) from e
+
+
+async def validate_provider(provider: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """确认 AI 配置可用。
+
+    缓存有效时直接返回 None；否则发一次 "Hello" 探测，成功后写入缓存并返回 chat 结果。
+    探测失败时异常原样抛出（失败不缓存）。
+    """
+    if validation_cache.is_valid(provider):
+        metrics.AI_CONFIG_VALIDATION_TOTAL.labels(result="cached").inc()
+        return None
+    resp = await AIClient.factory(provider).chat([{"role": "user", "content": "Hello"}])
+    validation_cache.mark_valid(provider)
+    metrics.AI_CONFIG_VALIDATION_TOTAL.labels(result="probed").inc()
+    return resp
@@ -0,0 +1,162 @@
+"""
+AI 多 provider 路由
+
+设计要点：
+- 管理员用 AI_PROVIDERS（JSON 列表）登记额外的 provider，每项
+  {"name", "api_url", "api_key" 或 "api_key_env", "model", "weight"?, "extra"?}；
+  用户自己在设置里填的配置固定叫 "user"
+- AI_SUBTASK_ROUTES 按子任务指定候选顺序，如 "emoji=cheap,title=cheap,vocab=cheap,translation=strong|user"；
+  没配置的子任务只用 "user"；"user" 总是作为最后的兜底，用户配置始终可用
+- 失败自动切到下一个候选；健康度用成功率的指数滑动平均，连续失败 AI_PROVIDER_FAILURE_THRESHOLD 次
+  进入 AI_PROVIDER_COOLDOWN_SECONDS 冷却，冷却中的排到最后（全部冷却时仍会尝试）
+- 只对路由里配置的 provider 排序（weight × 健康度，分数相同保持路由里写的顺序），"user" 固定在最后
+- 半开探测：距最近一次失败超过 AI_PROVIDER_COOLDOWN_SECONDS 的 provider 健康度恢复满分，
+  按原顺序再试一次；成功就回到原位，失败则再次降级，每个冷却周期最多多打一次
+- 子任务时限对整个候选链共享
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+USER_PROVIDER = "user"
+# 成功率 EWMA 的平滑系数，越大越看重最近的结果
+_HEALTH_ALPHA = 0.2
+# 健康度下限，避免一个 provider 永远排不上来
+_HEALTH_FLOOR = 0.05
+
+
+@dataclass
+class ProviderConfig:
+    name: str
+    api_url: str
+    api_key: str
+    model: Optional[str] = None
+    weight: float = 1.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def as_provider(self, model: Optional[str] = None) -> Dict[str, Any]:
+        return {"api_url": self.api_url, "api_key": self.api_key, "model": self.model or model, "extra": dict(self.extra)}
+
+
+@dataclass
+class _Health:
+    score: float = 1.0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    last_failure: float = 0.0
+
+
+class ProviderRouter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._health: Dict[str, _Health] = {}
+        self._parsed: Tuple[str, str] = ("", "")
+        self._providers: Dict[str, ProviderConfig] = {}
+        self._routes: Dict[str, List[str]] = {}
+
+    def _load(self) -> None:
+        raw = (getattr(settings, "AI_PROVIDERS", "") or "", getattr(settings, "AI_SUBTASK_ROUTES", "") or "")
+        if raw == self._parsed:
+            return
+        providers: Dict[str, ProviderConfig] = {}
+        if raw[0].strip():
+            try:
+                items = json.loads(raw[0])
+            except ValueError as exc:
+                logger.error("AI_PROVIDERS 不是合法 JSON，忽略：%s", exc)
+                items = []
+            for item in items if isinstance(items, list) else []:
+                if not isinstance(item, dict) or not item.get("name") or item.get("name") == USER_PROVIDER:
+                    continue
+                api_key = item.get("api_key") or os.getenv(item.get("api_key_env") or "", "")
+                providers[item["name"]] = ProviderConfig(
+                    name=item["name"],
+                    api_url=item.get("api_url") or "",
+                    api_key=api_key,
+                    model=item.get("model"),
+                    weight=float(item.get("weight", 1.0)),
+                    extra=item.get("extra") or {},
+                )
+        routes: Dict[str, List[str]] = {}
+        for entry in raw[1].split(","):
+            subtask, _, names = entry.partition("=")
+            chain = [name.strip() for name in names.split("|") if name.strip()]
+            if subtask.strip() and chain:
+                routes[subtask.strip()] = chain
+        self._providers, self._routes, self._parsed = providers, routes, raw
+
+    def _rank(self, name: str, weight: float, now: float) -> tuple:
+        health = self._health.get(name)
+        if health is None:
+            return (False, -weight)
+        cooldown = float(getattr(settings, "AI_PROVIDER_COOLDOWN_SECONDS", 60))
+        if health.last_failure and now - health.last_failure >= cooldown:
+            # 半开：冷却期内没再失败过，恢复满分让它按原顺序再被试一次
+            self._health[name] = health = _Health()
+        cooling = health.cooldown_until > now
+        return (cooling, -weight * max(health.score, _HEALTH_FLOOR))
+
+    def plan(self, subtask: Optional[str], user_provider: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """返回按优先级排好的 [(provider 名, provider dict)]，最后一定是 "user"。"""
+        with self._lock:
+            self._load()
+            candidates: List[Tuple[str, Dict[str, Any], float]] = []
+            for name in dict.fromkeys(self._routes.get(subtask or "", [])):
+                if name == USER_PROVIDER:
+                    continue
+                if name in self._providers:
+                    config = self._providers[name]
+                    candidates.append((name, config.as_provider(user_provider.get("model")), config.weight))
+                else:
+                    logger.warning("AI_SUBTASK_ROUTES 引用了未配置的 provider：%s", name)
+            now = time.monotonic()
+            candidates.sort(key=lambda item: self._rank(item[0], item[2], now))
+        # 用户自己的配置只做兜底，不参与排序
+        return [(name, provider) for name, provider, _weight in candidates] + [(USER_PROVIDER, user_provider)]
+
+    def record(self, name: str, ok: bool) -> None:
+        threshold = max(1, int(getattr(settings, "AI_PROVIDER_FAILURE_THRESHOLD", 3)))
+        cooldown = float(getattr(settings, "AI_PROVIDER_COOLDOWN_SECONDS", 60))
+        with self._lock:
+            health = self._health.setdefault(name, _Health())
+            health.score = (1 - _HEALTH_ALPHA) * health.score + _HEALTH_ALPHA * (1.0 if ok else 0.0)
+            if ok:
+                health.consecutive_failures = 0
+                health.cooldown_until = 0.0
+                return
+            health.consecutive_failures += 1
+            health.last_failure = time.monotonic()
+            if health.consecutive_failures >= threshold:
+                health.cooldown_until = time.monotonic() + cooldown
+                logger.warning("AI provider %s 连续失败 %s 次，冷却 %ss", name, health.consecutive_failures, cooldown)
+
+    def health(self, name: str) -> float:
+        with self._lock:
+            return (self._health.get(name) or _Health()).score
+
+    def reset(self) -> None:
+        with self._lock:
+            self._health.clear()
+            self._parsed = ("", "")
+            self._providers = {}
+            self._routes = {}
+
+
+router = ProviderRouter()
+
+
+def record_outcome(name: str, subtask: Optional[str], ok: bool) -> None:
+    router.record(name, ok)
+    metrics.AI_ROUTE_TOTAL.labels(provider=name, subtask=subtask or "other", result="ok" if ok else "failed").inc()
@@ -25,6 +25,39 @@ def _common_kanji_sets() -> dict[int, set[str]]:
     return {level: set(chars) for level, chars in _COMMON_KANJI_BY_LEVEL.items()}
 
 
+# 不在任何常用表里的汉字按"超出 N3"处理
+UNLISTED_KANJI_LEVEL = 4
+
+
+def kanji_level(char: str) -> int:
+    """单个汉字所在常用表的最低等级；表外汉字返回 UNLISTED_KANJI_LEVEL。"""
+    for level, chars in sorted(_common_kanji_sets().items()):
+        if char in chars:
+            return level
+    return UNLISTED_KANJI_LEVEL
+
+
+def word_kanji_level(word: str) -> int:
+    """词语里最难的汉字等级；不含汉字时返回 0。"""
+    return max((kanji_level(char) for char in re.findall(r"[\u4e00-\u9fff]", word or "")), default=0)
+
+
+def estimate_text_level(text: str, coverage: float = 0.95) -> int:
+    """
+    按常用汉字表估计文章难度：汉字出现次数里至少 coverage 比例落在某一级及以下，就算该级；
+    常用表只到 N3，覆盖不到的与 kanji_level 一致返回 UNLISTED_KANJI_LEVEL（"超出 N3"，
+    分不出 N2 / N1）；没有汉字的文章算 1
+    """
+    kanji_chars = re.findall(r"[\u4e00-\u9fff]", text or "")
+    if not kanji_chars:
+        return 1
+    levels = [kanji_level(char) for char in kanji_chars]
+    for level in range(1, UNLISTED_KANJI_LEVEL):
+        if sum(1 for value in levels if value <= level) >= coverage * len(levels):
+            return level
+    return UNLISTED_KANJI_LEVEL
+
+
 def should_show_furigana(token: str, level: int | str | None = None) -> bool:
     """按难度决定是否显示假名。"""
     text = token or ""
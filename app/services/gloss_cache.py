@@ -0,0 +1,144 @@
+"""
+生词释义共享表
+
+设计要点：
+- 释义按 (词, 平假名读音) 存进 vocab_glosses 表，所有用户共用；同形不同读的词各存一条
+- 查询顺序：可选的离线词典文件（VOCAB_GLOSS_DATASET）→ 数据库 → 都没有的才交给模型；
+  llm 选词模式下词由模型挑，读音用 local_vocab.word_reading 本地补齐后再查表
+- 模型补出来的释义写回数据库（source=llm），并发写入撞唯一约束时以先写入的为准；
+  写入共享表的释义由调用方按「脱离语境的词典释义」来问，不存某篇文章里的语境义
+- 超过 VOCAB_GLOSS_TTL_DAYS 天的数据库释义查询时当作未命中，重新问到后覆盖旧行（0 为不过期）
+- 词典文件是 UTF-8 TSV，每行 `词<TAB>读音<TAB>中文释义`，# 开头为注释；读音片假名 / 平假名均可。
+  首次使用时整份读进内存，可以从 JMdict 等词典导出后自行翻译整理
+- 数据库不可用（表还没建、连不上）时只记日志，当作全部未命中，不影响生词提取
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db as app_db
+from app.core.config import settings
+from app.model.models import VocabGloss
+from app.services.local_vocab import katakana_to_hiragana
+from app.utils.time import UTC, utc_now
+
+logger = logging.getLogger(__name__)
+
+GlossKey = Tuple[str, str]
+
+SOURCE_DATASET = "dataset"
+SOURCE_DB = "gloss"
+SOURCE_LLM = "llm"
+
+_dataset: Dict[GlossKey, str] = {}
+_dataset_path = None
+_dataset_lock = threading.Lock()
+
+
+def _load_dataset() -> Dict[GlossKey, str]:
+    global _dataset, _dataset_path
+    path = getattr(settings, "VOCAB_GLOSS_DATASET", "") or ""
+    if path == _dataset_path:
+        return _dataset
+    with _dataset_lock:
+        if path != _dataset_path:
+            entries: Dict[GlossKey, str] = {}
+            if path:
+                try:
+                    with open(path, encoding="utf-8") as fh:
+                        for line in fh:
+                            if not line.strip() or line.startswith("#"):
+                                continue
+                            parts = line.rstrip("\n").split("\t")
+                            if len(parts) >= 3 and parts[0] and parts[2].strip():
+                                entries.setdefault((parts[0], katakana_to_hiragana(parts[1])), parts[2].strip())
+                    logger.info("释义词典已加载：%s 条（%s）", len(entries), path)
+                except OSError as exc:
+                    logger.error("释义词典 %s 读取失败，忽略：%s", os.path.basename(path), exc)
+            _dataset, _dataset_path = entries, path
+    return _dataset
+
+
+def _is_stale(updated_at: Optional[datetime]) -> bool:
+    ttl_days = int(getattr(settings, "VOCAB_GLOSS_TTL_DAYS", 0) or 0)
+    if ttl_days <= 0 or updated_at is None:
+        return False
+    if updated_at.tzinfo is None:
+        # SQLite 读回来的是 naive datetime，存的时候是 UTC
+        updated_at = updated_at.replace(tzinfo=UTC)
+    return utc_now() - updated_at > timedelta(days=ttl_days)
+
+
+def lookup(keys: Iterable[GlossKey]) -> Dict[GlossKey, Tuple[str, str]]:
+    """返回 {(词, 读音): (释义, 来源)}，来源为 dataset / gloss；没查到或已过期的不在结果里。"""
+    wanted = list(dict.fromkeys(keys))
+    found: Dict[GlossKey, Tuple[str, str]] = {}
+    dataset = _load_dataset()
+    for key in wanted:
+        if key in dataset:
+            found[key] = (dataset[key], SOURCE_DATASET)
+    missing = [key for key in wanted if key not in found]
+    if not missing or not settings.VOCAB_GLOSS_CACHE_ENABLED:
+        return found
+
+    db = app_db.SessionLocal()
+    try:
+        rows = (
+            db.query(VocabGloss.word, VocabGloss.reading, VocabGloss.meaning, VocabGloss.updated_at)
+            .filter(VocabGloss.word.in_({word for word, _reading in missing}))
+            .all()
+        )
+    except Exception as exc:  # noqa: BLE001 - 表不存在或连不上时当作未命中
+        logger.warning("释义表查询失败，全部交给模型：%s", exc)
+        return found
+    finally:
+        db.close()
+    missing_set = set(missing)
+    for word, reading, meaning, updated_at in rows:
+        if (word, reading) in missing_set and not _is_stale(updated_at):
+            found[(word, reading)] = (meaning, SOURCE_DB)
+    return found
+
+
+def store(glosses: Dict[GlossKey, str], source: str = SOURCE_LLM) -> int:
+    """把新释义写入共享表：已存在且未过期的 (词, 读音) 不覆盖，过期的就地更新；返回写入条数。"""
+    if not glosses or not settings.VOCAB_GLOSS_CACHE_ENABLED:
+        return 0
+    db = app_db.SessionLocal()
+    try:
+        existing = {
+            (row.word, row.reading): row
+            for row in db.query(VocabGloss).filter(VocabGloss.word.in_({word for word, _reading in glosses})).all()
+        }
+        now = utc_now()
+        written = 0
+        for (word, reading), meaning in glosses.items():
+            if not meaning:
+                continue
+            row = existing.get((word, reading))
+            if row is None:
+                db.add(VocabGloss(word=word, reading=reading, meaning=meaning, source=source, created_at=now, updated_at=now))
+            elif _is_stale(row.updated_at):
+                row.meaning, row.source, row.updated_at = meaning, source, now
+            else:
+                continue
+            written += 1
+        db.commit()
+        return written
+    except IntegrityError:
+        # 另一个 worker 刚写入了同一个词，以先写入的为准
+        db.rollback()
+        return 0
+    except Exception as exc:  # noqa: BLE001
+        db.rollback()
+        logger.warning("释义表写入失败：%s", exc)
+        return 0
+    finally:
+        db.close()
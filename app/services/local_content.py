@@ -0,0 +1,143 @@
+"""
+本地生成标题与 emoji（不调 LLM）
+
+设计要点：
+- 标题优先取中文译文的第一句：去掉标点和非汉字，6~15 字直接用，过长时取第一个分句，
+  仍过长截到 15 字；译文失败或太短时改用日文原文的关键名词拼接
+- 关键名词：装了 fugashi + unidic（MeloTTS 依赖里就有）时按词性取名词，
+  否则退化为正文里连续两个以上汉字的片段；按出现次数、首次出现位置排序
+- emoji 查关键词表（日文 / 中文都收），按原文 + 译文里的命中次数选分最高的一项
+- 取不到可信结果时返回 None，由调用方决定用默认值还是回退到 LLM
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import Counter
+from typing import Optional
+
+TITLE_MIN_CHARS = 6
+TITLE_MAX_CHARS = 15
+
+_SENTENCE_END_RE = re.compile(r"[。！？!?\n]")
+_CLAUSE_RE = re.compile(r"[，,、；;：:]")
+_NON_HAN_RE = re.compile(r"[^一-龯々]")
+_KANJI_RUN_RE = re.compile(r"[一-龯々]{2,}")
+# 翻译失败时 translate_to_chinese 返回的占位文案
+_TRANSLATION_FAILED_PREFIX = "翻译失败"
+
+# (emoji, 关键词)；同一 emoji 可以有多个关键词，日文与简体中文写法都列上
+_EMOJI_KEYWORDS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("🌀", ("台風", "台风")),
+    ("🌏", ("地震", "津波", "海啸", "震度")),
+    ("🌧️", ("大雨", "豪雨", "梅雨", "暴雨", "降雨")),
+    ("❄️", ("大雪", "降雪", "暴雪")),
+    ("☀️", ("天気", "天气", "晴れ", "猛暑", "気温", "气温", "高温")),
+    ("🌸", ("桜", "樱花", "花見", "赏花")),
+    ("🍁", ("紅葉", "红叶")),
+    ("🏥", ("病院", "医院", "医療", "医疗", "感染", "ウイルス", "病毒", "ワクチン", "疫苗")),
+    ("💴", ("経済", "经济", "円安", "日元", "株価", "股价", "物価", "物价", "景気", "金利", "利率")),
+    ("🏛️", ("政府", "首相", "国会", "選挙", "选举", "政治", "内閣", "内阁")),
+    ("🎌", ("天皇", "皇室")),
+    ("⚽", ("サッカー", "足球", "ワールドカップ", "世界杯")),
+    ("⚾", ("野球", "棒球", "大谷")),
+    ("🏅", ("オリンピック", "奥运", "五輪", "金メダル", "金牌")),
+    ("🚄", ("新幹線", "新干线", "鉄道", "铁路", "電車", "电车")),
+    ("✈️", ("空港", "机场", "飛行機", "飞机", "航空")),
+    ("🚗", ("自動車", "汽车", "交通事故", "道路")),
+    ("🔥", ("火事", "火灾", "火災", "山火事")),
+    ("🎓", ("学校", "大学", "学生", "教育", "入試", "高考", "受験")),
+    ("🤖", ("生成AI", "人工知能", "人工智能", "ロボット", "机器人")),
+    ("💻", ("スマホ", "手机", "インターネット", "网络", "技術", "技术", "デジタル")),
+    ("🚀", ("宇宙", "ロケット", "火箭", "衛星", "卫星")),
+    ("🍣", ("寿司", "料理", "食べ物", "食物", "レストラン", "餐厅", "ラーメン", "拉面")),
+    ("🍵", ("お茶", "茶道", "抹茶")),
+    ("🎬", ("映画", "电影", "アニメ", "动画", "ドラマ")),
+    ("🎵", ("音楽", "音乐", "コンサート", "演唱会", "歌手")),
+    ("🐼", ("パンダ", "熊猫")),
+    ("🐾", ("動物", "动物", "動物園", "动物园", "ペット", "宠物")),
+    ("♨️", ("温泉",)),
+    ("🏯", ("観光", "观光", "旅行", "城", "神社", "寺")),
+    ("👴", ("高齢者", "老年人", "高齢化", "老龄化", "介護", "护理")),
+    ("👶", ("子ども", "子供", "儿童", "出産", "少子化")),
+    ("🌍", ("環境", "环境", "温暖化", "变暖", "気候", "气候")),
+)
+
+_tagger = None
+_tagger_checked = False
+_tagger_lock = threading.Lock()
+
+
+def get_tagger():
+    """fugashi 是软依赖：不可用时返回 None，调用方改用汉字片段。"""
+    global _tagger, _tagger_checked
+    if not _tagger_checked:
+        with _tagger_lock:
+            if not _tagger_checked:
+                try:
+                    import fugashi
+
+                    _tagger = fugashi.Tagger()
+                except Exception:  # noqa: BLE001 - 缺包或缺词典都按不可用处理
+                    _tagger = None
+                _tagger_checked = True
+    return _tagger
+
+
+def key_nouns(text: str, limit: int = 5) -> list[str]:
+    """正文前 800 字里的关键名词，按出现次数、首次出现位置排序。"""
+    head = (text or "")[:800]
+    tagger = get_tagger()
+    if tagger is not None:
+        words = []
+        for word in tagger(head):
+            feature = word.feature
+            if getattr(feature, "pos1", None) != "名詞" or getattr(feature, "pos2", None) in ("数詞", "代名詞"):
+                continue
+            surface = word.surface
+            if len(surface) >= 2 and _NON_HAN_RE.sub("", surface):
+                words.append(surface)
+    else:
+        words = _KANJI_RUN_RE.findall(head)
+    counts = Counter(words)
+    first_seen = {word: index for index, word in reversed(list(enumerate(words)))}
+    return sorted(counts, key=lambda word: (-counts[word], first_seen[word]))[:limit]
+
+
+def title_from_translation(translation: Optional[str]) -> Optional[str]:
+    """中文译文第一句 → 6~15 个汉字的标题；译文不可用时返回 None。"""
+    if not translation or translation.startswith(_TRANSLATION_FAILED_PREFIX):
+        return None
+    first = next((part for part in _SENTENCE_END_RE.split(translation.strip()) if part.strip()), "")
+    title = _NON_HAN_RE.sub("", first)
+    if len(title) > TITLE_MAX_CHARS:
+        clause = _NON_HAN_RE.sub("", _CLAUSE_RE.split(first)[0])
+        title = clause if TITLE_MIN_CHARS <= len(clause) <= TITLE_MAX_CHARS else title[:TITLE_MAX_CHARS]
+    return title if len(title) >= TITLE_MIN_CHARS else None
+
+
+def title_from_nouns(text: str) -> Optional[str]:
+    """把关键名词拼成不超过 15 字的标题；取不到汉字名词时返回 None。"""
+    title = ""
+    for noun in key_nouns(text, limit=10):
+        noun = _NON_HAN_RE.sub("", noun)
+        if not noun or len(title) + len(noun) > TITLE_MAX_CHARS:
+            continue
+        title += noun
+        if len(title) >= TITLE_MIN_CHARS:
+            break
+    return title if len(title) >= 2 else None
+
+
+def pick_emoji(text: str, translation: Optional[str] = None) -> Optional[str]:
+    """按关键词命中次数选 emoji；一个都没命中返回 None。"""
+    if translation and translation.startswith(_TRANSLATION_FAILED_PREFIX):
+        translation = None
+    haystack = f"{text or ''}\n{translation or ''}"
+    best, best_score = None, 0
+    for emoji, keywords in _EMOJI_KEYWORDS:
+        score = sum(haystack.count(keyword) for keyword in keywords)
+        if score > best_score:
+            best, best_score = emoji, score
+    return best
@@ -0,0 +1,139 @@
+"""
+本地选词（生词表不再让 LLM 挑词）
+
+设计要点：
+- 分词：装了 fugashi + unidic 时取名词 / 动词 / 形容词的原形与读音（跳过数词、代名词、固有名词）；
+  否则用 pykakasi 的切分结果，只保留整段都是汉字的片段
+- 难度：词里最难的汉字按 furigana_filter 的常用汉字表定级，高于用户等级的才算生词；
+  常用表只覆盖到 N3，N3 以上的用户只挑含表外汉字的词
+- 排序：等级差大的优先，其次按文中出现次数，再按首次出现位置；结果完全确定
+- 用户已掌握的词（VocabularyEntry.status == mastered）直接跳过
+- 读音（罗马音）本地生成，释义留给调用方一次批量补齐
+- word_reading 给模型挑出的词补本地读音，两种模式的词都按同一个 (词, 读音) 查共享释义表
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from app.services.furigana_filter import UNLISTED_KANJI_LEVEL, word_kanji_level
+from app.services.local_content import get_tagger
+
+VOCAB_MAX_WORDS = 8
+
+_KANJI_ONLY_RE = re.compile(r"^[一-龯々]{2,}$")
+_HAS_KANJI_RE = re.compile(r"[一-龯々]")
+_CONTENT_POS = ("名詞", "動詞", "形容詞")
+_SKIPPED_POS2 = ("数詞", "代名詞", "固有名詞")
+
+_kakasi = None
+_kakasi_lock = threading.Lock()
+
+
+def _get_kakasi():
+    global _kakasi
+    if _kakasi is None:
+        with _kakasi_lock:
+            if _kakasi is None:
+                import pykakasi
+
+                _kakasi = pykakasi.kakasi()
+    return _kakasi
+
+
+@dataclass
+class VocabCandidate:
+    word: str
+    reading: str  # 平假名
+    level: int
+    count: int
+    first_seen: int
+
+    @property
+    def romaji(self) -> str:
+        return to_romaji(self.reading)
+
+
+def to_romaji(kana: str) -> str:
+    """假名 → 平文式罗马音（与原先 LLM 返回的 pronunciation 格式一致）。"""
+    return "".join(item["hepburn"] for item in _get_kakasi().convert(kana or ""))
+
+
+def katakana_to_hiragana(kana: str) -> str:
+    return "".join(chr(ord(char) - 0x60) if "ァ" <= char <= "ヶ" else char for char in kana)
+
+
+def _usable(word: str) -> bool:
+    return len(word) > 1 and bool(_HAS_KANJI_RE.search(word)) and not any(char.isdigit() for char in word)
+
+
+def _tokens_with_tagger(tagger, text: str) -> List[tuple]:
+    tokens = []
+    for word in tagger(text):
+        feature = word.feature
+        if getattr(feature, "pos1", None) not in _CONTENT_POS or getattr(feature, "pos2", None) in _SKIPPED_POS2:
+            continue
+        lemma = getattr(feature, "orthBase", None) or word.surface
+        kana = getattr(feature, "kanaBase", None) or getattr(feature, "kana", None)
+        if not kana or kana == "*" or not _usable(lemma):
+            continue
+        tokens.append((lemma, katakana_to_hiragana(kana)))
+    return tokens
+
+
+def _tokens_with_kakasi(text: str) -> List[tuple]:
+    return [
+        (item["orig"], item["hira"])
+        for item in _get_kakasi().convert(text)
+        if _KANJI_ONLY_RE.match(item["orig"]) and _usable(item["orig"])
+    ]
+
+
+def tokenize(text: str) -> List[tuple]:
+    """正文 → [(词, 平假名读音)]，按出现顺序，可重复。"""
+    tagger = get_tagger()
+    if tagger is not None:
+        return _tokens_with_tagger(tagger, text or "")
+    return _tokens_with_kakasi(text or "")
+
+
+def word_reading(word: str) -> str:
+    """单个词的平假名读音；分词器把它切成一个词时用词典读音，否则用 pykakasi 逐段拼接。"""
+    tokens = tokenize(word)
+    if len(tokens) == 1 and tokens[0][0] == word:
+        return tokens[0][1]
+    return "".join(item["hira"] for item in _get_kakasi().convert(word or ""))
+
+
+def select_vocabulary(
+    text: str,
+    level: int | str | None = 1,
+    known_words: Optional[Iterable[str]] = None,
+    limit: int = VOCAB_MAX_WORDS,
+) -> List[VocabCandidate]:
+    """挑出高于用户等级、用户还没掌握的词，按难度和频次排序后取前 limit 个。"""
+    try:
+        user_level = max(1, min(5, int(level or 1)))
+    except (TypeError, ValueError):
+        user_level = 1
+    # 常用表只分到 N3：更高等级的用户只把表外汉字当作生词
+    threshold = min(user_level, UNLISTED_KANJI_LEVEL - 1)
+    known = {word.strip() for word in known_words or () if word}
+
+    candidates: dict[str, VocabCandidate] = {}
+    for index, (word, reading) in enumerate(tokenize(text)):
+        if word in known:
+            continue
+        candidate = candidates.get(word)
+        if candidate is not None:
+            candidate.count += 1
+            continue
+        word_level = word_kanji_level(word)
+        if word_level > threshold:
+            candidates[word] = VocabCandidate(word, reading, word_level, 1, index)
+
+    ranked = sorted(candidates.values(), key=lambda item: (-item.level, -item.count, item.first_seen))
+    return ranked[:limit]
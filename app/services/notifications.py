@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from sqlalchemy.orm import Session
 
+from app.core.tracing import traced
 from app.model.models import Notification
 from app.utils.time import datetime_to_isoformat, utc_now
 
@@ -22,6 +23,7 @@ def _notification_payload(notification: Notification) -> dict[str, str | int | b
     }
 
 
+@traced("db.create_notification")
 def create_notification(
     db: Session,
     *,
@@ -7,6 +7,7 @@ from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import requests
 from bs4 import BeautifulSoup
 
+from app.core import metrics
 from app.core.config import settings
 from app.services.services import log_with_time
 from app.utils.url import normalize_http_url
@@ -332,6 +333,13 @@ def _normalize_feed_item(raw_item: dict, source_feed_url: str) -> dict | None:
 
 def fetch_rsshub_feed_items(source_url: str | None, limit: int = 12) -> list[dict]:
     """Fetch and normalize items from an RSSHub route."""
+    with metrics.track_duration(metrics.RSSHUB_FETCH_SECONDS):
+        items = _fetch_rsshub_feed_items(source_url, limit)
+    metrics.RSSHUB_ITEMS_TOTAL.inc(len(items))
+    return items
+
+
+def _fetch_rsshub_feed_items(source_url: str | None, limit: int) -> list[dict]:
     normalized_source = normalize_rsshub_source_url(source_url, feed_format="json")
     if not normalized_source:
         return []
@@ -2,17 +2,29 @@ import json
 import pykakasi
 import openai
 from passlib.hash import pbkdf2_sha256
-from typing import List, Dict, Tuple
+from typing import Iterable, List, Dict, Tuple
+from app.core import metrics, tracing
 from app.core.config import settings
 import concurrent.futures
+import contextvars
+import functools
 import threading
 import asyncio
-import inspect
-import traceback
+import re
+import sys
+import time
 import logging
-from app.services.ai_client_async import AIClient, AIClientError
+from app.core.logging_config import level_from_name
+from app.services.ai_client_async import (
+    AIClient,
+    AIClientError,
+    current_subtask,
+    deadline_expired,
+    subtask_budget,
+    subtask_deadline_seconds,
+)
+from app.services import ai_router, gloss_cache, local_content, local_vocab
 from app.services.furigana_filter import apply_furigana_filter
-from app.utils.time import beijing_now
 
 try:
     import bcrypt as bcrypt_backend
@@ -20,11 +32,13 @@ except ImportError:
     bcrypt_backend = None
 
 
-# 日志函数，包含北京时间
-def log_with_time(message: str, level: str = "INFO"):
-    """带北京时间的日志输出"""
-    timestamp = beijing_now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"[{timestamp}] [{level}] {message}")
+logger = logging.getLogger("yomu")
+
+
+# 日志函数：保留旧签名，时间戳（北京时间）由 app.core.logging_config 在后台线程格式化
+def log_with_time(message: str, level: str = "INFO", exc_info: bool = False):
+    """兼容旧调用点的日志入口，实际走 logging 队列"""
+    logger.log(level_from_name(level), message, exc_info=exc_info)
 
 
 kks = pykakasi.kakasi()
@@ -35,7 +49,7 @@ def get_openai_client(api_key: str | None, base_url: str | None):
     # 简单调试日志（生产可改为使用logging）
     try:
         masked = (api_key[:6] + '***' + api_key[-4:]) if api_key and len(api_key) > 10 else ('None' if not api_key else '***')
-        log_with_time(f"[AI] Init client. Header API Key: {masked}; header base_url={base_url or 'None'}")
+        log_with_time(f"[AI] Init client. Header API Key: {masked}; header base_url={base_url or 'None'}", level="DEBUG")
     except Exception:
         pass
     if api_key:
@@ -43,11 +57,15 @@ def get_openai_client(api_key: str | None, base_url: str | None):
         provider = {"api_url": base_url or '', "api_key": api_key, "model": None, "extra": {}}
         return SyncCompatClient(provider)
     else:
-        # Log caller stack to help trace which code path invoked this without an API key
+        # 只记录直接调用方：inspect.stack() / format_stack() 会读源码文件，代价远高于这条日志本身
         try:
-            caller = inspect.stack()[1]
-            logging.error("get_openai_client called without api_key. caller: %s:%s in %s", caller.filename, caller.lineno, caller.function)
-            logging.error("Call stack:\n%s", ''.join(traceback.format_stack()))
+            caller = sys._getframe(1)
+            logger.warning(
+                "get_openai_client called without api_key. caller: %s:%s in %s",
+                caller.f_code.co_filename,
+                caller.f_lineno,
+                caller.f_code.co_name,
+            )
         except Exception:
             pass
         raise ValueError("必须提供API key才能使用AI功能 (get_openai_client called without api_key)")
@@ -66,18 +84,34 @@ def _kakasi_ruby(text: str) -> str:
     return ruby_html
 
 
+# 各子任务共享的上下文前缀：system 消息只包含通用角色说明和文章全文，五个子任务逐字节一致，
+# provider 端的前缀缓存（OpenAI / DeepSeek 自动缓存、Claude 的 cache_control）可以跨子任务复用；
+# 子任务各自的要求全部放在后面的 user 消息里
+_ARTICLE_CONTEXT_PROMPT = (
+    "你是一名日语教师兼翻译，帮助中文母语的日语学习者阅读文章。"
+    "下面是本次要处理的日语文章，之后的指令都针对这篇文章。\n\n"
+    "<article>\n{text}\n</article>"
+)
+
+
+def article_messages(text: str, instruction: str) -> list:
+    return [
+        {"role": "system", "content": _ARTICLE_CONTEXT_PROMPT.format(text=text)},
+        {"role": "user", "content": instruction},
+    ]
+
+
 def _ai_fix_ruby(original_text: str, kakasi_ruby_html: str, model: str, client: openai.OpenAI) -> str:
     prompt = (
-        "你是日语教师。请对下面的带有ruby标注的HTML进行校对，确保每个汉字词的假名准确。"
+        "下面是上文文章带有ruby标注的HTML，请进行校对，确保每个汉字词的假名准确。"
         "只返回修正后的HTML，不要解释。\n\n"
-        f"原文：\n{original_text}\n\n"
         f"当前ruby HTML：\n{kakasi_ruby_html}"
     )
     try:
-        log_with_time(f"[AI] CALL _ai_fix_ruby model={model} len(text)={len(original_text)}")
+        log_with_time(f"[AI] CALL _ai_fix_ruby model={model} len(text)={len(original_text)}", level="DEBUG")
         resp = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=article_messages(original_text, prompt),
         )
         content = resp.choices[0].message.content.strip()
         return content or kakasi_ruby_html
@@ -88,15 +122,14 @@ def _ai_fix_ruby(original_text: str, kakasi_ruby_html: str, model: str, client:
 
 def _ai_ruby(original_text: str, model: str, client: openai.OpenAI) -> str:
     prompt = (
-        "请将下面的日语文本转换为带ruby注音的HTML，要求：只输出HTML本身，"
-        "对需要注音的词使用 <ruby>漢字<rt>かな</rt></ruby>，对假名和标点原样输出。\n\n"
-        f"文本：\n{original_text}"
+        "请将上面的文章转换为带ruby注音的HTML，要求：只输出HTML本身，"
+        "对需要注音的词使用 <ruby>漢字<rt>かな</rt></ruby>，对假名和标点原样输出。"
     )
     try:
-        log_with_time(f"[AI] CALL _ai_ruby model={model} len(text)={len(original_text)}")
+        log_with_time(f"[AI] CALL _ai_ruby model={model} len(text)={len(original_text)}", level="DEBUG")
         resp = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=article_messages(original_text, prompt),
         )
         content = resp.choices[0].message.content.strip()
         return content
@@ -119,8 +152,116 @@ def generate_ruby(text: str, model: str, client: openai.OpenAI) -> str:
     return apply_furigana_filter(ruby_html, getattr(settings, "FURIGANA_LEVEL_FILTER", 1))
 
 
-def extract_vocabulary(text: str, model: str, client: openai.OpenAI) -> List[Dict]:
-    prompt = f"""分析以下日语文本，提取出可能对初学者或中级学习者困难的词语。
+# 批量补释义时模型漏掉的词用这个占位
+_MISSING_MEANING = "释义待补充"
+
+
+def uses_local_vocab() -> bool:
+    """AI_VOCAB_MODE=local 时才需要用户已掌握的词；调用方据此决定要不要去查。"""
+    return (settings.AI_VOCAB_MODE or "llm").lower() == "local"
+
+
+def extract_vocabulary(
+    text: str,
+    model: str,
+    client: openai.OpenAI,
+    level: int | None = None,
+    known_words: Iterable[str] | None = None,
+) -> List[Dict]:
+    """
+    提取生词：AI_VOCAB_MODE=llm（默认）时整篇交给模型挑词（不感知用户等级和已掌握的词），
+    挑出的词按本地读音查共享释义表，命中的用表里的释义，没命中的写回表里；
+    local 时本地分词选词、生成罗马音，释义先查共享释义表，没见过的词再用一次模型批量补齐
+    """
+    if not uses_local_vocab():
+        vocab = _llm_extract_vocabulary(text, model, client, shared=settings.VOCAB_GLOSS_CACHE_ENABLED)
+        return _apply_shared_glosses(vocab)
+    if level is None:
+        level = getattr(settings, "FURIGANA_LEVEL_FILTER", 1)
+    candidates = local_vocab.select_vocabulary(text, level, known_words)
+    if not candidates:
+        return []
+    # 先查共享释义表（离线词典 + 数据库），只有没见过的词才交给模型
+    glosses = gloss_cache.lookup((candidate.word, candidate.reading) for candidate in candidates)
+    unseen = [candidate for candidate in candidates if (candidate.word, candidate.reading) not in glosses]
+    if unseen:
+        meanings = _batch_meanings(text, unseen, model, client, shared=settings.VOCAB_GLOSS_CACHE_ENABLED)
+        learned = {(candidate.word, candidate.reading): meanings[candidate.word] for candidate in unseen if candidate.word in meanings}
+        gloss_cache.store(learned)
+        glosses.update({key: (meaning, gloss_cache.SOURCE_LLM) for key, meaning in learned.items()})
+    vocab = []
+    for candidate in candidates:
+        meaning, source = glosses.get((candidate.word, candidate.reading), (None, "missing"))
+        metrics.AI_VOCAB_WORDS_TOTAL.labels(source=source).inc()
+        vocab.append({
+            'word': candidate.word,
+            'meaning': meaning or _MISSING_MEANING,
+            'pronunciation': candidate.romaji,
+        })
+    return vocab
+
+
+def _apply_shared_glosses(vocab: List[Dict]) -> List[Dict]:
+    """llm 模式：模型挑出的词用共享释义表里的释义覆盖，表里没有的释义写回去。"""
+    if not vocab:
+        return vocab
+    keys = [(item['word'], local_vocab.word_reading(item['word'])) for item in vocab]
+    glosses = gloss_cache.lookup(keys)
+    learned = {}
+    for item, key in zip(vocab, keys):
+        if key in glosses:
+            meaning, source = glosses[key]
+            item['meaning'] = meaning
+        elif item['meaning'] and item['meaning'] != _MISSING_MEANING:
+            learned[key] = item['meaning']
+            source = gloss_cache.SOURCE_LLM
+        else:
+            source = "missing"
+        metrics.AI_VOCAB_WORDS_TOTAL.labels(source=source).inc()
+    gloss_cache.store(learned)
+    return vocab
+
+
+def _batch_meanings(text: str, candidates: list, model: str, client: openai.OpenAI, shared: bool = False) -> Dict[str, str]:
+    """一次请求补齐所有选中词的中文释义；失败时返回空表，由调用方填占位。
+
+    shared=True 时释义会写进跨用户共享表，要的是脱离本文语境的词典释义，
+    否则一篇文章里的语境义会被别的文章复用。
+    """
+    lines = "\n".join(f"- {candidate.word}（{candidate.reading}）" for candidate in candidates)
+    if shared:
+        instruction = "请给出每个词的简短中文词典释义（通用义项，不要只按本文语境解释；多义词用；分隔常用义项）"
+    else:
+        instruction = "请给出每个词在文中语境下的简短中文释义"
+    prompt = f"""下面是从上面文章中选出的生词（括号里是读音），{instruction}。
+只返回JSON数组，不要其他内容，例如：
+[{{"word": "世界", "meaning": "世界"}}]
+
+{lines}"""
+    try:
+        log_with_time(f"[AI] CALL vocab meanings model={model} words={len(candidates)}", level="DEBUG")
+        response = client.chat.completions.create(
+            model=model,
+            messages=article_messages(text, prompt)
+        )
+        content = response.choices[0].message.content.strip()
+        match = re.search(r"\[.*\]", content, re.S)
+        items = json.loads(match.group(0)) if match else []
+    except Exception as e:
+        log_with_time(f"[AI] vocab meanings failed: {e}")
+        return {}
+    wanted = {candidate.word for candidate in candidates}
+    meanings = {}
+    for item in items:
+        if isinstance(item, dict) and item.get('word') in wanted and str(item.get('meaning') or '').strip():
+            meanings[item['word']] = str(item['meaning']).strip()
+    return meanings
+
+
+def _llm_extract_vocabulary(text: str, model: str, client: openai.OpenAI, shared: bool = False) -> List[Dict]:
+    # 释义要写进共享表时按词典义问，同 _batch_meanings
+    meaning_spec = "中文词典释义（通用义项，不要只按本文语境解释）" if shared else "中文释义"
+    prompt = """分析上面的日语文章，提取出可能对初学者或中级学习者困难的词语。
 重点提取：
 - 汉字复合词
 - 生僻词语
@@ -129,22 +270,20 @@ def extract_vocabulary(text: str, model: str, client: openai.OpenAI) -> List[Dic
 
 对于每个词语，请提供：
 - word: 日语词语（必须是日语，不要包含英文）
-- meaning: 中文释义
+- meaning: """ + meaning_spec + """
 - pronunciation: 罗马音读音
 
 只提取真正困难的词语（3-8个），跳过简单词语如"です"、"ます"等。
 返回JSON格式的数组，例如：
 [
-  {{"word": "こんにちは", "meaning": "你好", "pronunciation": "konnichiwa"}},
-  {{"word": "世界", "meaning": "世界", "pronunciation": "sekai"}}
-]
-
-文本：{text}"""
+  {"word": "こんにちは", "meaning": "你好", "pronunciation": "konnichiwa"},
+  {"word": "世界", "meaning": "世界", "pronunciation": "sekai"}
+]"""
     try:
-        log_with_time(f"[AI] CALL extract_vocabulary model={model} len(text)={len(text)}")
+        log_with_time(f"[AI] CALL _llm_extract_vocabulary model={model} len(text)={len(text)}", level="DEBUG")
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=article_messages(text, prompt)
         )
         content = response.choices[0].message.content.strip()
 
@@ -196,26 +335,24 @@ def extract_vocabulary(text: str, model: str, client: openai.OpenAI) -> List[Dic
             return filtered_words[:5]  # 限制最多5个词语
 
     except Exception as e:
-        log_with_time(f"[AI] extract_vocabulary failed: {e}")
+        log_with_time(f"[AI] _llm_extract_vocabulary failed: {e}")
         return []
 
 
 def translate_to_chinese(text: str, model: str, client: openai.OpenAI) -> str:
-    prompt = f"""请将以下日语文本翻译成自然、流畅的中文。
+    prompt = """请将上面的日语文章翻译成自然、流畅的中文。
 要求：
 - 保持原文的语气和风格
 - 翻译要准确、易懂
 - 适当处理文化差异
 - 保持段落结构
 
-日语文本：{text}
-
 请直接返回中文翻译，不要添加其他说明。"""
     try:
-        log_with_time(f"[AI] CALL translate_to_chinese model={model} len(text)={len(text)}")
+        log_with_time(f"[AI] CALL translate_to_chinese model={model} len(text)={len(text)}", level="DEBUG")
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=article_messages(text, prompt)
         )
         translation = response.choices[0].message.content.strip()
         return translation
@@ -224,8 +361,69 @@ def translate_to_chinese(text: str, model: str, client: openai.OpenAI) -> str:
         return "翻译失败，请检查AI配置"
 
 
+# 短输出子任务的流式截断：标题最多 15 字、emoji 只要一个，够了就断开连接
+_TITLE_MAX_CHARS = 15
+_TITLE_MAX_CHUNKS = 64
+_EMOJI_MAX_CHUNKS = 16
+_TITLE_QUOTES = '"“”『』「」'
+_EMOJI_JOINERS = {"\u200d", "\ufe0f", "\ufe0e"}
+
+
+_DEFAULT_TITLE = "朗读练习"
+_DEFAULT_EMOJI = "📝"
+# 子任务时限之外再等这么久才在 generate_all_content 里降级（正常情况下 chat() 已先超时）
+_SUBTASK_GRACE_SECONDS = 2.0
+
+
+def local_title(text: str, translation: str | None = None) -> str:
+    """不调 LLM 的标题：优先取译文第一句，其次拼原文关键名词，都取不到时用默认标题。"""
+    return (
+        local_content.title_from_translation(translation)
+        or local_content.title_from_nouns(text)
+        or _DEFAULT_TITLE
+    )
+
+
+def _local_title_and_emoji(text: str, translation: str, model: str, client: openai.OpenAI) -> Tuple[str, str]:
+    """AI_TITLE_EMOJI_MODE=local：标题 / emoji 本地生成；取不到且开启了 LLM 回退时才调用模型。"""
+    title = local_content.title_from_translation(translation)
+    source = "translation"
+    if title is None:
+        title, source = local_content.title_from_nouns(text), "nouns"
+    if title is None and settings.AI_TITLE_EMOJI_LLM_FALLBACK:
+        with subtask_budget("title"):
+            title, source = generate_title(text, model, client), "llm"
+    metrics.AI_LOCAL_CONTENT_TOTAL.labels(subtask="title", source=source if title else "default").inc()
+
+    emoji = local_content.pick_emoji(text, translation)
+    source = "keywords"
+    if emoji is None and settings.AI_TITLE_EMOJI_LLM_FALLBACK:
+        with subtask_budget("emoji"):
+            emoji, source = generate_emoji(text, model, client), "llm"
+    metrics.AI_LOCAL_CONTENT_TOTAL.labels(subtask="emoji", source=source if emoji else "default").inc()
+    return title or _DEFAULT_TITLE, emoji or _DEFAULT_EMOJI
+
+
+def _title_complete(partial: str) -> bool:
+    stripped = partial.strip()
+    if "\n" in stripped:
+        return True
+    # 多留几个字，避免把"标题："之类的前缀算进去后截得太短
+    return len(stripped.strip(_TITLE_QUOTES)) >= _TITLE_MAX_CHARS + 5
+
+
+def _emoji_complete(partial: str) -> bool:
+    stripped = partial.strip()
+    if not stripped:
+        return False
+    # 已经出现空白分隔，或首个 emoji 的组合序列已闭合（末尾不是 ZWJ / 变体选择符）
+    if len(partial.lstrip()) > len(stripped):
+        return True
+    return stripped[-1] not in _EMOJI_JOINERS and not (len(stripped) == 1 and 0x1F1E6 <= ord(stripped) <= 0x1F1FF)
+
+
 def generate_title(text: str, model: str, client: openai.OpenAI) -> str:
-    prompt = f"""下面是一段日语课文内容，请你基于主要主题生成一个『简体中文』标题：
+    prompt = """请基于上面日语文章的主要主题生成一个『简体中文』标题：
 要求：
 1. 仅输出简体中文标题本身，不要任何前缀/引号/标点（例如“标题：”或冒号都不要）。
 2. 长度 6~15 个汉字，尽量精炼概括主题。
@@ -233,22 +431,24 @@ def generate_title(text: str, model: str, client: openai.OpenAI) -> str:
 4. 不要使用书名号、引号、感叹号、句号等标点。
 5. 避免太空泛的词（如“故事”“文章”），应具体到语义核心。
 
-日语原文（截断前800字符）：\n{text[:800]}\n\n请直接输出标题："""
+请直接输出标题："""
     try:
-        log_with_time(f"[AI] CALL generate_title model={model} len(text)={len(text)}")
+        log_with_time(f"[AI] CALL generate_title model={model} len(text)={len(text)}", level="DEBUG")
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=article_messages(text, prompt),
+            max_chunks=_TITLE_MAX_CHUNKS,
+            stream=True,
+            stop_when=_title_complete,
         )
         title = response.choices[0].message.content.strip()
         title = title.strip('"“”『』「」')
-        import re
         if re.search(r'[ぁ-ゖ]', title) or re.search(r'[A-Za-z]', title):
             try:
                 fix_prompt = f"请将下面这段标题改写成符合要求的纯简体中文（6~15个汉字，无标点，无外文）：{title}\n只输出改写后的标题。"
                 fix_resp = client.chat.completions.create(
                     model=model,
-                    messages=[{"role": "user", "content": fix_prompt}]
+                    messages=article_messages(text, fix_prompt)
                 )
                 fixed = fix_resp.choices[0].message.content.strip().strip('"“”『』「」')
                 if fixed:
@@ -258,11 +458,12 @@ def generate_title(text: str, model: str, client: openai.OpenAI) -> str:
         if len(title) > 15:
             title = title[:15]
         if not re.search(r'[一-龯]', title):
-            title = "朗读练习"
-        return title or "朗读练习"
+            title = local_title(text)
+        return title or local_title(text)
     except Exception as e:
         log_with_time(f"[AI] generate_title failed: {e}")
-        return "朗读练习"
+        metrics.AI_SUBTASK_DEGRADED_TOTAL.labels(subtask="title").inc()
+        return local_title(text)
 
 
 def hash_password(password: str) -> str:
@@ -300,42 +501,68 @@ def verify_legacy_bcrypt_password(password: str, password_hash: str) -> bool:
         return False
 
 
-def generate_all_content(text: str, model: str, client: openai.OpenAI) -> Tuple[str, List[Dict], str, str, str]:
+def generate_all_content(
+    text: str,
+    model: str,
+    client: openai.OpenAI,
+    level: int | None = None,
+    known_words: Iterable[str] | None = None,
+) -> Tuple[str, List[Dict], str, str, str]:
     """
     并发生成所有AI内容：注音、词汇、翻译、标题、emoji
+    level / known_words 是用户等级和已掌握的词，只影响本地选词
     返回：(ruby_text, vocab, translation, title, emoji)
     """
-    def generate_ruby_task():
-        return generate_ruby(text, model, client)
-
-    def extract_vocab_task():
-        return extract_vocabulary(text, model, client)
-
-    def translate_task():
-        return translate_to_chinese(text, model, client)
-
-    def generate_title_task():
-        return generate_title(text, model, client)
-
-    def generate_emoji_task():
-        return generate_emoji(text, model, client)
+    def run_subtask(subtask: str, generator):
+        with tracing.span(f"ai.subtask.{subtask}", subtask=subtask, model=model, text_len=len(text)):
+            with metrics.track_duration(metrics.AI_SUBTASK_SECONDS, subtask=subtask), subtask_budget(subtask):
+                return generator(text, model, client)
+
+    def submit(subtask: str, generator):
+        # 每个任务复制一份当前上下文，request_id / 父 span 等 contextvars 才能带进工作线程
+        return executor.submit(contextvars.copy_context().run, run_subtask, subtask, generator)
+
+    started = time.monotonic()
+    local_title_emoji = (settings.AI_TITLE_EMOJI_MODE or "llm").lower() == "local"
+
+    def collect(future, subtask: str, degrade=None):
+        # 时限在 chat() 内部已强制执行，这里只多留一点余量兜底；没配时限的沿用 300 秒
+        budget = subtask_deadline_seconds(subtask)
+        if budget is None:
+            timeout = 300
+        else:
+            timeout = max(0.0, started + budget + _SUBTASK_GRACE_SECONDS - time.monotonic())
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            if degrade is None:
+                raise
+            metrics.AI_SUBTASK_DEGRADED_TOTAL.labels(subtask=subtask).inc()
+            log_with_time(f"[AI] {subtask} 超过时限，使用本地降级结果", level="WARNING")
+            return degrade()
 
     # 使用ThreadPoolExecutor并发执行所有任务
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+    with tracing.span("ai.generate_all_content", model=model, text_len=len(text)):
         # 提交所有任务
-        ruby_future = executor.submit(generate_ruby_task)
-        vocab_future = executor.submit(extract_vocab_task)
-        translation_future = executor.submit(translate_task)
-        title_future = executor.submit(generate_title_task)
-        emoji_future = executor.submit(generate_emoji_task)
+        ruby_future = submit("ruby", generate_ruby)
+        vocab_options = {key: value for key, value in (("level", level), ("known_words", known_words)) if value is not None}
+        vocab_future = submit("vocab", functools.partial(extract_vocabulary, **vocab_options))
+        translation_future = submit("translation", translate_to_chinese)
+        if not local_title_emoji:
+            title_future = submit("title", generate_title)
+            emoji_future = submit("emoji", generate_emoji)
 
         # 等待所有任务完成并获取结果
         try:
-            ruby_text = ruby_future.result(timeout=300)  # 300秒超时
-            vocab = vocab_future.result(timeout=300)
-            translation = translation_future.result(timeout=300)
-            title = title_future.result(timeout=300)
-            emoji = emoji_future.result(timeout=300)
+            ruby_text = collect(ruby_future, "ruby")
+            vocab = collect(vocab_future, "vocab")
+            translation = collect(translation_future, "translation")
+            if local_title_emoji:
+                title, emoji = _local_title_and_emoji(text, translation, model, client)
+            else:
+                title = collect(title_future, "title", lambda: local_title(text, translation))
+                emoji = collect(emoji_future, "emoji", lambda: local_content.pick_emoji(text, translation) or _DEFAULT_EMOJI)
 
             return ruby_text, vocab, translation, title, emoji
 
@@ -347,17 +574,21 @@ def generate_all_content(text: str, model: str, client: openai.OpenAI) -> Tuple[
             # 重新抛出异常，保持质量优先原则
             raise Exception(f"AI生成失败: {str(e)}")
 
+        finally:
+            # 降级返回时不等还在跑的子任务（它们会在各自时限内结束）
+            executor.shutdown(wait=False)
+
 
 def generate_emoji(text: str, model: str, client: openai.OpenAI) -> str:
-    prompt = (
-        "请从下面文本的主题中，选择一个最能代表它的 emoji。只输出一个 emoji 字符，不要任何其他内容。\n\n"
-        f"文本：\n{text[:400]}"
-    )
+    prompt = "请从上面文章的主题中，选择一个最能代表它的 emoji。只输出一个 emoji 字符，不要任何其他内容。"
     try:
-        log_with_time(f"[AI] CALL generate_emoji model={model} len(text)={len(text)}")
+        log_with_time(f"[AI] CALL generate_emoji model={model} len(text)={len(text)}", level="DEBUG")
         resp = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=article_messages(text, prompt),
+            max_chunks=_EMOJI_MAX_CHUNKS,
+            stream=True,
+            stop_when=_emoji_complete,
         )
         emoji = resp.choices[0].message.content.strip()
         # 简单清洗：限制长度，避免返回描述文字
@@ -366,23 +597,39 @@ def generate_emoji(text: str, model: str, client: openai.OpenAI) -> str:
         return emoji
     except Exception as e:
         log_with_time(f"[AI] generate_emoji failed: {e}")
-        return "📝"
+        metrics.AI_SUBTASK_DEGRADED_TOTAL.labels(subtask="emoji").inc()
+        return _DEFAULT_EMOJI
 
 
 class SyncCompatCompletions:
     def __init__(self, provider: dict):
         self.provider = provider
 
-    def create(self, model: str, messages: list, max_tokens: int = None):
+    def create(self, model: str, messages: list, max_chunks: int = None, stream: bool = False, stop_when=None):
         # Ensure provider model is set
         self.provider['model'] = model
-        client = AIClient.factory(self.provider)
-        try:
-            # Run async client in this sync context (safe inside ThreadPoolExecutor worker threads)
-            resp = asyncio.run(client.chat(messages))
-        except Exception as e:
-            # Normalize to raise as-is so callers see the error
-            raise e
+        subtask = current_subtask()
+        # 按 AI_SUBTASK_ROUTES 依次尝试候选 provider，失败切下一个；未配置路由时只有用户自己的配置
+        candidates = ai_router.router.plan(subtask, dict(self.provider))
+        resp = None
+        for index, (name, provider) in enumerate(candidates):
+            if deadline_expired():
+                # 子任务时限已过：后面的候选根本不会发出请求，不再切换，也不计入它们的健康度
+                raise AIClientError(f"AI 子任务 {subtask or 'chat'} 超过时限")
+            client = AIClient.factory(provider)
+            try:
+                # Run async client in this sync context (safe inside ThreadPoolExecutor worker threads)
+                # stream=True + stop_when：短输出子任务拿到需要的内容就断开，不等完整生成
+                resp = asyncio.run(client.chat(messages, stream=stream, stop_when=stop_when, max_chunks=max_chunks))
+            except Exception as e:
+                ai_router.record_outcome(name, subtask, ok=False)
+                if index == len(candidates) - 1 or deadline_expired():
+                    # Normalize to raise as-is so callers see the error
+                    raise e
+                log_with_time(f"[AI] provider {name} 调用失败，切换到 {candidates[index + 1][0]}: {e}", level="WARNING")
+                continue
+            ai_router.record_outcome(name, subtask, ok=True)
+            break
         # Build a small object compatible with existing usage: resp.choices[0].message.content
         class _Message:
             def __init__(self, content):
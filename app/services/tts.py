@@ -4,28 +4,53 @@ MeloTTS 服务封装
 设计要点：
 - 懒加载模型：首次 /api/tts 请求时从 HuggingFace 下载 JP checkpoint（30-60s），
   之后常驻进程内存；启动期不阻塞 ready
-- 磁盘 hash 缓存：相同 (text, speed, language) 复用 WAV，避免重复推理
-- 线程安全：MeloTTS 模型对象不是并发安全的，所有推理串行化（_infer_lock）
+- 磁盘 hash 缓存：相同 (text, speed, language) 复用 WAV，避免重复推理，容量与 LRU 淘汰
+  由 TTSCacheManager（tts_cache.py）管理；多句文本按句
+  缓存、按句合成后拼接，改一个字只重合成那一句，不同文章里的相同句子也能复用
+- 线程安全：MeloTTS 模型对象不是并发安全的，所有推理串行化（_infer_lock）；
+  同 key 的并发请求合并成一次推理（singleflight），缓存文件先写临时文件再 os.replace
+- 微批：开启 TTS_BATCH_MAX_SIZE 后多句文本的未命中句子一起交给 TTSMicroBatcher（tts_batch.py），
+  攒成一批做一次前向
+- 压缩格式：encode_variant 把缓存 WAV 转成 Opus / MP3 / FLAC（tts_encoding.py），
+  转码结果按同一 key 换扩展名缓存
+- 词级时间轴：需要对齐（align=True：请求了时间轴或文章预合成）时单句也直接调 infer，
+  从对齐矩阵取每个字的真实时长，存为 {句 key}.align.json；不需要时单句仍走 tts_to_file；
+  ensure_timings 用句级 WAV 的实际长度锚定句子、句内按对齐时长切分（拿不到对齐时按拍数分配，
+  tts_timing.py），缓存为 {key}.timings.json
 - 软依赖：MeloTTS 包未安装时不抛 ImportError，启动时仅打 warning，
   真正调用 synthesize 时再 TTSError
 """
 
 from __future__ import annotations
 
+import concurrent.futures
 import hashlib
+import json
+import logging
 import os
+import re
+import struct
+import tempfile
 import threading
-from datetime import datetime, timezone, timedelta
-from typing import Optional
+import time
+import uuid
+import wave
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.logging_config import level_from_name
+from app.services.tts_batch import BatchJob, TTSMicroBatcher, can_batch, melo_batched_tts
+from app.services.tts_cache import TTSCacheManager
+from app.services.tts_encoding import AUDIO_FORMATS, encoder_for
+from app.services.tts_timing import build_timings, voiced_span
 
-BEIJING = timezone(timedelta(hours=8))
+logger = logging.getLogger(__name__)
 
 
 def _log(message: str, level: str = "INFO") -> None:
-    ts = datetime.now(BEIJING).strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{ts}] [{level}] {message}")
+    logger.log(level_from_name(level), message)
 
 
 try:
@@ -129,8 +154,20 @@ class MeloTTSService:
         self._models: dict[str, "_MeloTTS"] = {}
         self._model_lock = threading.Lock()
         self._infer_lock = threading.Lock()
+        # singleflight：cache key → 正在进行的合成，同 key 的并发请求共享一次推理
+        self._flights: dict[str, concurrent.futures.Future] = {}
+        self._flights_lock = threading.Lock()
+        # 微批：TTS_BATCH_MAX_SIZE > 1 时句级推理交给调度线程攒批
+        self._batcher: Optional[TTSMicroBatcher] = None
+        if settings.TTS_BATCH_MAX_SIZE > 1:
+            self._batcher = TTSMicroBatcher(self._run_batch, settings.TTS_BATCH_MAX_SIZE, settings.TTS_BATCH_MAX_WAIT_MS)
+        self._batch_fallback_logged = False
+        # 单句也直接调 infer 以拿到对齐；内部 API 不可用时关掉，之后只走 tts_to_file
+        self._direct_infer = True
         self._device = settings.TTS_DEVICE
         os.makedirs(settings.TTS_CACHE_DIR, exist_ok=True)
+        # 索引对账要扫整个目录，由 lifespan 在线程里做（reconcile_tts_cache），不在首个请求的事件循环上跑
+        self.cache = TTSCacheManager(settings.TTS_CACHE_DIR)
         _log(
             f"[TTS] MeloTTSService ready. cache_dir={settings.TTS_CACHE_DIR} "
             f"device={self._device} default_lang={settings.TTS_DEFAULT_LANGUAGE} "
@@ -242,6 +279,25 @@ class MeloTTSService:
         except Exception as exc:  # noqa: BLE001
             _log(f"[TTS] 预热失败 language={lang}：{exc}", level="WARN")
 
+    def warmup(self, language: Optional[str] = None) -> None:
+        """加载模型并跑一次短句推理（结果丢弃），首个真实请求不再承担冷启动开销。"""
+        lang = language or settings.TTS_DEFAULT_LANGUAGE
+        try:
+            model = self._load_model(lang)
+            spk_id = model.hps.data.spk2id[lang]
+            fd, path = tempfile.mkstemp(suffix=".tmp.wav", dir=settings.TTS_CACHE_DIR)
+            os.close(fd)
+            try:
+                start = time.perf_counter()
+                with self._infer_lock:
+                    model.tts_to_file("こんにちは。", spk_id, path, speed=1.0)
+                _log(f"[TTS] 预热完成 language={lang} pid={os.getpid()} {time.perf_counter() - start:.2f}s")
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        except Exception as exc:  # noqa: BLE001
+            _log(f"[TTS] 预热失败 language={lang}：{exc}", level="WARN")
+
     # ---- 缓存 key ---------------------------------------------------------
 
     @staticmethod
@@ -252,20 +308,61 @@ class MeloTTSService:
     def _cache_path(self, key: str) -> str:
         return os.path.join(settings.TTS_CACHE_DIR, f"{key}.wav")
 
-    def get_cached_path(self, text: str, speed: float, language: str) -> Optional[str]:
+    @staticmethod
+    def _alignment_path(path: str) -> str:
+        return os.path.splitext(path)[0] + ".align.json"
+
+    def _save_alignment(self, path: str, alignment: Optional[list]) -> None:
+        """句级 WAV 落盘后把字符级对齐写到旁边，供 ensure_timings 使用。"""
+        if not alignment:
+            return
+        align_path = self._alignment_path(path)
+        try:
+            with _atomic_output(align_path) as tmp_path:
+                with open(tmp_path, "w", encoding="utf-8") as fh:
+                    json.dump(alignment, fh, separators=(",", ":"))
+        except OSError as exc:
+            _log(f"[TTS] 写入对齐文件失败 path={align_path}: {exc}", level="WARN")
+            return
+        self.cache.record(align_path)
+
+    def _load_alignment(self, path: str) -> Optional[list]:
+        align_path = self._alignment_path(path)
+        if not self.cache.lookup(align_path, count=False):
+            return None
+        try:
+            with open(align_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _infer_sentence(
+        self, model: "_MeloTTS", sentence: str, spk_id: int, path: str, speed: float, align: bool = False
+    ) -> Optional[list]:
+        """单句推理（调用方持有 _infer_lock），默认走 tts_to_file。
+
+        需要对齐或开了微批时直接调 infer（与批量同一条路径）并返回字符级对齐；内部 API 出错时退回 tts_to_file。
+        """
+        if (align or self._batcher is not None) and self._direct_infer and can_batch(sentence):
+            try:
+                alignments = melo_batched_tts(model, [sentence], spk_id, speed, [path])
+                return alignments[0] if alignments else None
+            except Exception as exc:  # noqa: BLE001 - 内部 API 不可用
+                self._direct_infer = False
+                _log(f"[TTS] 直接调用 infer 不可用，退回 tts_to_file（时间轴按拍数估计）：{exc}", level="WARN")
+        model.tts_to_file(sentence, spk_id, path, speed=speed)
+        return None
+
+    def get_cached_path(self, text: str, speed: float, language: str, count: bool = True) -> Optional[str]:
         key = self.cache_key(text, speed, language)
         path = self._cache_path(key)
-        return path if os.path.exists(path) else None
+        return path if self.cache.lookup(path, count=count) else None
 
     # ---- 推理 -------------------------------------------------------------
 
-    def synthesize_to_file(
-        self,
-        text: str,
-        speed: float = 1.0,
-        language: Optional[str] = None,
-    ) -> str:
-        """合成音频并写入缓存文件，返回文件绝对路径。命中缓存则直接返回。"""
+    @staticmethod
+    def normalize_request(text: str, speed: float, language: Optional[str]) -> tuple[str, float, str]:
+        """清洗入参：去空白、speed 限制在 [0.1, 5.0]、language 落默认值。"""
         text = (text or "").strip()
         if not text:
             raise TTSError("text 不能为空")
@@ -275,32 +372,431 @@ class MeloTTSService:
         except (TypeError, ValueError):
             speed = 1.0
         speed = max(0.1, min(speed, 5.0))
-        language = language or settings.TTS_DEFAULT_LANGUAGE
+        return text, speed, language or settings.TTS_DEFAULT_LANGUAGE
 
-        key = self.cache_key(text, speed, language)
+    def synthesize_sentence(self, sentence: str, speed: float, language: str, align: bool = False) -> str:
+        """合成单句并写入句级缓存，返回缓存路径。入参须已经过 normalize_request。
+
+        align=True 时同时保存字符级对齐（{key}.align.json），供 ensure_timings 使用。
+        """
+        key = self.cache_key(sentence, speed, language)
         path = self._cache_path(key)
-        if os.path.exists(path):
-            _log(f"[TTS] cache hit key={key[:10]} text_len={len(text)} speed={speed}")
+        if self.cache.lookup(path):
+            metrics.TTS_CACHE_TOTAL.labels(scope="sentence", result="hit").inc()
             return path
+        metrics.TTS_CACHE_TOTAL.labels(scope="sentence", result="miss").inc()
+        return self._singleflight(
+            key, lambda: self._synthesize_sentence_uncached(key, path, sentence, speed, language, align)
+        )
 
+    def _speaker(self, language: str) -> tuple["_MeloTTS", int]:
         model = self._load_model(language)
         speaker_ids = model.hps.data.spk2id
         if language not in speaker_ids:
             raise TTSError(
                 f"language={language} 暂不支持，可选：{list(speaker_ids.keys())}"
             )
-        spk_id = speaker_ids[language]
+        return model, speaker_ids[language]
 
-        _log(f"[TTS] synthesize key={key[:10]} text_len={len(text)} speed={speed} lang={language}")
-        # 串行化推理：MeloTTS / torch 不是并发安全的
-        with self._infer_lock:
-            model.tts_to_file(text, spk_id, path, speed=speed)
-
-        if not os.path.exists(path):
-            raise TTSError("MeloTTS 未生成音频文件，请检查输入文本是否合法")
+    def _synthesize_sentence_uncached(
+        self, key: str, path: str, sentence: str, speed: float, language: str, align: bool = False
+    ) -> str:
+        # 排队期间可能已被别的进程写好
+        if self.cache.lookup(path, count=False):
+            return path
+        model, spk_id = self._speaker(language)
+
+        _log(f"[TTS] synthesize key={key[:10]} text_len={len(sentence)} speed={speed} lang={language}")
+        with _atomic_output(path) as tmp_path:
+            if self._batcher is not None and can_batch(sentence):
+                job = self._batcher.submit((language, speed), sentence, tmp_path)
+                job.future.result()
+                alignment = job.alignment
+            else:
+                # 串行化推理：MeloTTS / torch 不是并发安全的
+                wait_start = time.perf_counter()
+                with self._infer_lock:
+                    metrics.TTS_INFER_LOCK_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+                    synth_start = time.perf_counter()
+                    alignment = self._infer_sentence(model, sentence, spk_id, tmp_path, speed, align)
+                    metrics.TTS_SYNTH_SECONDS.labels(language=language).observe(time.perf_counter() - synth_start)
+            if not os.path.exists(tmp_path):
+                raise TTSError("MeloTTS 未生成音频文件，请检查输入文本是否合法")
+        self.cache.record(path)
+        self._save_alignment(path, alignment)
         _log(f"[TTS] done key={key[:10]} path={path}")
         return path
 
+    def _run_batch(self, group: tuple[str, float], jobs: list[BatchJob]) -> None:
+        """微批调度线程的回调：一组同语言、同语速的句子在一次 _infer_lock 内合成。"""
+        language, speed = group
+        model, spk_id = self._speaker(language)
+        wait_start = time.perf_counter()
+        with self._infer_lock:
+            metrics.TTS_INFER_LOCK_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+            synth_start = time.perf_counter()
+            if len(jobs) > 1:
+                try:
+                    alignments = melo_batched_tts(
+                        model, [job.sentence for job in jobs], spk_id, speed, [job.output_path for job in jobs]
+                    )
+                except Exception as exc:  # noqa: BLE001 - 退回逐句推理
+                    if not self._batch_fallback_logged:
+                        self._batch_fallback_logged = True
+                        _log(f"[TTS] 批量推理不可用，退回逐句：{exc}", level="WARN")
+                else:
+                    for job, alignment in zip(jobs, alignments or [None] * len(jobs)):
+                        job.alignment = alignment
+                        job.future.set_result(job.output_path)
+                    metrics.TTS_SYNTH_SECONDS.labels(language=language).observe(time.perf_counter() - synth_start)
+                    return
+            for job in jobs:
+                try:
+                    job.alignment = self._infer_sentence(model, job.sentence, spk_id, job.output_path, speed)
+                except Exception as exc:  # noqa: BLE001
+                    job.future.set_exception(exc)
+                else:
+                    job.future.set_result(job.output_path)
+            metrics.TTS_SYNTH_SECONDS.labels(language=language).observe(time.perf_counter() - synth_start)
+
+    def _claim_flight(self, key: str) -> tuple[bool, concurrent.futures.Future]:
+        """返回 (是否由自己执行, 共享 Future)；不是 leader 的调用者等 Future 即可。"""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                metrics.TTS_DEDUPED_TOTAL.inc()
+                _log(f"[TTS] join in-flight key={key[:10]}", level="DEBUG")
+                return False, flight
+            flight = self._flights[key] = concurrent.futures.Future()
+            return True, flight
+
+    def _finish_flight(self, key: str, flight: concurrent.futures.Future, result=None, exc=None) -> None:
+        with self._flights_lock:
+            self._flights.pop(key, None)
+        if exc is not None:
+            flight.set_exception(exc)
+        else:
+            flight.set_result(result)
+
+    def _singleflight(self, key: str, work: Callable[[], str]) -> str:
+        """同一 key 同时只执行一次 work，其余调用者等待并共享结果（或异常）。"""
+        leader, flight = self._claim_flight(key)
+        if not leader:
+            return flight.result()
+        try:
+            result = work()
+        except BaseException as exc:
+            self._finish_flight(key, flight, exc=exc)
+            raise
+        self._finish_flight(key, flight, result)
+        return result
+
+    def _submit_sentence_batched(
+        self, sentence: str, speed: float, language: str, align: bool = False
+    ) -> concurrent.futures.Future:
+        """不阻塞地把一句交给微批调度，返回最终缓存路径的 Future。"""
+        key = self.cache_key(sentence, speed, language)
+        path = self._cache_path(key)
+        if self.cache.lookup(path):
+            metrics.TTS_CACHE_TOTAL.labels(scope="sentence", result="hit").inc()
+            done: concurrent.futures.Future = concurrent.futures.Future()
+            done.set_result(path)
+            return done
+        metrics.TTS_CACHE_TOTAL.labels(scope="sentence", result="miss").inc()
+        leader, flight = self._claim_flight(key)
+        if not leader:
+            return flight
+        try:
+            if self.cache.lookup(path, count=False) or not can_batch(sentence):
+                self._finish_flight(
+                    key, flight, self._synthesize_sentence_uncached(key, path, sentence, speed, language, align)
+                )
+                return flight
+            self._speaker(language)
+            tmp_path = _tmp_output_path(path)
+            job = self._batcher.submit((language, speed), sentence, tmp_path)
+        except BaseException as exc:
+            if not flight.done():
+                self._finish_flight(key, flight, exc=exc)
+            return flight
+
+        def commit(done: concurrent.futures.Future) -> None:
+            try:
+                done.result()
+                if not os.path.exists(tmp_path):
+                    raise TTSError("MeloTTS 未生成音频文件，请检查输入文本是否合法")
+                os.replace(tmp_path, path)
+                self.cache.record(path)
+                self._save_alignment(path, job.alignment)
+            except BaseException as exc:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self._finish_flight(key, flight, exc=exc)
+            else:
+                self._finish_flight(key, flight, path)
+
+        job.future.add_done_callback(commit)
+        return flight
+
+    def _synthesize_sentences(self, sentences: list[str], speed: float, language: str, align: bool = False) -> list[str]:
+        if self._batcher is None or len(sentences) == 1:
+            return [self.synthesize_sentence(sentence, speed, language, align) for sentence in sentences]
+        # 先把所有句子都交出去，调度线程才能把它们攒进同一批
+        futures = [self._submit_sentence_batched(sentence, speed, language, align) for sentence in sentences]
+        return [future.result() for future in futures]
+
+    def synthesize_batch(
+        self,
+        texts: list[str],
+        speed: float = 1.0,
+        language: Optional[str] = None,
+        sentence_runner: Optional[Callable[[list[str], float, str, bool], list[str]]] = None,
+        align: bool = False,
+    ) -> list[str]:
+        """多段文本一起合成：全部未命中的句子一次交给 runner（可进同一批），再逐段取整段结果。"""
+        _, speed, language = self.normalize_request("-", speed, language)
+        texts = [self.normalize_request(text, speed, language)[0] for text in texts]
+        runner = sentence_runner or self._synthesize_sentences
+        pending: dict[str, None] = {}
+        for text in texts:
+            if not self.cache.lookup(self._cache_path(self.cache_key(text, speed, language)), count=False):
+                pending.update(dict.fromkeys(split_sentences(text) or [text]))
+        if pending:
+            runner(list(pending), speed, language, align)
+        return [self.synthesize_to_file(text, speed, language, sentence_runner, align) for text in texts]
+
+    def synthesize_to_file(
+        self,
+        text: str,
+        speed: float = 1.0,
+        language: Optional[str] = None,
+        sentence_runner: Optional[Callable[[list[str], float, str, bool], list[str]]] = None,
+        align: bool = False,
+    ) -> str:
+        """合成音频并写入缓存文件，返回文件绝对路径。命中缓存则直接返回。
+
+        多句文本按句合成（每句独立缓存），再拼接成整段 WAV 并按整段 key 缓存。
+        sentence_runner 负责把若干句子变成句级缓存路径，推理池用它把句子分发到多个 worker；
+        默认在当前进程里逐句合成。align=True 时各句同时保存字符级对齐（要生成时间轴时传）。
+        """
+        text, speed, language = self.normalize_request(text, speed, language)
+
+        key = self.cache_key(text, speed, language)
+        path = self._cache_path(key)
+        if self.cache.lookup(path):
+            metrics.TTS_CACHE_TOTAL.labels(scope="text", result="hit").inc()
+            _log(f"[TTS] cache hit key={key[:10]} text_len={len(text)} speed={speed}", level="DEBUG")
+            return path
+        metrics.TTS_CACHE_TOTAL.labels(scope="text", result="miss").inc()
+
+        sentences = split_sentences(text)
+        if len(sentences) <= 1:
+            # 单句的句级 key 与整段 key 相同，句级缓存就是整段结果
+            sentences = [text]
+        runner = sentence_runner or self._synthesize_sentences
+
+        def stitch() -> str:
+            if self.cache.lookup(path, count=False):
+                return path
+            sentence_paths = runner(sentences, speed, language, align)
+            if len(sentence_paths) == 1:
+                return sentence_paths[0]
+            with _atomic_output(path) as tmp_path:
+                concat_wavs(sentence_paths, tmp_path, gap_seconds=SENTENCE_GAP_SECONDS / speed)
+            self.cache.record(path)
+            _log(f"[TTS] stitched key={key[:10]} sentences={len(sentences)} path={path}")
+            return path
+
+        # 单句时整段 key 与句级 key 相同，避免和 runner 内部的句级 singleflight 撞 key
+        return stitch() if len(sentences) == 1 else self._singleflight(key, stitch)
+
+    def encode_variant(self, wav_path: str, audio_format: str) -> str:
+        """把缓存里的 WAV 转成 audio_format，结果与 WAV 同名不同扩展名、同样进缓存索引。"""
+        if audio_format == "wav":
+            return wav_path
+        spec = AUDIO_FORMATS.get(audio_format)
+        encoder = encoder_for(audio_format)
+        if spec is None or encoder is None:
+            raise TTSError(f"当前环境不支持 {audio_format} 编码")
+        path = os.path.splitext(wav_path)[0] + spec.extension
+        if self.cache.lookup(path):
+            metrics.TTS_CACHE_TOTAL.labels(scope="encoded", result="hit").inc()
+            return path
+        metrics.TTS_CACHE_TOTAL.labels(scope="encoded", result="miss").inc()
+
+        def encode() -> str:
+            if self.cache.lookup(path, count=False):
+                return path
+            started = time.perf_counter()
+            with _atomic_output(path) as tmp_path:
+                encoder(wav_path, tmp_path)
+            self.cache.record(path)
+            _log(
+                f"[TTS] encoded {audio_format} {os.path.getsize(wav_path)}B → {os.path.getsize(path)}B "
+                f"in {time.perf_counter() - started:.2f}s path={path}",
+                level="DEBUG",
+            )
+            return path
+
+        return self._singleflight(os.path.basename(path), encode)
+
+
+    def timings_path(self, key: str) -> str:
+        return os.path.join(settings.TTS_CACHE_DIR, f"{key}.timings.json")
+
+    def ensure_timings(self, text: str, speed: float, language: Optional[str] = None) -> str:
+        """为已合成的整段音频生成词级时间轴 JSON 并缓存，返回 cache key。音频须已在缓存中。"""
+        text, speed, language = self.normalize_request(text, speed, language)
+        key = self.cache_key(text, speed, language)
+        path = self.timings_path(key)
+        if self.cache.lookup(path, count=False):
+            return key
+        wav_path = self._cache_path(key)
+        if not os.path.exists(wav_path):
+            raise TTSError("音频尚未合成，无法生成时间轴")
+
+        def build() -> str:
+            audio_format, frames = read_wav_frames(wav_path)
+            channels, sample_width, frame_rate = audio_format
+            sentences = split_sentences(text)
+            if len(sentences) <= 1:
+                sentences = [text]
+            # 句级 WAV 还在缓存里时用它们的真实长度锚定句子边界，有对齐文件的句子按真实时长切分
+            sentence_audio: Optional[list[tuple[int, int, int]]] = []
+            alignments: list[Optional[list]] = []
+            for sentence in sentences:
+                sentence_path = self._cache_path(self.cache_key(sentence, speed, language))
+                if not self.cache.lookup(sentence_path, count=False):
+                    sentence_audio = None
+                    break
+                current, sentence_frames = read_wav_frames(sentence_path)
+                sentence_audio.append(
+                    (len(sentence_frames) // (channels * sample_width), *voiced_span(sentence_frames, current))
+                )
+                alignments.append(self._load_alignment(sentence_path))
+            timings = build_timings(
+                text,
+                sentences,
+                sentence_audio,
+                total_frames=len(frames) // (channels * sample_width),
+                frame_rate=frame_rate,
+                gap_frames=int(frame_rate * SENTENCE_GAP_SECONDS / speed),
+                sentence_alignments=alignments if sentence_audio is not None else None,
+            )
+            with _atomic_output(path) as tmp_path:
+                with open(tmp_path, "w", encoding="utf-8") as fh:
+                    json.dump(timings, fh, ensure_ascii=False, separators=(",", ":"))
+            self.cache.record(path)
+            return key
+
+        return self._singleflight(os.path.basename(path), build)
+
+
+def _tmp_output_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    extension = os.path.splitext(name)[1] or ".wav"
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.tmp{extension}")
+
+
+@contextmanager
+def _atomic_output(path: str) -> Iterator[str]:
+    """先写同目录下的临时文件，成功后 os.replace 到目标路径，读者永远看不到半个 WAV。
+
+    临时文件保留目标的扩展名：MeloTTS 用 soundfile、ffmpeg 也按扩展名推断格式。
+    """
+    tmp_path = _tmp_output_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# MeloTTS 内部拆句后也是按 0.05s / speed 的静音拼接，保持一致
+SENTENCE_GAP_SECONDS = 0.05
+_SENTENCE_RE = re.compile(r"[^。！？!?\n]+(?:[。！？!?]+[」』）)]*)?|[。！？!?]+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """按日文句末标点 / 换行切句，标点与紧随的右引号留在句尾。"""
+    sentences: list[str] = []
+    for match in _SENTENCE_RE.finditer(text or ""):
+        sentence = match.group(0).strip()
+        if not sentence:
+            continue
+        if sentences and not _has_speakable(sentence):
+            # 孤立的标点并回上一句，避免单独合成空音频
+            sentences[-1] += sentence
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def _has_speakable(sentence: str) -> bool:
+    return any(ch.isalnum() for ch in sentence)
+
+
+def read_wav_frames(path: str) -> tuple[tuple[int, int, int], bytes]:
+    """读取 PCM WAV，返回 ((channels, sample_width, frame_rate), frames)。"""
+    with wave.open(path, "rb") as reader:
+        return tuple(reader.getparams()[:3]), reader.readframes(reader.getnframes())
+
+
+def silence_frames(audio_format: tuple[int, int, int], seconds: float) -> bytes:
+    channels, sample_width, frame_rate = audio_format
+    return b"\x00" * (int(frame_rate * seconds) * channels * sample_width)
+
+
+def wav_stream_header(audio_format: tuple[int, int, int]) -> bytes:
+    """长度未知的流式 WAV 头：RIFF / data 大小填 0xFFFFFFFF，播放器读到 EOF 为止。"""
+    channels, sample_width, frame_rate = audio_format
+    unknown = 0xFFFFFFFF
+    return b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", unknown),
+            b"WAVEfmt ",
+            struct.pack("<IHHIIHH", 16, 1, channels, frame_rate, frame_rate * channels * sample_width,
+                        channels * sample_width, sample_width * 8),
+            b"data",
+            struct.pack("<I", unknown),
+        ]
+    )
+
+
+def concat_wavs(paths: list[str], output_path: str, gap_seconds: float = 0.0) -> None:
+    """把若干 PCM WAV 顺序拼接，句间插入 gap_seconds 的静音。各段格式必须一致。"""
+    if not paths:
+        raise TTSError("没有可拼接的音频")
+    frames: list[bytes] = []
+    audio_format = None
+    for path in paths:
+        current, data = read_wav_frames(path)
+        if audio_format is None:
+            audio_format = current
+        elif current != audio_format:
+            raise TTSError(f"句级音频格式不一致，无法拼接：{path}")
+        frames.append(data)
+    channels, sample_width, frame_rate = audio_format
+    with wave.open(output_path, "wb") as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(sample_width)
+        writer.setframerate(frame_rate)
+        writer.writeframes(silence_frames(audio_format, gap_seconds).join(frames))
+
+
+def melotts_available() -> bool:
+    return _MeloTTS is not None
+
 
 def get_tts_service() -> MeloTTSService:
     return MeloTTSService()
+
+
+def reconcile_tts_cache() -> None:
+    """启动时让缓存索引与目录一致；阻塞调用，放在线程里跑。"""
+    try:
+        get_tts_service().cache.reconcile()
+    except Exception as exc:  # noqa: BLE001
+        _log(f"[TTS] 缓存索引对账失败：{exc}", level="WARN")
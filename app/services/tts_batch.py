@@ -0,0 +1,215 @@
+"""
+TTS 微批调度（micro-batching）
+
+设计要点：
+- MeloTTSService 把未命中的句子作为 job 交给 TTSMicroBatcher；调度线程拿到第一个 job 后
+  最多再等 TTS_BATCH_MAX_WAIT_MS 或凑满 TTS_BATCH_MAX_SIZE 个，按 (language, speed) 分组，
+  每组在 _infer_lock 下跑一次前向，再把结果分发回各自的 Future
+- 批量前向直接调用 MeloTTS 的 SynthesizerTrn.infer（tts_to_file 只支持 batch=1）：
+  各句的 phone / tone / bert 右侧补零后堆叠，按 y_mask 长度切回每句音频，
+  句尾补 0.05s / speed 静音，与 tts_to_file 的输出对齐
+- 长句（超过 _BATCH_MAX_CHARS）tts_to_file 内部还会再切片，不进批；
+  批量前向出错时整批退回逐句 tts_to_file，只影响速度不影响结果
+- TTS_BATCH_MAX_SIZE <= 1（默认）时不启用微批，单句走 tts_to_file；只有需要对齐（请求了时间轴、
+  文章预合成）时单句才走同一个前向（batch=1），以拿到 infer 返回的对齐矩阵 attn
+- attn 按音素求和得到每个音素的帧数（× hop_length 换算成采样点），再按 clean_text 的 word2ph
+  分组映射回句子里的字符区间，作为词级时间轴的真实时长（tts_timing.py）；
+  文本规范化改动了字符、或分组数对不上时该句返回 None，由时间轴退回按拍数分配
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Optional
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# 超过这个长度的句子 MeloTTS 会再切片，批量前向对不上，单独推理
+_BATCH_MAX_CHARS = 80
+
+
+@dataclass
+class BatchJob:
+    group: Hashable
+    sentence: str
+    output_path: str
+    future: concurrent.futures.Future = field(default_factory=concurrent.futures.Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # 字符级对齐 [[char_start, char_end, start_frame, end_frame], ...]；拿不到时为 None
+    alignment: Optional[list] = None
+
+
+class TTSMicroBatcher:
+    """收集 job → 分组 → run_batch(group, jobs)。run_batch 负责写 output_path 并设置每个 job 的 Future。"""
+
+    def __init__(self, run_batch: Callable[[Hashable, list[BatchJob]], None], max_size: int, max_wait_ms: float) -> None:
+        self._run_batch = run_batch
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[Optional[BatchJob]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="tts-batch", daemon=True)
+        self._thread.start()
+
+    def submit(self, group: Hashable, sentence: str, output_path: str) -> BatchJob:
+        """入队并返回 job：等 job.future，完成后从 job.alignment 取对齐结果。"""
+        job = BatchJob(group, sentence, output_path)
+        self._queue.put(job)
+        return job
+
+    def _collect(self, first: BatchJob) -> list[BatchJob]:
+        jobs = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(jobs) < self.max_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)
+                break
+            jobs.append(job)
+        return jobs
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            groups: dict[Hashable, list[BatchJob]] = {}
+            for job in self._collect(first):
+                if job.future.set_running_or_notify_cancel():
+                    groups.setdefault(job.group, []).append(job)
+            for group, jobs in groups.items():
+                started = time.perf_counter()
+                for job in jobs:
+                    metrics.TTS_BATCH_WAIT_SECONDS.observe(started - job.enqueued_at)
+                metrics.TTS_BATCH_SIZE.observe(len(jobs))
+                try:
+                    self._run_batch(group, jobs)
+                except BaseException as exc:  # noqa: BLE001 - 不能让调度线程退出
+                    for job in jobs:
+                        if not job.future.done():
+                            job.future.set_exception(exc)
+                metrics.TTS_BATCH_SECONDS.observe(time.perf_counter() - started)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+def can_batch(sentence: str) -> bool:
+    return len(sentence) <= _BATCH_MAX_CHARS
+
+
+def _unit_texts(model, norm_text: str, count: int) -> Optional[list[str]]:
+    """word2ph 每组对应的文本：中文等按字分组；日文按 BERT 子词分组（去掉 ## 前缀）。"""
+    if count == len(norm_text):
+        return list(norm_text)
+    if model.language != "JP":
+        return None
+    from melo.text import japanese
+
+    tokenizer = getattr(japanese, "tokenizer", None)
+    if tokenizer is None:
+        return None
+    tokens = [token.replace("#", "") for token in tokenizer.tokenize(norm_text)]
+    return tokens if len(tokens) == count else None
+
+
+def char_alignment(model, sentence: str, phone_samples: list[float]) -> Optional[list[list[int]]]:
+    """把每个音素的采样点时长映射成句内字符区间的时间段；对不上时返回 None。"""
+    from melo.text.cleaner import clean_text
+
+    norm_text, _phones, _tones, word2ph = clean_text(sentence, model.language)
+    word2ph = list(word2ph)
+    if model.hps.data.add_blank:
+        word2ph = [count * 2 for count in word2ph]
+        word2ph[0] += 1
+    # 规范化改了字数（数字展开、符号替换等）时没法可靠地映射回原句
+    if sum(word2ph) != len(phone_samples) or len(norm_text) != len(sentence) or len(word2ph) < 3:
+        return None
+    # 首尾两组是句首句尾的边界音素，不对应字符
+    units = _unit_texts(model, norm_text, len(word2ph) - 2)
+    if units is None:
+        return None
+
+    boundaries = [0.0]
+    for samples in phone_samples:
+        boundaries.append(boundaries[-1] + samples)
+    alignment: list[list[int]] = []
+    phone_index = word2ph[0]
+    char_cursor = 0
+    for unit, count in zip(units, word2ph[1:-1]):
+        start = norm_text.find(unit, char_cursor) if unit else -1
+        if start < 0:
+            return None
+        char_cursor = start + len(unit)
+        alignment.append([start, char_cursor, int(boundaries[phone_index]), int(boundaries[phone_index + count])])
+        phone_index += count
+    return alignment
+
+
+def melo_batched_tts(
+    model, sentences: list[str], spk_id: int, speed: float, output_paths: list[str]
+) -> list[Optional[list[list[int]]]]:
+    """一次前向合成多句，分别写成 WAV，返回每句的字符级对齐（见 char_alignment）。
+
+    依赖 MeloTTS 内部 API，调用方需准备好回退。
+    """
+    import numpy as np
+    import soundfile
+    import torch
+    from melo import utils as melo_utils
+
+    device = model.device
+    items = [
+        melo_utils.get_text_for_tts_infer(sentence, model.language, model.hps, device, model.symbol_to_id)
+        for sentence in sentences
+    ]
+    lengths = [phones.shape[-1] for _bert, _ja_bert, phones, _tones, _lang_ids in items]
+    max_len = max(lengths)
+
+    def stack(index: int) -> "torch.Tensor":
+        return torch.stack(
+            [torch.nn.functional.pad(item[index], (0, max_len - item[index].shape[-1])) for item in items]
+        ).to(device)
+
+    with torch.no_grad():
+        audio, attn, y_mask, _ = model.model.infer(
+            stack(2),
+            torch.LongTensor(lengths).to(device),
+            torch.LongTensor([spk_id] * len(items)).to(device),
+            stack(3),
+            stack(4),
+            stack(0),
+            stack(1),
+            sdp_ratio=0.2,
+            noise_scale=0.6,
+            noise_scale_w=0.8,
+            length_scale=1.0 / speed,
+        )
+    hop_length = model.hps.data.hop_length
+    sample_rate = model.hps.data.sampling_rate
+    tail = np.zeros(int(sample_rate * 0.05 / speed), dtype=np.float32)
+    audio_lengths = (y_mask.sum(dim=(1, 2)) * hop_length).long().tolist()
+    # attn: [batch, 1, 帧, 音素]，按帧求和 = 每个音素占多少帧
+    phone_frames = attn[:, 0].sum(dim=1).data.cpu().float().tolist()
+    alignments: list[Optional[list[list[int]]]] = []
+    for index, path in enumerate(output_paths):
+        samples = audio[index, 0, : audio_lengths[index]].data.cpu().float().numpy()
+        soundfile.write(path, np.concatenate([samples, tail]), sample_rate)
+        try:
+            phone_samples = [frames * hop_length for frames in phone_frames[index][: lengths[index]]]
+            alignments.append(char_alignment(model, sentences[index], phone_samples))
+        except Exception as exc:  # noqa: BLE001 - 对齐只影响时间轴精度，不影响音频
+            logger.debug("[TTS] 句子对齐失败，时间轴退回按拍数分配：%s", exc)
+            alignments.append(None)
+    return alignments
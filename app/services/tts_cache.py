@@ -0,0 +1,281 @@
+"""
+TTS 音频缓存管理
+
+设计要点：
+- 索引放在 SQLite（默认 TTS_CACHE_DIR/.index.sqlite3，WAL 模式）：推理池的子进程、
+  多个 uvicorn worker 共用一份索引，容量统计与 LRU 顺序是全局一致的
+- 命中判断查索引，不再对每个句子做 os.path.exists；写入缓存文件后 record() 登记大小
+- lookup() 只读（一条 SELECT），命中时的 last_access 先记在内存里，由后台线程每
+  TTS_CACHE_ACCESS_FLUSH_SECONDS 批量写回；淘汰与统计前也会先写回，LRU 顺序不受影响
+- 总大小在进程内维护一个累计值：reconcile()（或本进程首次写入）时从索引求和一次，之后由 record / forget /
+  淘汰增减，写入路径上不再整表 SUM；累计值超预算时先按索引重算一次（别的进程可能已经淘汰过）再决定是否淘汰
+- 总大小超过 TTS_CACHE_MAX_BYTES 时按 last_access 从旧到新删文件，删到预算的 90%；
+  最近 TTS_CACHE_MIN_AGE_SECONDS 内访问过的不删（可能正被拼接或流式读取）
+- 启动时（lifespan 里放到线程中）reconcile()：目录里有但索引没有的补登记（last_access 取 mtime），索引里有但文件
+  已不在的删掉，顺手清理崩溃残留的 .tmp 文件
+- TTS_CACHE_MAX_BYTES=0 表示不限容量，只维护索引与统计
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".index.sqlite3"
+# 淘汰时删到预算的这个比例，避免每写一个文件就触发一次淘汰
+_LOW_WATERMARK = 0.9
+# 超过这个时间的 .tmp 文件视为崩溃残留
+_STALE_TMP_SECONDS = 3600
+
+
+class TTSCacheManager:
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        index_path: Optional[str] = None,
+        min_age_seconds: Optional[float] = None,
+    ) -> None:
+        self.cache_dir = cache_dir or settings.TTS_CACHE_DIR
+        self.max_bytes = settings.TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.index_path = index_path or settings.TTS_CACHE_INDEX_PATH or os.path.join(self.cache_dir, INDEX_FILENAME)
+        self.min_age_seconds = settings.TTS_CACHE_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        # 命中后还没写回索引的 last_access：name → 时间戳
+        self._touched: dict[str, float] = {}
+        self._touched_lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+        # 本进程视角的索引总字节数；None 表示还没求过和，fork 后按 pid 重新求
+        self._total: Optional[int] = None
+        self._total_pid: Optional[int] = None
+        self.flush_interval = float(getattr(settings, "TTS_CACHE_ACCESS_FLUSH_SECONDS", 30))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # ---- SQLite ---------------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 出来的子进程不能复用父进程的连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " name TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _name(self, path: str) -> str:
+        return os.path.relpath(path, self.cache_dir)
+
+    # ---- 读写 -----------------------------------------------------------------
+
+    def lookup(self, path: str, count: bool = True) -> bool:
+        """索引中有该文件则返回 True，last_access 记在内存里稍后批量写回。count=False 时不计入命中统计。"""
+        name = self._name(path)
+        with self._lock:
+            hit = self._connection().execute("SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+            if count and hit:
+                self.hits += 1
+            elif count:
+                self.misses += 1
+        if hit:
+            with self._touched_lock:
+                self._touched[name] = time.time()
+            self._ensure_flusher()
+        return hit
+
+    def flush_access(self) -> None:
+        """把内存里的 last_access 一次性写回索引。"""
+        with self._lock:
+            self._flush_access_locked()
+
+    def _flush_access_locked(self) -> None:
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "UPDATE entries SET last_access = MAX(last_access, ?) WHERE name = ?",
+                [(ts, name) for name, ts in touched.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _ensure_flusher(self) -> None:
+        # 每个进程一个后台线程；fork 出来的子进程需要重新拉起
+        if self._flusher_pid == os.getpid() or self.flush_interval <= 0:
+            return
+        with self._touched_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="tts-cache-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush_access()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("[TTS] 写回缓存访问时间失败：%s", exc)
+
+    def record(self, path: str) -> None:
+        """登记刚写入的缓存文件，必要时触发淘汰。"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        name = self._name(path)
+        with self._lock:
+            conn = self._connection()
+            total = self._tracked_total_locked()
+            previous = conn.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (name, size, last_access) VALUES (?, ?, ?)",
+                (name, size, time.time()),
+            )
+            self._total = total + size - (previous[0] if previous else 0)
+            self._evict_locked()
+
+    def forget(self, path: str) -> None:
+        name = self._name(path)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+            conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+            if row and self._total is not None and self._total_pid == os.getpid():
+                self._total = max(0, self._total - row[0])
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes_locked()
+
+    def _total_bytes_locked(self) -> int:
+        row = self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def _tracked_total_locked(self) -> int:
+        if self._total is None or self._total_pid != os.getpid():
+            self._total = self._total_bytes_locked()
+            self._total_pid = os.getpid()
+        return self._total
+
+    # ---- 淘汰 -----------------------------------------------------------------
+
+    def _evict_locked(self) -> None:
+        total = self._tracked_total_locked()
+        if self.max_bytes and total > self.max_bytes:
+            # 其他进程的写入 / 淘汰不在本进程的累计值里，真要淘汰前按索引校准一次
+            total = self._total = self._total_bytes_locked()
+        metrics.TTS_CACHE_BYTES.set(total)
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        self._flush_access_locked()
+        target = int(self.max_bytes * _LOW_WATERMARK)
+        conn = self._connection()
+        cutoff = time.time() - self.min_age_seconds
+        rows = conn.execute(
+            "SELECT name, size FROM entries WHERE last_access < ? ORDER BY last_access", (cutoff,)
+        ).fetchall()
+        evicted = 0
+        for name, size in rows:
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.warning("[TTS] 淘汰缓存文件失败 name=%s: %s", name, exc)
+                continue
+            conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+            total -= size
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            metrics.TTS_CACHE_EVICTIONS_TOTAL.inc(evicted)
+            logger.info("[TTS] 缓存淘汰 %s 个文件，当前 %.1f MB / 预算 %.1f MB", evicted, total / 1e6, self.max_bytes / 1e6)
+        self._total = total
+        metrics.TTS_CACHE_BYTES.set(total)
+
+    def reconcile(self) -> None:
+        """让索引与目录一致，然后按预算淘汰一次。"""
+        now = time.time()
+        on_disk: dict[str, tuple[int, float]] = {}
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file() or entry.name.startswith(INDEX_FILENAME):
+                continue
+            stat = entry.stat()
+            if ".tmp" in entry.name:
+                if now - stat.st_mtime > _STALE_TMP_SECONDS:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            conn = self._connection()
+            indexed = {name for (name,) in conn.execute("SELECT name FROM entries")}
+            missing = indexed - on_disk.keys()
+            added = on_disk.keys() - indexed
+            conn.executemany("DELETE FROM entries WHERE name = ?", [(name,) for name in missing])
+            conn.executemany(
+                "INSERT INTO entries (name, size, last_access) VALUES (?, ?, ?)",
+                [(name, *on_disk[name]) for name in added],
+            )
+            # 对账后重新求一次和，作为本进程累计值的起点
+            self._total = self._total_bytes_locked()
+            self._total_pid = os.getpid()
+            self._evict_locked()
+        if missing or added:
+            logger.info("[TTS] 缓存索引对账：补登记 %s 个，移除 %s 个失效条目", len(added), len(missing))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            self._flush_access_locked()
+            entries, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {
+            "entries": int(entries),
+            "bytes": int(total),
+            "max_bytes": int(self.max_bytes or 0),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._flush_access_locked()
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
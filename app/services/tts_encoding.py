@@ -0,0 +1,141 @@
+"""
+TTS 输出格式（WAV / Opus / MP3 / FLAC）
+
+设计要点：
+- MeloTTS 只产出 PCM WAV；压缩格式在其基础上转码，转码结果与 WAV 放在同一缓存目录
+  （同一 key，不同扩展名），同样走缓存索引与 LRU 淘汰
+- 编码器优先用 ffmpeg（Docker 镜像里安装；Opus 只能靠它：libopus 会把 MeloTTS 的
+  44.1kHz 重采样到 48kHz）；没有 ffmpeg 时 FLAC / MP3 退回 soundfile（libsndfile ≥ 1.1 才有 MP3）
+- 格式选择：TTSRequest.format 显式指定优先，其次按 Accept 头的 q 值协商；
+  浏览器 fetch 默认 Accept: */*，此时仍返回 WAV，保持旧行为
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    name: str
+    media_type: str
+    extension: str
+
+
+AUDIO_FORMATS: dict[str, AudioFormat] = {
+    "wav": AudioFormat("wav", "audio/wav", ".wav"),
+    "opus": AudioFormat("opus", "audio/ogg; codecs=opus", ".opus"),
+    "mp3": AudioFormat("mp3", "audio/mpeg", ".mp3"),
+    "flac": AudioFormat("flac", "audio/flac", ".flac"),
+}
+
+_ACCEPT_ALIASES: dict[str, str] = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+}
+
+
+class UnsupportedFormatError(ValueError):
+    """当前环境没有可用的编码器。"""
+
+
+# ---- 编码器 -----------------------------------------------------------------
+
+def _ffmpeg_args(fmt: str) -> list[str]:
+    if fmt == "opus":
+        return ["-c:a", "libopus", "-b:a", settings.TTS_OPUS_BITRATE, "-f", "ogg"]
+    if fmt == "mp3":
+        return ["-c:a", "libmp3lame", "-b:a", settings.TTS_MP3_BITRATE, "-f", "mp3"]
+    return ["-c:a", "flac", "-f", "flac"]
+
+
+def _encode_with_ffmpeg(fmt: str) -> Callable[[str, str], None]:
+    def encode(wav_path: str, output_path: str) -> None:
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", wav_path, *_ffmpeg_args(fmt), output_path]
+        completed = subprocess.run(command, capture_output=True, timeout=120)
+        if completed.returncode != 0:
+            raise RuntimeError(f"ffmpeg 转码 {fmt} 失败：{completed.stderr.decode('utf-8', 'replace').strip()}")
+
+    return encode
+
+
+def _encode_with_soundfile(fmt: str) -> Optional[Callable[[str, str], None]]:
+    try:
+        import soundfile
+    except Exception:  # noqa: BLE001 - 软依赖
+        return None
+    spec = {"flac": ("FLAC", "PCM_16"), "mp3": ("MP3", "MPEG_LAYER_III")}.get(fmt)
+    if spec is None or spec[0] not in soundfile.available_formats():
+        return None
+
+    def encode(wav_path: str, output_path: str) -> None:
+        data, sample_rate = soundfile.read(wav_path)
+        soundfile.write(output_path, data, sample_rate, format=spec[0], subtype=spec[1])
+
+    return encode
+
+
+def encoder_for(fmt: str) -> Optional[Callable[[str, str], None]]:
+    """返回把 WAV 转成 fmt 的函数；WAV 本身或当前环境不支持时返回 None。"""
+    if fmt == "wav" or fmt not in AUDIO_FORMATS:
+        return None
+    if shutil.which("ffmpeg"):
+        return _encode_with_ffmpeg(fmt)
+    return _encode_with_soundfile(fmt)
+
+
+def is_available(fmt: str) -> bool:
+    return fmt == "wav" or encoder_for(fmt) is not None
+
+
+# ---- 协商 -------------------------------------------------------------------
+
+def _parse_accept(accept: str) -> list[tuple[str, float]]:
+    ranges: list[tuple[str, float]] = []
+    for item in accept.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        media = parts[0].lower()
+        if not media:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media, quality))
+    return ranges
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """显式 format 优先；否则取 Accept 中 q 值最高且可编码的格式，都不匹配时用 WAV。"""
+    if requested:
+        fmt = requested.lower()
+        if fmt not in AUDIO_FORMATS:
+            raise UnsupportedFormatError(f"不支持的音频格式：{requested}，可选：{list(AUDIO_FORMATS)}")
+        if not is_available(fmt):
+            raise UnsupportedFormatError(f"当前环境没有 {fmt} 编码器（需要 ffmpeg）")
+        return fmt
+
+    best: Optional[tuple[float, str]] = None
+    for media, quality in _parse_accept(accept or ""):
+        fmt = _ACCEPT_ALIASES.get(media)
+        if fmt is None or quality <= 0 or not is_available(fmt):
+            continue
+        # q 相同时取先出现的
+        if best is None or quality > best[0]:
+            best = (quality, fmt)
+    return best[1] if best else "wav"
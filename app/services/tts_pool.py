@@ -0,0 +1,316 @@
+"""
+TTS 推理池
+
+设计要点：
+- TTS_WORKERS=0（默认）：进程内模式，沿用 MeloTTSService 单例 + _infer_lock，
+  只是从默认 executor 挪到专用的单线程 executor，排队的请求不再占默认线程池
+- TTS_WORKERS=N：spawn N 个子进程，每个子进程各自加载一份模型（各自的
+  MeloTTSService 单例），torch.set_num_threads(TTS_WORKER_TORCH_THREADS) 避免
+  N 个进程互相抢核；吞吐随核数线性扩展，代价是 N 份模型内存
+- 有界队列：执行中 + 排队的任务数超过 槽位数 + TTS_QUEUE_SIZE 时直接拒绝
+  （TTSBusyError → 路由返回 429 + Retry-After），不在内存里无限堆积
+- 每个 worker 启动时预热：加载模型并跑一句短文本，首个真实请求不再吃冷启动
+- 子进程与父进程共用 TTS_CACHE_DIR，结果以缓存文件路径的形式返回
+- 多句文本：父进程的协调线程把未命中的句子分别提交给各 worker 并行合成，
+  全部完成后在父进程拼接整段 WAV；排队名额按请求计，不按句子计
+- 流式：stream_sentences 一次性提交所有句子，按原顺序逐句交回句级 WAV 路径，
+  整个流只占一个名额，客户端断开时取消尚未开始、也没有其他请求在等的句子
+- 后台任务（文章预合成，见 tts_presynth.py）走 submit_background：不占排队名额，
+  调用方先 wait_idle() 等交互请求全部完成再提交，一次只交一小批，交互请求最多等这一批
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from typing import AsyncIterator, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.tts import TTSError, get_tts_service, split_sentences
+
+logger = logging.getLogger(__name__)
+
+
+class TTSBusyError(TTSError):
+    """推理队列已满，调用方应稍后重试。"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"TTS 队列已满，请 {retry_after}s 后重试")
+        self.retry_after = retry_after
+
+
+# ---- 子进程入口（必须是模块级函数，spawn 模式下按名字导入） ------------------
+
+def _worker_init(torch_threads: int, language: str) -> None:
+    from app.core.logging_config import configure_logging
+
+    configure_logging()
+    if torch_threads > 0:
+        try:
+            import torch
+
+            torch.set_num_threads(torch_threads)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("[TTS] worker pid=%s 设置 torch 线程数失败：%s", os.getpid(), exc)
+    get_tts_service().warmup(language)
+
+
+def _worker_synthesize_sentence(sentence: str, speed: float, language: str, align: bool = False) -> str:
+    return get_tts_service().synthesize_sentence(sentence, speed, language, align)
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+class TTSWorkerPool:
+    """对外只暴露 submit / synthesize；内部按 workers 选择线程或进程 executor。"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        torch_threads: Optional[int] = None,
+    ) -> None:
+        self.workers = max(0, settings.TTS_WORKERS if workers is None else workers)
+        self.queue_size = max(0, settings.TTS_QUEUE_SIZE if queue_size is None else queue_size)
+        if torch_threads is None:
+            torch_threads = settings.TTS_WORKER_TORCH_THREADS or max(1, (os.cpu_count() or 1) // max(1, self.workers))
+        self.torch_threads = torch_threads
+        self.slots = max(1, self.workers)
+        self.capacity = self.slots + self.queue_size
+        self._executor: Optional[concurrent.futures.Executor] = None
+        # 进程模式下每个请求占一个协调线程（等句子结果 + 拼接），数量与队列容量一致
+        self._coordinator: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 交互请求清空时唤醒等待中的后台任务
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        # 父进程侧的句级 singleflight：cache key → [已提交给 executor 的 Future, 等待者数]
+        self._sentence_flights: dict[str, list] = {}
+        # 单次推理耗时的指数滑动平均，用来估算 Retry-After
+        self._avg_seconds = settings.TTS_RETRY_AFTER_SECONDS
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> "TTSWorkerPool":
+        if self._executor is not None:
+            return self
+        language = settings.TTS_DEFAULT_LANGUAGE
+        if self.workers == 0:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+            if settings.TTS_PRELOAD_ON_STARTUP:
+                self._executor.submit(get_tts_service().warmup, language)
+            return self
+
+        self._coordinator = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.capacity, thread_name_prefix="tts-coord"
+        )
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            # fork 会把父进程里的 torch 线程池 / 日志线程一起复制过去，必须 spawn
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=(self.torch_threads, language),
+        )
+        # ProcessPoolExecutor 按需拉起子进程；每个 ping 都会卡在前一个 worker 的预热里，
+        # 于是 N 个 ping 恰好把 N 个 worker 全部拉起并预热
+        for _ in range(self.workers):
+            self._executor.submit(_worker_ping)
+        logger.info(
+            "[TTS] 推理池已启动 workers=%s torch_threads=%s queue_size=%s",
+            self.workers,
+            self.torch_threads,
+            self.queue_size,
+        )
+        return self
+
+    def _retry_after(self) -> int:
+        waiting = self._in_flight - self.slots + 1
+        return max(1, min(60, math.ceil(self._avg_seconds * waiting / self.slots)))
+
+    def _release(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            metrics.TTS_QUEUE_DEPTH.set(self._in_flight)
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def _acquire(self) -> float:
+        if self._executor is None:
+            self.start()
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                metrics.TTS_REJECTED_TOTAL.inc()
+                raise TTSBusyError(self._retry_after())
+            self._in_flight += 1
+            metrics.TTS_QUEUE_DEPTH.set(self._in_flight)
+        return time.perf_counter()
+
+    def _dispatch(self, text: str, speed: float, language: str, align: bool) -> concurrent.futures.Future:
+        if self.workers == 0:
+            return self._executor.submit(get_tts_service().synthesize_to_file, text, speed, language, None, align)
+        return self._coordinator.submit(
+            get_tts_service().synthesize_to_file, text, speed, language, self._run_sentences, align
+        )
+
+    def submit(self, text: str, speed: float, language: str, align: bool = False) -> concurrent.futures.Future:
+        """占一个队列名额后提交推理；队列满时抛 TTSBusyError。align=True 时保存字符级对齐（要生成时间轴）。"""
+        started = self._acquire()
+        try:
+            future = self._dispatch(text, speed, language, align)
+        except BaseException:
+            self._release(started)
+            raise
+        future.add_done_callback(lambda _future: self._release(started))
+        return future
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等到没有交互请求在执行或排队；超时返回 False。"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def submit_background(
+        self, texts: list[str], speed: float, language: str, align: bool = False
+    ) -> concurrent.futures.Future:
+        """低优先级提交一组文本（可进同一微批）：不占排队名额、不会被 429。调用方负责先 wait_idle() 让路。"""
+        if self._executor is None:
+            self.start()
+        service = get_tts_service()
+        if self.workers == 0:
+            return self._executor.submit(service.synthesize_batch, texts, speed, language, None, align)
+        return self._coordinator.submit(service.synthesize_batch, texts, speed, language, self._run_sentences, align)
+
+    def _submit_sentence(
+        self, sentence: str, speed: float, language: str, align: bool = False
+    ) -> concurrent.futures.Future:
+        service = get_tts_service()
+        cached = service.get_cached_path(sentence, speed, language)
+        if cached:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            future.set_result(cached)
+            return future
+        # 子进程各有各的 singleflight，跨进程的去重只能在父进程这里做
+        key = service.cache_key(sentence, speed, language)
+        with self._lock:
+            entry = self._sentence_flights.get(key)
+            if entry is not None and not entry[0].cancelled():
+                entry[1] += 1
+                metrics.TTS_DEDUPED_TOTAL.inc()
+                return entry[0]
+            if self.workers == 0:
+                future = self._executor.submit(service.synthesize_sentence, sentence, speed, language, align)
+            else:
+                future = self._executor.submit(_worker_synthesize_sentence, sentence, speed, language, align)
+            self._sentence_flights[key] = [future, 1]
+        future.add_done_callback(lambda done, key=key: self._forget_sentence(key, done))
+        return future
+
+    def _forget_sentence(self, key: str, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            entry = self._sentence_flights.get(key)
+            if entry is not None and entry[0] is future:
+                del self._sentence_flights[key]
+
+    def _abandon_sentence(self, key: str, future: concurrent.futures.Future) -> None:
+        """某个调用方不再需要这句了；没有其他人等待且尚未开始时才真正取消。"""
+        with self._lock:
+            entry = self._sentence_flights.get(key)
+            if entry is None or entry[0] is not future:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+        future.cancel()
+
+    def _run_sentences(self, sentences: list[str], speed: float, language: str, align: bool = False) -> list[str]:
+        """把句子分发到各 worker 并行合成；已有句级缓存的不再提交。"""
+        futures = [self._submit_sentence(sentence, speed, language, align) for sentence in sentences]
+        return [future.result() for future in futures]
+
+    def stream_sentences(self, text: str, speed: float, language: str) -> "TTSSentenceStream":
+        """占一个名额并提交全部句子，返回按原顺序产出 (句子, 句级 WAV 路径) 的异步迭代器。
+
+        名额在这里同步占用，队列满时调用方还能在开始写响应前返回 429。
+        """
+        text, speed, language = get_tts_service().normalize_request(text, speed, language)
+        sentences = split_sentences(text) or [text]
+        started = self._acquire()
+        futures: list[concurrent.futures.Future] = []
+        keys = [get_tts_service().cache_key(sentence, speed, language) for sentence in sentences]
+
+        def close() -> None:
+            for key, future in zip(keys, futures):
+                self._abandon_sentence(key, future)
+            self._release(started)
+
+        try:
+            for sentence in sentences:
+                futures.append(self._submit_sentence(sentence, speed, language))
+        except BaseException:
+            close()
+            raise
+        return TTSSentenceStream(sentences, futures, speed, close)
+
+    async def synthesize(self, text: str, speed: float, language: str, align: bool = False) -> str:
+        return await asyncio.wrap_future(self.submit(text, speed, language, align))
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        coordinator, self._coordinator = self._coordinator, None
+        for pool in (coordinator, executor):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TTSSentenceStream:
+    """stream_sentences 的返回值；无论正常结束还是中途断开都要 aclose() 归还名额。"""
+
+    def __init__(self, sentences: list[str], futures: list[concurrent.futures.Future], speed: float, on_close) -> None:
+        self.sentences = sentences
+        self.speed = speed
+        self._futures = futures
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[tuple[str, str]]:
+        for sentence, future in zip(self.sentences, self._futures):
+            yield sentence, await asyncio.wrap_future(future)
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._on_close()
+
+
+_pool: Optional[TTSWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_tts_pool() -> TTSWorkerPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TTSWorkerPool().start()
+    return _pool
+
+
+def shutdown_tts_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,178 @@
+"""
+文章 TTS 预合成
+
+设计要点：
+- 文章保存后（process_text_async / 爬虫）把 article.original 按阅读页的切句规则
+  （reading.js splitSentences）拆成句子排队，用阅读页的朗读语速（READER_TTS_SPEED）合成，cache key 与读者点播放时
+  请求的完全一致，首次播放直接命中缓存
+- 优先级：后台线程每次取一小批（TTS_BATCH_MAX_SIZE 句，未开微批时一句），
+  先 pool.wait_idle() 等交互请求全部完成再提交，交互请求最多等正在跑的那一批；
+  已在缓存里的句子直接跳过
+- 有界：每篇最多 TTS_PRESYNTH_MAX_SENTENCES 句，全局待合成超过 TTS_PRESYNTH_QUEUE_SIZE 的丢弃
+  （预合成只是优化，丢了最多是一次冷启动）
+- TTS_PRESYNTH_ENABLED=false（默认）或 MeloTTS 未安装时 schedule 是 no-op
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import re
+import threading
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.tts import get_tts_service, melotts_available
+
+logger = logging.getLogger(__name__)
+
+# 阅读页朗读固定用这个语速（static/js/pages/reading.js READER_TTS_SPEED），两边要一起改；
+# 不能用 TTS_DEFAULT_SPEED，否则改了默认语速后预合成的 cache key 就对不上
+READER_TTS_SPEED = 1.0
+
+_SOURCE_PREFIX_RE = re.compile(r"^来源\s*[:：]\s*[^\n]*\n+")
+_READING_SPLIT_RE = re.compile(r"(?<=[。！？!?])\s*|\n+")
+
+
+def reading_sentences(text: str) -> list[str]:
+    """与 static/js/pages/reading.js 的 splitSentences 保持一致，保证 cache key 对得上。"""
+    normalized = (text or "").replace("\r\n", "\n").strip()
+    stripped = _SOURCE_PREFIX_RE.sub("", normalized, count=1).strip()
+    if not stripped:
+        return []
+    parts = [part.strip() for part in _READING_SPLIT_RE.split(stripped)]
+    parts = [part for part in parts if part]
+    return parts or [stripped]
+
+
+class TTSPresynthesizer:
+    def __init__(self, pool=None, queue_size: Optional[int] = None, max_sentences: Optional[int] = None) -> None:
+        self._pool = pool
+        self.max_sentences = settings.TTS_PRESYNTH_MAX_SENTENCES if max_sentences is None else max_sentences
+        self._queue: "queue.Queue[tuple[Optional[int], str]]" = queue.Queue(
+            maxsize=settings.TTS_PRESYNTH_QUEUE_SIZE if queue_size is None else queue_size
+        )
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, text: str, article_id: Optional[int] = None) -> int:
+        """把文章的句子排进预合成队列，返回实际入队的句数。"""
+        queued = 0
+        for sentence in reading_sentences(text)[: self.max_sentences]:
+            try:
+                self._queue.put_nowait((article_id, sentence))
+            except queue.Full:
+                metrics.TTS_PRESYNTH_TOTAL.labels(result="dropped").inc()
+                logger.info("[TTS] 预合成队列已满，article_id=%s 剩余句子不再排队", article_id)
+                break
+            queued += 1
+        if queued:
+            metrics.TTS_PRESYNTH_TOTAL.labels(result="queued").inc(queued)
+            metrics.TTS_PRESYNTH_PENDING.set(self._queue.qsize())
+            self._ensure_thread()
+        return queued
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="tts-presynth", daemon=True)
+                self._thread.start()
+
+    def _get_pool(self):
+        if self._pool is None:
+            from app.services.tts_pool import get_tts_pool
+
+            self._pool = get_tts_pool()
+        return self._pool
+
+    def _run(self) -> None:
+        speed = READER_TTS_SPEED
+        language = settings.TTS_DEFAULT_LANGUAGE.upper()
+        batch_size = max(1, settings.TTS_BATCH_MAX_SIZE)
+        while not self._stopped.is_set():
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            metrics.TTS_PRESYNTH_PENDING.set(self._queue.qsize())
+            try:
+                self._synthesize(batch, speed, language)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _synthesize(self, batch: list[tuple[Optional[int], str]], speed: float, language: str) -> None:
+        service = get_tts_service()
+        sentences = [sentence for _, sentence in batch if not service.get_cached_path(sentence, speed, language, count=False)]
+        if len(sentences) < len(batch):
+            metrics.TTS_PRESYNTH_TOTAL.labels(result="cached").inc(len(batch) - len(sentences))
+        if not sentences:
+            return
+        pool = self._get_pool()
+        # 让路给交互请求：池里还有请求就一直等
+        while not pool.wait_idle(timeout=1):
+            if self._stopped.is_set():
+                return
+        try:
+            # 阅读页总会请求时间轴，预合成时一并保存对齐
+            pool.submit_background(list(dict.fromkeys(sentences)), speed, language, align=True).result()
+        except Exception as exc:  # noqa: BLE001
+            metrics.TTS_PRESYNTH_TOTAL.labels(result="failed").inc(len(sentences))
+            logger.warning("[TTS] 预合成失败 article_id=%s：%s", batch[0][0], exc)
+            return
+        metrics.TTS_PRESYNTH_TOTAL.labels(result="synthesized").inc(len(sentences))
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待队列清空（测试用）；超时返回 False。"""
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+_presynthesizer: Optional[TTSPresynthesizer] = None
+_presynthesizer_lock = threading.Lock()
+
+
+def get_tts_presynthesizer() -> TTSPresynthesizer:
+    global _presynthesizer
+    if _presynthesizer is None:
+        with _presynthesizer_lock:
+            if _presynthesizer is None:
+                _presynthesizer = TTSPresynthesizer()
+    return _presynthesizer
+
+
+def schedule_article_presynthesis(article_id: Optional[int], text: str) -> int:
+    """文章保存后调用；未开启或 MeloTTS 不可用时什么都不做。不会抛异常。"""
+    if not settings.TTS_PRESYNTH_ENABLED or not melotts_available():
+        return 0
+    try:
+        return get_tts_presynthesizer().enqueue(text, article_id)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("[TTS] 预合成排队失败 article_id=%s：%s", article_id, exc)
+        return 0
+
+
+def shutdown_tts_presynthesizer() -> None:
+    global _presynthesizer
+    with _presynthesizer_lock:
+        presynthesizer, _presynthesizer = _presynthesizer, None
+    if presynthesizer is not None:
+        presynthesizer.stop()
@@ -0,0 +1,190 @@
+"""
+TTS 词级时间轴（timing track）
+
+设计要点：
+- 句子边界来自实际合成的句级 WAV 帧数（与拼接时的句间静音一致），误差不会随篇幅累积
+- 句内优先用合成时从 infer 对齐矩阵得到的字符级时长（tts_batch.char_alignment）：
+  词的区间取它覆盖的字符的最早起点 / 最晚终点
+- 拿不到对齐（tts_to_file 回退、规范化改了字数、对齐缺字）的句子按拍（mora）估计：
+  去掉首尾静音，按各词的拍数比例切分
+- 分词与读音用 pykakasi，拍数 = 平假名长度去掉拗音小字；、等句中标点算一拍停顿，
+  但不输出 token
+- 输出的 char_start / char_end 是相对于清洗后文本（strip 后）的字符偏移，
+  前端据此映射到 Intl.Segmenter 切出的词块
+- 生成结果是 JSON，按整段 cache key 缓存为 {key}.timings.json，与音频同目录、同一索引
+"""
+
+from __future__ import annotations
+
+import array
+import sys
+import threading
+from typing import Optional
+
+# 低于该幅度（16-bit）视为静音，只用于裁掉句首尾的空白
+_SILENCE_THRESHOLD = 500
+_SMALL_KANA = set("ゃゅょぁぃぅぇぉゎ")
+_PAUSE_MARKS = set("、，,；;：:…―")
+
+_kakasi = None
+_kakasi_lock = threading.Lock()
+
+
+def _converter():
+    global _kakasi
+    if _kakasi is None:
+        with _kakasi_lock:
+            if _kakasi is None:
+                import pykakasi
+
+                _kakasi = pykakasi.kakasi()
+    return _kakasi
+
+
+def mora_count(reading: str) -> int:
+    """平假名读音的拍数；非假名字符（数字、拉丁字母）按一字一拍。"""
+    return sum(1 for ch in reading if ch.isalnum() and ch not in _SMALL_KANA)
+
+
+def tokenize(sentence: str) -> list[dict]:
+    """切成 [{text, reading, char_start, char_end, weight}]，weight 为拍数（标点为停顿权重或 0）。"""
+    tokens: list[dict] = []
+    cursor = 0
+    for item in _converter().convert(sentence):
+        orig = item.get("orig") or ""
+        if not orig:
+            continue
+        start = sentence.find(orig, cursor)
+        if start < 0:
+            start = cursor
+        end = start + len(orig)
+        cursor = end
+        reading = item.get("hira") or orig
+        if any(ch.isalnum() for ch in orig):
+            weight = max(1, mora_count(reading))
+        else:
+            weight = 1 if any(ch in _PAUSE_MARKS for ch in orig) else 0
+        tokens.append({"text": orig, "reading": reading, "char_start": start, "char_end": end, "weight": weight})
+    return tokens
+
+
+def voiced_span(frames: bytes, audio_format: tuple[int, int, int]) -> tuple[int, int]:
+    """返回首个 / 最后一个非静音帧的 [start, end) 帧号；无法判断时返回整段。"""
+    channels, sample_width, _ = audio_format
+    total = len(frames) // (channels * sample_width)
+    if sample_width != 2 or total == 0:
+        return 0, total
+    samples = array.array("h")
+    samples.frombytes(frames[: total * channels * sample_width])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    first = next((index for index in range(len(samples)) if abs(samples[index]) >= _SILENCE_THRESHOLD), None)
+    if first is None:
+        return 0, total
+    last = next(index for index in range(len(samples) - 1, -1, -1) if abs(samples[index]) >= _SILENCE_THRESHOLD)
+    return first // channels, last // channels + 1
+
+
+def _ms(frames: float, frame_rate: int) -> int:
+    return int(round(frames * 1000 / frame_rate))
+
+
+def _aligned_spans(tokens: list[dict], alignment: Optional[list]) -> Optional[list[Optional[tuple[int, int]]]]:
+    """按字符级对齐算每个 token 的 (起点帧, 终点帧)；有词对不上时返回 None，整句退回按拍数。"""
+    if not alignment:
+        return None
+    spans: list[Optional[tuple[int, int]]] = []
+    for token in tokens:
+        if not any(ch.isalnum() for ch in token["text"]):
+            spans.append(None)
+            continue
+        covered = [
+            (start_frame, end_frame)
+            for char_start, char_end, start_frame, end_frame in alignment
+            if char_start < token["char_end"] and char_end > token["char_start"]
+        ]
+        if not covered:
+            return None
+        spans.append((min(start for start, _ in covered), max(end for _, end in covered)))
+    return spans
+
+
+def build_timings(
+    text: str,
+    sentences: list[str],
+    sentence_audio: Optional[list[tuple[int, int, int]]],
+    total_frames: int,
+    frame_rate: int,
+    gap_frames: int,
+    sentence_alignments: Optional[list[Optional[list]]] = None,
+) -> dict:
+    """生成时间轴。
+
+    sentence_audio: 每句 (句长帧数, 有声起点帧, 有声终点帧)；拿不到句级音频时传 None，
+    此时按拍数把整段时长（扣掉句间静音）分给各句。
+    sentence_alignments: 每句的字符级对齐 [[char_start, char_end, 起点帧, 终点帧], ...]（相对句级 WAV），
+    没有的句子为 None；只在 sentence_audio 是真实句级音频时有意义。
+    """
+    sentence_tokens = [tokenize(sentence) for sentence in sentences]
+    if sentence_audio is None:
+        speech_frames = max(0, total_frames - gap_frames * (len(sentences) - 1))
+        weights = [sum(token["weight"] for token in tokens) or 1 for tokens in sentence_tokens]
+        total_weight = sum(weights)
+        sentence_audio = []
+        for weight in weights:
+            length = speech_frames * weight / total_weight
+            sentence_audio.append((length, 0, length))
+
+    result_sentences: list[dict] = []
+    result_tokens: list[dict] = []
+    offset = 0.0
+    char_cursor = 0
+    for index, (sentence, tokens, (length, voiced_start, voiced_end)) in enumerate(
+        zip(sentences, sentence_tokens, sentence_audio)
+    ):
+        char_base = text.find(sentence, char_cursor)
+        if char_base < 0:
+            char_base = char_cursor
+        char_cursor = char_base + len(sentence)
+        result_sentences.append(
+            {
+                "text": sentence,
+                "char_start": char_base,
+                "char_end": char_cursor,
+                "start_ms": _ms(offset, frame_rate),
+                "end_ms": _ms(offset + length, frame_rate),
+            }
+        )
+
+        aligned = _aligned_spans(tokens, sentence_alignments[index]) if sentence_alignments else None
+        total_weight = sum(token["weight"] for token in tokens)
+        position = offset + voiced_start
+        per_weight = (voiced_end - voiced_start) / total_weight if total_weight else 0.0
+        for token_index, token in enumerate(tokens):
+            span = token["weight"] * per_weight
+            if aligned is not None:
+                if aligned[token_index] is None:
+                    continue
+                start_frame, end_frame = aligned[token_index]
+                position, span = offset + start_frame, end_frame - start_frame
+            if token["weight"] and token["text"].strip() and any(ch.isalnum() for ch in token["text"]):
+                result_tokens.append(
+                    {
+                        "text": token["text"],
+                        "reading": token["reading"],
+                        "sentence": index,
+                        "char_start": char_base + token["char_start"],
+                        "char_end": char_base + token["char_end"],
+                        "start_ms": _ms(position, frame_rate),
+                        "end_ms": _ms(position + span, frame_rate),
+                    }
+                )
+            position += span
+        offset += length + gap_frames
+
+    return {
+        "version": 1,
+        "duration_ms": _ms(total_frames, frame_rate),
+        "sentences": result_sentences,
+        "tokens": result_tokens,
+    }
@@ -4,6 +4,7 @@ from typing import Iterable
 
 from sqlalchemy.orm import Session
 
+from app.core.tracing import traced
 from app.model.models import Article, VocabularyEntry
 from app.utils.time import datetime_to_isoformat, utc_now
 
@@ -12,6 +13,7 @@ def _normalize_word(word: str) -> str:
     return (word or '').strip()
 
 
+@traced("db.seed_vocabulary_entries")
 def seed_vocabulary_entries(
     db: Session,
     user_id: int,
@@ -118,6 +120,16 @@ def get_mastered_vocab_words(db: Session, user_id: int, words: Iterable[str]) ->
     return {row[0] for row in rows}
 
 
+def list_mastered_words(db: Session, user_id: int) -> set[str]:
+    """用户已掌握的全部词，本地选词时跳过。"""
+    rows = (
+        db.query(VocabularyEntry.word)
+        .filter(VocabularyEntry.user_id == user_id, VocabularyEntry.status == 'mastered')
+        .all()
+    )
+    return {row[0] for row in rows}
+
+
 def attach_vocab_state(
     db: Session,
     user_id: int,
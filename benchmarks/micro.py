@@ -0,0 +1,225 @@
+"""
+CPU 热点微基准
+
+覆盖纯本地计算路径：
+- services._kakasi_ruby
+- furigana_filter.apply_furigana_filter
+- evaluation._build_diff_html
+- evaluation.normalize_to_hiragana
+
+语料固定为短 / 中 / 长三档日语文本。每个 case 报告 ops/sec 与单次调用的内存分配峰值
+（tracemalloc），并与仓库内的基线 benchmarks/baseline_micro.json 对比。
+
+ops/sec 受机器影响很大，所以对比时用「相对分数」= case ops/sec ÷ 同一进程里
+一段固定纯 Python 校准负载的 ops/sec；分配峰值是确定性的，直接对比。
+
+CLI：
+    python -m benchmarks.micro                    # 对比基线，回归超过阈值时退出码为 1
+    python -m benchmarks.micro --update-baseline  # 优化后刷新基线（提交到仓库）
+pytest：
+    pytest -m benchmark tests/test_benchmark_micro.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline_micro.json")
+DEFAULT_THRESHOLD = 0.25
+
+_SHORT = "今日はいい天気です。"
+_MEDIUM = (
+    "東京都内では今朝、強い雨が降り、通勤や通学の時間帯に電車の遅れが相次ぎました。"
+    "気象庁によりますと、低気圧の影響で午後も不安定な天気が続く見込みで、"
+    "落雷や突風に注意するよう呼びかけています。"
+)
+_LONG = "".join(
+    [
+        _MEDIUM,
+        "一方、週末は高気圧に覆われて全国的に晴れる予想です。",
+        "行楽地では紅葉が見頃を迎えており、多くの観光客でにぎわいそうです。",
+        "ただし、朝晩は冷え込みが強まるため、体調管理に気をつけてください。",
+        "専門家は、急な気温の変化に備えて上着を一枚持ち歩くことを勧めています。",
+        "また、乾燥した日が続くため、火の取り扱いにも十分な注意が必要だということです。",
+    ]
+    * 4
+)
+
+CORPUS: dict[str, str] = {"short": _SHORT, "medium": _MEDIUM, "long": _LONG}
+
+
+def _recognized_variant(text: str) -> str:
+    """模拟语音识别结果：转成平假名后去掉每第 7 个字符。"""
+    from app.routers.evaluation import normalize_to_hiragana
+
+    hira = normalize_to_hiragana(text)
+    return "".join(ch for index, ch in enumerate(hira) if index % 7 != 6)
+
+
+def build_cases() -> dict[str, Callable[[], object]]:
+    from app.routers.evaluation import _build_diff_html, normalize_to_hiragana
+    from app.services.furigana_filter import apply_furigana_filter
+    from app.services.services import _kakasi_ruby
+
+    cases: dict[str, Callable[[], object]] = {}
+    for size, text in CORPUS.items():
+        ruby_html = _kakasi_ruby(text)
+        recognized = _recognized_variant(text)
+        cases[f"kakasi_ruby[{size}]"] = lambda text=text: _kakasi_ruby(text)
+        cases[f"apply_furigana_filter[{size}]"] = lambda html=ruby_html: apply_furigana_filter(html, 2)
+        cases[f"build_diff_html[{size}]"] = lambda a=text, b=recognized: _build_diff_html(a, b)
+        cases[f"normalize_to_hiragana[{size}]"] = lambda text=text: normalize_to_hiragana(text)
+    return cases
+
+
+def _calibration() -> int:
+    """与业务无关的固定纯 Python 负载，用来抵消机器快慢差异。"""
+    table = {}
+    for index in range(2000):
+        key = f"k{index % 97}"
+        table[key] = table.get(key, 0) + len(key)
+    return sum(table.values())
+
+
+@dataclass
+class MicroResult:
+    name: str
+    ops_per_sec: float
+    relative: float
+    alloc_peak_kib: float
+
+
+def _ops_per_sec(func: Callable[[], object], min_time: float, repeat: int) -> float:
+    func()  # 预热（pykakasi 字典加载等）
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10 or loops >= 1 << 20:
+            break
+        loops *= 2
+    # 每轮跑到约 min_time / repeat，取最快一轮
+    loops = max(1, int(loops * (min_time / repeat) / max(elapsed, 1e-9)))
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            best = min(best, (time.perf_counter() - start) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return 1.0 / best
+
+
+def _alloc_peak_kib(func: Callable[[], object]) -> float:
+    func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - baseline) / 1024
+
+
+def run_micro(min_time: float = 0.5, repeat: int = 5, only: str | None = None) -> list[MicroResult]:
+    results: list[MicroResult] = []
+    for name, func in build_cases().items():
+        if only and only not in name:
+            continue
+        # 共享 / 降频的机器上速度会漂移，校准紧挨着每个 case 做
+        calibration = _ops_per_sec(_calibration, min_time / 2, repeat)
+        ops = _ops_per_sec(func, min_time, repeat)
+        results.append(MicroResult(name, round(ops, 1), round(ops / calibration, 5), round(_alloc_peak_kib(func), 1)))
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh).get("cases", {})
+
+
+def save_baseline(results: list[MicroResult], path: str = BASELINE_PATH) -> None:
+    payload = {
+        "python": sys.version.split()[0],
+        "note": "relative = ops_per_sec / 校准负载 ops_per_sec；用 python -m benchmarks.micro --update-baseline 刷新",
+        "cases": {result.name: asdict(result) for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def find_regressions(results: list[MicroResult], baseline: dict[str, dict], threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """返回超过阈值的回归描述；基线中没有的 case 不算回归。"""
+    problems: list[str] = []
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+        if base["relative"] and result.relative < base["relative"] * (1 - threshold):
+            drop = 1 - result.relative / base["relative"]
+            problems.append(f"{result.name}: 相对吞吐下降 {drop:.0%}（{base['relative']} → {result.relative}）")
+        # 分配峰值很小时抖动占比大，给 4 KiB 的绝对余量
+        if result.alloc_peak_kib > base["alloc_peak_kib"] * (1 + threshold) + 4:
+            problems.append(f"{result.name}: 分配峰值上升（{base['alloc_peak_kib']} KiB → {result.alloc_peak_kib} KiB）")
+    return problems
+
+
+def format_table(results: list[MicroResult], baseline: dict[str, dict]) -> str:
+    lines = [f"{'case':36} {'ops/sec':>12} {'relative':>10} {'vs base':>8} {'alloc KiB':>10}"]
+    for result in results:
+        base = baseline.get(result.name)
+        delta = f"{result.relative / base['relative'] - 1:+.0%}" if base and base["relative"] else "-"
+        lines.append(f"{result.name:36} {result.ops_per_sec:>12.1f} {result.relative:>10.5f} {delta:>8} {result.alloc_peak_kib:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="YomuTomo CPU 热点微基准")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每个 case 的计时时长（秒）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default=None, help="只跑名字包含该子串的 case")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="允许的回归比例")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_micro(args.min_time, args.repeat, args.only)
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        print(f"基线已写入 {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], ensure_ascii=False, indent=2))
+    else:
+        print(format_table(results, baseline))
+    problems = find_regressions(results, baseline, args.threshold)
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+本地 mock LLM 服务（OpenAI 兼容 + Gemini 兼容）
+
+用于压测生成管线而不花真实 API 费用：
+- POST */chat/completions           → OpenAI chat.completions 响应
+- POST *:generateContent / :generateMessage → Gemini 响应
+- 可配置固定延迟 + 抖动、429 注入比例、超时注入比例（挂起 hang_seconds 后才返回）
+- 统计请求数、连接数、峰值并发、注入的 429 / 超时次数
+
+回复内容按 prompt 关键字粗分（emoji / 标题 / 生词 JSON / ruby / 翻译），
+保证各生成函数都能走完正常的解析路径。
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class MockLLMConfig:
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    rate_429: float = 0.0
+    timeout_rate: float = 0.0
+    hang_seconds: float = 5.0
+    seed: int | None = 42
+
+
+@dataclass
+class MockLLMStats:
+    requests: int = 0
+    connections: int = 0
+    peak_in_flight: int = 0
+    injected_429: int = 0
+    injected_timeouts: int = 0
+    in_flight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "peak_in_flight": self.peak_in_flight,
+            "injected_429": self.injected_429,
+            "injected_timeouts": self.injected_timeouts,
+        }
+
+
+_VOCAB_REPLY = json.dumps(
+    [
+        {"word": "天気", "meaning": "天气", "pronunciation": "tenki"},
+        {"word": "予報", "meaning": "预报", "pronunciation": "yohou"},
+        {"word": "週末", "meaning": "周末", "pronunciation": "shuumatsu"},
+    ],
+    ensure_ascii=False,
+)
+
+
+def _prompt_text(payload: dict) -> str:
+    parts: list[str] = []
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, dict):
+            content = content.get("text")
+        if isinstance(content, str):
+            parts.append(content)
+    for item in payload.get("contents") or []:
+        for part in item.get("parts") or []:
+            if isinstance(part.get("text"), str):
+                parts.append(part["text"])
+    return "\n".join(parts)
+
+
+def reply_for_prompt(prompt: str) -> str:
+    if "emoji" in prompt:
+        return "🌤️"
+    if "标题" in prompt:
+        return "周末天气预报"
+    if "JSON" in prompt:
+        return _VOCAB_REPLY
+    if "ruby" in prompt:
+        return "<ruby>天気<rt>てんき</rt></ruby>がいいです。"
+    if "简化" in prompt:
+        return "今日はいい天気です。週末も晴れます。"
+    return "今天天气很好，周末也是晴天。"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 允许 keep-alive，连接数才有意义
+    server: "_MockHTTPServer"
+
+    def setup(self) -> None:
+        super().setup()
+        stats = self.server.stats
+        with stats.lock:
+            stats.connections += 1
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - 覆盖基类签名
+        return None
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server 约定
+        stats = self.server.stats
+        config = self.server.config
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        with stats.lock:
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            roll = self.server.rng.random()
+            delay = max(0.0, config.latency_ms + self.server.rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000.0
+        try:
+            if roll < config.timeout_rate:
+                with stats.lock:
+                    stats.injected_timeouts += 1
+                time.sleep(config.hang_seconds)
+            elif roll < config.timeout_rate + config.rate_429:
+                with stats.lock:
+                    stats.injected_429 += 1
+                time.sleep(delay / 4)
+                self._send_json(429, {"error": {"message": "rate limited (mock)", "type": "rate_limit"}})
+                return
+            time.sleep(delay)
+
+            try:
+                payload = json.loads(raw.decode("utf-8") or "{}")
+            except ValueError:
+                payload = {}
+            text = reply_for_prompt(_prompt_text(payload))
+            if ":generate" in self.path:
+                self._send_json(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+            else:
+                self._send_json(
+                    200,
+                    {
+                        "choices": [{"message": {"role": "assistant", "content": text}}],
+                        "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(text)},
+                    },
+                )
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端超时后主动断开
+            pass
+        finally:
+            with stats.lock:
+                stats.in_flight -= 1
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockLLMConfig) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.config = config
+        self.stats = MockLLMStats()
+        self.rng = random.Random(config.seed)
+
+
+class MockLLMServer:
+    """with MockLLMServer(config) as server: server.base_url → http://127.0.0.1:<port>/v1"""
+
+    def __init__(self, config: MockLLMConfig | None = None) -> None:
+        self.config = config or MockLLMConfig()
+        self._server: _MockHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def stats(self) -> MockLLMStats:
+        assert self._server is not None, "server 未启动"
+        return self._server.stats
+
+    @property
+    def root_url(self) -> str:
+        assert self._server is not None, "server 未启动"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.root_url}/v1"
+
+    def reset_stats(self) -> None:
+        assert self._server is not None, "server 未启动"
+        self._server.stats = MockLLMStats()
+
+    def start(self) -> "MockLLMServer":
+        self._server = _MockHTTPServer(self.config)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
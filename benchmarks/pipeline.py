@@ -0,0 +1,345 @@
+"""
+生成管线压测
+
+对着本地 mock LLM（benchmarks/mock_llm_server.py）在不同并发下驱动：
+- generate  : services.generate_all_content（真实 SyncCompatClient → AIClient → httpx）
+- process   : POST /process_text_async（ASGI 进程内调用，含登录、入库、生词、通知）
+- crawl     : spider._save_articles_from_items（每个并发单位是一个爬取任务）
+
+报告 articles/sec、p50/p95/p99 延迟、峰值线程数、mock 服务端看到的请求数 / 连接数 / 峰值并发。
+
+CLI：
+    python -m benchmarks.pipeline --target all --concurrency 1,4,8 --articles 16 --latency-ms 200
+pytest：
+    pytest -m benchmark
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from benchmarks.mock_llm_server import MockLLMConfig, MockLLMServer
+
+SAMPLE_TEXT = (
+    "今日は朝から雨が降っていましたが、午後になって天気が回復しました。"
+    "気象庁によると、週末は全国的に晴れる見込みで、行楽地は多くの人でにぎわいそうです。"
+)
+BENCH_PASSWORD = "bench-secret"
+
+
+@dataclass
+class BenchResult:
+    target: str
+    concurrency: int
+    articles: int
+    wall_seconds: float
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    peak_threads: int = 0
+    server: dict[str, int] = field(default_factory=dict)
+
+    @staticmethod
+    def _percentile(values: list[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "target": self.target,
+            "concurrency": self.concurrency,
+            "articles": self.articles,
+            "errors": self.errors,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "articles_per_sec": round(self.articles / self.wall_seconds, 3) if self.wall_seconds else 0.0,
+            "mean_ms": round(statistics.fmean(self.latencies) * 1000, 1) if self.latencies else 0.0,
+            "p50_ms": round(self._percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(self._percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(self._percentile(self.latencies, 99) * 1000, 1),
+            "peak_threads": self.peak_threads,
+            **{f"server_{key}": value for key, value in self.server.items()},
+        }
+
+
+@contextmanager
+def _thread_sampler(interval: float = 0.01) -> Iterator[Callable[[], int]]:
+    peak = [threading.active_count()]
+    stop = threading.Event()
+
+    def run() -> None:
+        while not stop.wait(interval):
+            peak[0] = max(peak[0], threading.active_count())
+
+    sampler = threading.Thread(target=run, name="bench-thread-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield lambda: peak[0]
+    finally:
+        stop.set()
+        sampler.join()
+
+
+def _make_session_factory(db_path: str):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db import Base
+
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _create_user(Session, server: MockLLMServer, email: str):
+    from app.model.models import User
+    from app.services.services import hash_password
+
+    db = Session()
+    try:
+        user = User(
+            email=email,
+            password_hash=hash_password(BENCH_PASSWORD),
+            level=3,
+            openai_api_key="sk-bench",
+            openai_base_url=server.base_url,
+            openai_model="mock-model",
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user.id
+    finally:
+        db.close()
+
+
+def bench_generate_all_content(server: MockLLMServer, concurrency: int, articles: int) -> BenchResult:
+    from app.services.services import generate_all_content, get_openai_client
+
+    latencies: list[float] = []
+    errors = 0
+
+    def one_article(_index: int) -> float:
+        client = get_openai_client("sk-bench", server.base_url)
+        start = time.perf_counter()
+        generate_all_content(SAMPLE_TEXT, "mock-model", client)
+        return time.perf_counter() - start
+
+    server.reset_stats()
+    with _thread_sampler() as peak_threads:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(one_article, i) for i in range(articles)]:
+                try:
+                    latencies.append(future.result())
+                except Exception:  # noqa: BLE001 - 压测只计数
+                    errors += 1
+        wall = time.perf_counter() - start
+        peak = peak_threads()
+
+    return BenchResult("generate", concurrency, articles, wall, latencies, errors, peak, server.stats.as_dict())
+
+
+def bench_process_text_async(server: MockLLMServer, concurrency: int, articles: int) -> BenchResult:
+    import httpx
+
+    from app import main as app_main
+    from app.db import get_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, Session = _make_session_factory(os.path.join(tmp, "bench.db"))
+        email = "bench-process@example.com"
+        _create_user(Session, server, email)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        async def run() -> tuple[list[float], int, float]:
+            latencies: list[float] = []
+            errors = 0
+            semaphore = asyncio.Semaphore(concurrency)
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                await client.post("/login", data={"email": email, "password": BENCH_PASSWORD})
+
+                async def one_article() -> None:
+                    nonlocal errors
+                    async with semaphore:
+                        start = time.perf_counter()
+                        resp = await client.post("/process_text_async", data={"text": SAMPLE_TEXT})
+                        latencies.append(time.perf_counter() - start)
+                        if resp.status_code != 200 or "redirect_url" not in resp.json():
+                            errors += 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one_article() for _ in range(articles)))
+                return latencies, errors, time.perf_counter() - start
+
+        app_main.app.dependency_overrides[get_db] = override_get_db
+        server.reset_stats()
+        try:
+            with _thread_sampler() as peak_threads:
+                latencies, errors, wall = asyncio.run(run())
+                peak = peak_threads()
+        finally:
+            app_main.app.dependency_overrides.pop(get_db, None)
+            engine.dispose()
+
+    return BenchResult("process", concurrency, articles, wall, latencies, errors, peak, server.stats.as_dict())
+
+
+def bench_save_articles_from_items(server: MockLLMServer, concurrency: int, articles: int, items_per_task: int = 4) -> BenchResult:
+    from app.model.models import CrawlTask, User
+    from spider.rsshub_spider import _save_articles_from_items
+
+    items = [
+        {"title": f"bench-{index}", "content": SAMPLE_TEXT, "url": f"https://example.com/bench/{index}"}
+        for index in range(items_per_task)
+    ]
+    task_count = max(1, articles // items_per_task)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, Session = _make_session_factory(os.path.join(tmp, "bench.db"))
+        user_id = _create_user(Session, server, "bench-crawl@example.com")
+
+        def one_task(_index: int) -> tuple[float, int]:
+            db = Session()
+            try:
+                user = db.get(User, user_id)
+                task = CrawlTask(user_id=user_id, status="processing", total_articles=0, processed_articles=0)
+                db.add(task)
+                db.commit()
+                db.refresh(task)
+                start = time.perf_counter()
+                result = _save_articles_from_items(db, user_id, user, task, items, "ok", "failed")
+                return time.perf_counter() - start, int(result.get("processed_articles") or 0)
+            finally:
+                db.close()
+
+        latencies: list[float] = []
+        processed = 0
+        errors = 0
+        server.reset_stats()
+        with _thread_sampler() as peak_threads:
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for future in [pool.submit(one_task, i) for i in range(task_count)]:
+                    try:
+                        elapsed, done = future.result()
+                        latencies.append(elapsed)
+                        processed += done
+                        errors += items_per_task - done
+                    except Exception:  # noqa: BLE001
+                        errors += items_per_task
+            wall = time.perf_counter() - start
+            peak = peak_threads()
+        engine.dispose()
+
+    return BenchResult("crawl", concurrency, processed, wall, latencies, errors, peak, server.stats.as_dict())
+
+
+TARGETS: dict[str, Callable[[MockLLMServer, int, int], BenchResult]] = {
+    "generate": bench_generate_all_content,
+    "process": bench_process_text_async,
+    "crawl": bench_save_articles_from_items,
+}
+
+
+def run_benchmarks(
+    targets: list[str],
+    concurrency_levels: list[int],
+    articles: int,
+    config: MockLLMConfig,
+    client_timeout: float | None = None,
+    retries: int | None = None,
+) -> list[BenchResult]:
+    from app.core.config import settings
+
+    saved = (settings.AI_REQUEST_TIMEOUT_SECONDS, settings.AI_REQUEST_RETRIES)
+    if client_timeout is not None:
+        settings.AI_REQUEST_TIMEOUT_SECONDS = client_timeout
+    if retries is not None:
+        settings.AI_REQUEST_RETRIES = retries
+
+    results: list[BenchResult] = []
+    try:
+        with MockLLMServer(config) as server:
+            for target in targets:
+                for concurrency in concurrency_levels:
+                    results.append(TARGETS[target](server, concurrency, articles))
+    finally:
+        settings.AI_REQUEST_TIMEOUT_SECONDS, settings.AI_REQUEST_RETRIES = saved
+    return results
+
+
+def format_table(results: list[BenchResult]) -> str:
+    columns = ["target", "concurrency", "articles", "errors", "articles_per_sec", "p50_ms", "p95_ms", "p99_ms",
+               "peak_threads", "server_requests", "server_connections", "server_peak_in_flight"]
+    rows = [[str(result.as_dict()[column]) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(widths[i]) for i, column in enumerate(columns))]
+    lines += ["  ".join(value.ljust(widths[i]) for i, value in enumerate(row)) for row in rows]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="YomuTomo 生成管线压测（本地 mock LLM）")
+    parser.add_argument("--target", default="all", help="generate | process | crawl | all，可逗号分隔")
+    parser.add_argument("--concurrency", default="1,4,8", help="并发级别，逗号分隔")
+    parser.add_argument("--articles", type=int, default=16, help="每个并发级别处理的文章数")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=5.0, help="超时注入时 mock 挂起的秒数")
+    parser.add_argument("--client-timeout", type=float, default=None, help="覆盖 AI_REQUEST_TIMEOUT_SECONDS")
+    parser.add_argument("--retries", type=int, default=None, help="覆盖 AI_REQUEST_RETRIES")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 而不是表格")
+    args = parser.parse_args(argv)
+
+    targets = list(TARGETS) if args.target == "all" else [t.strip() for t in args.target.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"未知 target：{unknown}")
+    levels = [int(value) for value in args.concurrency.split(",") if value.strip()]
+
+    # 压测时业务日志只会干扰输出；必须在导入 app 之前设置，configure_logging 会读它
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    config = MockLLMConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+    )
+    results = run_benchmarks(targets, levels, args.articles, config, args.client_timeout, args.retries)
+    if args.json:
+        print(json.dumps([result.as_dict() for result in results], ensure_ascii=False, indent=2))
+    else:
+        print(format_table(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
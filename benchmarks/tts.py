@@ -0,0 +1,396 @@
+"""
+TTS 压测
+
+两种模型：
+- stub：确定性的假模型，每句耗时 = compute_ms + per_char_ms × 字数（sleep，模拟不持 GIL 的
+  torch 推理），写出合法 WAV，任何机器都能跑
+- real：MELOTTS_LOCAL_MODEL_DIR 下有 JP 权重且 melo 可导入时加载真实 CPU 模型；
+  按 variant 分别测 fp32（跳过 _maybe_quantize / int8 sidecar）与 int8（默认路径）
+
+两个入口：
+- service : 多线程直接调用 MeloTTSService.synthesize_to_file
+- api     : POST /api/tts（ASGI 进程内调用，经过进程内推理池；多进程池下子进程拿不到 stub，不测）
+
+请求文本由固定种子生成，hit_ratio 比例的请求重复之前出现过的文本（模拟缓存命中）。
+每个并发级别使用全新的缓存目录；同一 variant 内模型只加载一次。
+
+报告 req/s、p50/p95/p99、_infer_lock 等待（均值 / 最大）与实际推理次数（singleflight 合并后）、
+缓存索引查找命中率（整段 + 句级查找都计入）、429 数，real 模式下附 int8 相对 fp32 的吞吐比。
+api 入口在进程内推理池的单线程 executor 里排队，锁等待基本为 0，排队时间体现在延迟里。
+
+CLI：
+    python -m benchmarks.tts --model stub --concurrency 1,2,4 --requests 32 --compute-ms 40
+    python -m benchmarks.tts --model real --variants fp32,int8 --target service --requests 12
+pytest：
+    pytest -m benchmark tests/test_benchmark_tts.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from benchmarks.pipeline import BenchResult
+
+SENTENCES = [
+    "今日は朝から雨が降っていました。",
+    "午後になって天気が回復しました。",
+    "週末は全国的に晴れる見込みです。",
+    "行楽地は多くの人でにぎわいそうです。",
+    "朝晩は冷え込みが強まります。",
+    "体調管理に気をつけてください。",
+]
+
+
+@dataclass
+class StubConfig:
+    compute_ms: float = 40.0
+    per_char_ms: float = 2.0
+    frame_rate: int = 16000
+    # 每个字符生成的音频时长（秒）
+    seconds_per_char: float = 0.12
+
+
+@dataclass
+class TTSBenchResult:
+    model: str
+    variant: str
+    target: str
+    concurrency: int
+    requests: int
+    wall_seconds: float
+    latencies: list[float] = field(default_factory=list)
+    lock_waits: list[float] = field(default_factory=list)
+    errors: int = 0
+    rejected: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def as_dict(self) -> dict[str, object]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "model": self.model,
+            "variant": self.variant,
+            "target": self.target,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "req_per_sec": round(self.requests / self.wall_seconds, 3) if self.wall_seconds else 0.0,
+            "p50_ms": round(BenchResult._percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(BenchResult._percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(BenchResult._percentile(self.latencies, 99) * 1000, 1),
+            "lock_wait_mean_ms": round(statistics.fmean(self.lock_waits) * 1000, 1) if self.lock_waits else 0.0,
+            "lock_wait_max_ms": round(max(self.lock_waits) * 1000, 1) if self.lock_waits else 0.0,
+            "inferences": len(self.lock_waits),
+            "index_hit_rate": round(self.cache_hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class _TimedLock:
+    """包住 _infer_lock，记录每次获取的等待时间。"""
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self._lock = lock
+        self._guard = threading.Lock()
+        self.waits: list[float] = []
+
+    def __enter__(self) -> "_TimedLock":
+        start = time.perf_counter()
+        self._lock.acquire()
+        with self._guard:
+            self.waits.append(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._lock.release()
+
+
+def build_workload(requests: int, hit_ratio: float, sentences_per_request: int = 1, seed: int = 7) -> list[str]:
+    """固定种子生成请求文本；hit_ratio 比例的请求重复之前出现过的文本。"""
+    rng = random.Random(seed)
+    issued: list[str] = []
+    workload: list[str] = []
+    for index in range(requests):
+        if issued and rng.random() < hit_ratio:
+            workload.append(rng.choice(issued))
+            continue
+        parts = [
+            f"{index + 1}番目、" + SENTENCES[(index + offset) % len(SENTENCES)]
+            for offset in range(sentences_per_request)
+        ]
+        text = "".join(parts)
+        issued.append(text)
+        workload.append(text)
+    return workload
+
+
+def real_model_available(language: str = "JP") -> bool:
+    import app.services.tts as tts_module
+
+    checkpoint = os.path.join(tts_module._LOCAL_MODEL_ROOT, language, "checkpoint.pth")
+    return tts_module.melotts_available() and os.path.exists(checkpoint)
+
+
+def _make_stub_model(config: StubConfig):
+    import types
+
+    class StubTTSModel:
+        def __init__(self, language, device):
+            self.language = language
+            self.device = device
+            self.model = types.SimpleNamespace(parameters=lambda: [], state_dict=lambda: {})
+            self.hps = types.SimpleNamespace(data=types.SimpleNamespace(spk2id={language: 0}))
+
+        def tts_to_file(self, text, spk_id, path, speed=1.0):
+            time.sleep((config.compute_ms + config.per_char_ms * len(text)) / 1000 / speed)
+            frames = int(config.frame_rate * config.seconds_per_char * len(text) / speed)
+            with wave.open(path, "wb") as writer:
+                writer.setnchannels(1)
+                writer.setsampwidth(2)
+                writer.setframerate(config.frame_rate)
+                writer.writeframes(b"\x10\x00" * frames)
+
+    return StubTTSModel
+
+
+@contextmanager
+def _patched(obj, name: str, value) -> Iterator[None]:
+    saved = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, saved)
+
+
+@contextmanager
+def _service_for(model: str, variant: str, stub: StubConfig) -> Iterator[object]:
+    """按 model / variant 准备一个全新的 MeloTTSService 单例。"""
+    from contextlib import ExitStack
+
+    import app.services.tts as tts_module
+    from app.core.config import settings
+
+    with ExitStack() as stack, tempfile.TemporaryDirectory() as cache_dir:
+        stack.enter_context(_patched(settings, "TTS_CACHE_DIR", cache_dir))
+        stack.enter_context(_patched(settings, "TTS_WORKERS", 0))
+        if model == "stub":
+            stack.enter_context(_patched(tts_module, "_MeloTTS", _make_stub_model(stub)))
+            stack.enter_context(_patched(tts_module, "_MELOTTS_IMPORT_ERROR", None))
+            stack.enter_context(_patched(tts_module, "_has_cuda", lambda: False))
+        else:
+            stack.enter_context(_patched(settings, "TTS_DEVICE", "cpu"))
+        if model == "stub" or variant == "fp32":
+            stack.enter_context(_patched(tts_module.MeloTTSService, "_maybe_quantize", lambda self, m, lang: None))
+            stack.enter_context(
+                _patched(tts_module.MeloTTSService, "_try_load_int8_sidecar", lambda self, m, lang: False)
+            )
+        saved_instance = tts_module.MeloTTSService._instance
+        tts_module.MeloTTSService._instance = None
+        try:
+            service = tts_module.MeloTTSService()
+            # 模型加载不计入任何并发级别
+            service.warmup(settings.TTS_DEFAULT_LANGUAGE)
+            yield service
+        finally:
+            tts_module.MeloTTSService._instance = saved_instance
+
+
+@contextmanager
+def _fresh_cache(service) -> Iterator[None]:
+    from app.core.config import settings
+    from app.services.tts_cache import TTSCacheManager
+
+    saved_cache = service.cache
+    with tempfile.TemporaryDirectory() as cache_dir, _patched(settings, "TTS_CACHE_DIR", cache_dir):
+        service.cache = TTSCacheManager(cache_dir, max_bytes=0)
+        try:
+            yield
+        finally:
+            service.cache.close()
+            service.cache = saved_cache
+
+
+def _bench_service(service, workload: list[str], concurrency: int) -> tuple[list[float], int, int, float]:
+    latencies: list[float] = []
+    errors = 0
+
+    def one(text: str) -> float:
+        start = time.perf_counter()
+        service.synthesize_to_file(text, 1.0, "JP")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one, text) for text in workload]:
+            try:
+                latencies.append(future.result())
+            except Exception:  # noqa: BLE001 - 压测只计数
+                errors += 1
+    return latencies, errors, 0, time.perf_counter() - start
+
+
+def _bench_api(workload: list[str], concurrency: int) -> tuple[list[float], int, int, float]:
+    import httpx
+
+    from app import main as app_main
+    from app.core.config import settings
+    from app.services.tts_pool import shutdown_tts_pool
+
+    async def run() -> tuple[list[float], int, int, float]:
+        latencies: list[float] = []
+        errors = rejected = 0
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def one(text: str) -> None:
+                nonlocal errors, rejected
+                async with semaphore:
+                    start = time.perf_counter()
+                    resp = await client.post("/api/tts", json={"text": text, "speed": 1.0, "language": "JP"})
+                    latencies.append(time.perf_counter() - start)
+                    if resp.status_code == 429:
+                        rejected += 1
+                    elif resp.status_code != 200:
+                        errors += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(text) for text in workload))
+            return latencies, errors, rejected, time.perf_counter() - start
+
+    # 队列要能容纳全部并发，否则测到的是 429 而不是推理
+    shutdown_tts_pool()
+    try:
+        with _patched(settings, "TTS_QUEUE_SIZE", max(settings.TTS_QUEUE_SIZE, concurrency)):
+            return asyncio.run(run())
+    finally:
+        shutdown_tts_pool()
+
+
+def run_tts_benchmarks(
+    model: str = "stub",
+    variants: list[str] | None = None,
+    targets: list[str] | None = None,
+    concurrency_levels: list[int] | None = None,
+    requests: int = 24,
+    hit_ratio: float = 0.25,
+    sentences_per_request: int = 1,
+    stub: StubConfig | None = None,
+) -> list[TTSBenchResult]:
+    if model == "auto":
+        model = "real" if real_model_available() else "stub"
+    if model == "real" and not real_model_available():
+        raise RuntimeError("real 模式需要 melo 包以及 MELOTTS_LOCAL_MODEL_DIR/JP/checkpoint.pth")
+    variants = ["stub"] if model == "stub" else (variants or ["fp32", "int8"])
+    targets = targets or ["service", "api"]
+    concurrency_levels = concurrency_levels or [1, 2, 4]
+    stub = stub or StubConfig()
+    workload = build_workload(requests, hit_ratio, sentences_per_request)
+
+    results: list[TTSBenchResult] = []
+    for variant in variants:
+        with _service_for(model, variant, stub) as service:
+            timed_lock = _TimedLock(service._infer_lock)
+            with _patched(service, "_infer_lock", timed_lock):
+                for target in targets:
+                    for concurrency in concurrency_levels:
+                        with _fresh_cache(service):
+                            timed_lock.waits.clear()
+                            if target == "service":
+                                latencies, errors, rejected, wall = _bench_service(service, workload, concurrency)
+                            else:
+                                latencies, errors, rejected, wall = _bench_api(workload, concurrency)
+                            stats = service.cache.stats()
+                            results.append(
+                                TTSBenchResult(
+                                    model, variant, target, concurrency, len(workload), wall, latencies,
+                                    list(timed_lock.waits), errors, rejected, stats["hits"], stats["misses"],
+                                )
+                            )
+    return results
+
+
+def compare_variants(results: list[TTSBenchResult], baseline: str = "fp32", candidate: str = "int8") -> list[str]:
+    """candidate 相对 baseline 的吞吐 / p95 对比，每个 (target, concurrency) 一行。"""
+    rows = {(r.variant, r.target, r.concurrency): r.as_dict() for r in results}
+    lines: list[str] = []
+    for (variant, target, concurrency), base in rows.items():
+        other = rows.get((candidate, target, concurrency))
+        if variant != baseline or other is None or not base["req_per_sec"]:
+            continue
+        speedup = other["req_per_sec"] / base["req_per_sec"]
+        lines.append(
+            f"{target} c={concurrency}: {candidate} {other['req_per_sec']} req/s vs {baseline} {base['req_per_sec']} req/s "
+            f"(×{speedup:.2f})，p95 {other['p95_ms']} ms vs {base['p95_ms']} ms"
+        )
+    return lines
+
+
+def format_table(results: list[TTSBenchResult]) -> str:
+    columns = ["model", "variant", "target", "concurrency", "requests", "errors", "rejected", "req_per_sec",
+               "p50_ms", "p95_ms", "p99_ms", "lock_wait_mean_ms", "lock_wait_max_ms", "inferences", "index_hit_rate"]
+    rows = [[str(result.as_dict()[column]) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(widths[i]) for i, column in enumerate(columns))]
+    lines += ["  ".join(value.ljust(widths[i]) for i, value in enumerate(row)) for row in rows]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="YomuTomo TTS 压测（stub / 真实 MeloTTS）")
+    parser.add_argument("--model", default="stub", choices=["stub", "real", "auto"])
+    parser.add_argument("--variants", default="fp32,int8", help="real 模式下要对比的权重类型")
+    parser.add_argument("--target", default="service,api", help="service | api，可逗号分隔")
+    parser.add_argument("--concurrency", default="1,2,4", help="并发级别，逗号分隔")
+    parser.add_argument("--requests", type=int, default=24, help="每个并发级别的请求数")
+    parser.add_argument("--hit-ratio", type=float, default=0.25, help="重复文本（缓存命中）比例")
+    parser.add_argument("--sentences", type=int, default=1, help="每个请求包含的句数")
+    parser.add_argument("--compute-ms", type=float, default=40.0, help="stub 每句固定耗时")
+    parser.add_argument("--per-char-ms", type=float, default=2.0, help="stub 每字附加耗时")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 而不是表格")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.target.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in ("service", "api")]
+    if unknown:
+        parser.error(f"未知 target：{unknown}")
+
+    # 必须在导入 app 之前设置，configure_logging 会读它
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    results = run_tts_benchmarks(
+        model=args.model,
+        variants=[v.strip() for v in args.variants.split(",") if v.strip()],
+        targets=targets,
+        concurrency_levels=[int(value) for value in args.concurrency.split(",") if value.strip()],
+        requests=args.requests,
+        hit_ratio=args.hit_ratio,
+        sentences_per_request=args.sentences,
+        stub=StubConfig(compute_ms=args.compute_ms, per_char_ms=args.per_char_ms),
+    )
+    if args.json:
+        print(json.dumps([result.as_dict() for result in results], ensure_ascii=False, indent=2))
+    else:
+        print(format_table(results))
+        for line in compare_variants(results):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
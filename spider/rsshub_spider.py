@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import contextvars
+import hashlib
 import json
 import threading
+import time
+from collections import OrderedDict
 from typing import Iterable
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.logging_config import task_id_var
+from app.core.tracing import traced
 from app.db import get_db
 from app.model.models import Article, CrawlTask, User
 from app.services.ai_client_async import AIClientError
+from app.services.furigana_filter import UNLISTED_KANJI_LEVEL, estimate_text_level
 from app.services.notifications import create_notification
 from app.services import rsshub_feed as rsshub_feed_module
 from app.services.rsshub_feed import RSSHubFetchError, fetch_rsshub_feed_items, first_item_content, normalize_rsshub_source_url
-from app.services.services import generate_all_content, get_openai_client, log_with_time
+from app.services.tts_presynth import schedule_article_presynthesis
+from app.services.services import generate_all_content, get_openai_client, log_with_time, uses_local_vocab
+from app.services.vocabulary import list_mastered_words
 from app.utils.time import utc_now
 
 DEFAULT_NEWS_SOURCE_URL = settings.NEWS_CENTER_SOURCE_URL
@@ -147,7 +157,68 @@ def _format_rsshub_failure_message(exc: Exception, default_message: str) -> str:
     return default_message
 
 
-def generate_simplified_article(original_text, user_level, model, client):
+class _SimplifiedCache:
+    """简化结果缓存：同一条目、同一等级、同一模型只简化一次，多个用户抓同一个源时复用。
+
+    key 为 (source_url, 正文 sha256, 等级, 模型)：同一个 URL 的正文更新后不会拿到旧的简化结果；按 LRU 保留 SIMPLIFY_CACHE_MAX_ENTRIES 条，
+    SIMPLIFY_CACHE_TTL_SECONDS 后过期。只缓存模型成功返回的结果，失败回退原文的不缓存。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def key(original_text: str, user_level, model, source_url: str | None = None) -> tuple:
+        digest = hashlib.sha256((original_text or "").encode("utf-8")).hexdigest()
+        return (source_url or "", digest, user_level, model or "")
+
+    def get(self, key: tuple) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, simplified: str) -> None:
+        ttl = float(getattr(settings, "SIMPLIFY_CACHE_TTL_SECONDS", 86400))
+        max_entries = int(getattr(settings, "SIMPLIFY_CACHE_MAX_ENTRIES", 512))
+        if ttl <= 0 or max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, simplified)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+simplified_cache = _SimplifiedCache()
+
+
+@traced("ai.simplify_article")
+def generate_simplified_article(original_text, user_level, model, client, source_url: str | None = None):
+    # 汉字基本都在用户等级的常用表内，说明原文已经够简单，不再调模型。
+    # 常用表只到 N3：估计为"超出 N3"的文章分不出是 N2 还是 N1，对 N2 / N1 用户也照常简化，
+    # 所以 N2 / N1 用户只有原文落在 N3 表内时才跳过（N1 不会因为等级最高就一律跳过）
+    if getattr(settings, "SIMPLIFY_SKIP_ENABLED", True):
+        text_level = estimate_text_level(original_text, getattr(settings, "SIMPLIFY_SKIP_COVERAGE", 0.95))
+        if text_level <= min(user_level or 1, UNLISTED_KANJI_LEVEL - 1):
+            metrics.AI_SIMPLIFY_TOTAL.labels(result="skipped").inc()
+            return original_text
+    cache_key = simplified_cache.key(original_text, user_level, model, source_url)
+    cached = simplified_cache.get(cache_key)
+    if cached is not None:
+        metrics.AI_SIMPLIFY_TOTAL.labels(result="cache_hit").inc()
+        return cached
+
     levels = {
         1: "JLPT N5水平（基础词汇和语法）",
         2: "JLPT N4水平（日常会话）",
@@ -162,26 +233,41 @@ def generate_simplified_article(original_text, user_level, model, client):
             model=model,
             messages=[{"role": "user", "content": prompt}],
         )
-        return response.choices[0].message.content
+        simplified = response.choices[0].message.content
     except AIClientError as e:
         log_with_time(f"[AI] generate_simplified_article failed, fallback to original: {e}")
+        metrics.AI_SIMPLIFY_TOTAL.labels(result="failed").inc()
         return original_text
     except Exception as e:
         log_with_time(f"[AI] generate_simplified_article unexpected error, fallback to original: {e}")
+        metrics.AI_SIMPLIFY_TOTAL.labels(result="failed").inc()
         return original_text
+    if simplified:
+        simplified_cache.put(cache_key, simplified)
+    metrics.AI_SIMPLIFY_TOTAL.labels(result="generated").inc()
+    return simplified
 
 
-def _generate_article_from_item(user_id: int, user: User, item: dict, client) -> Article | None:
+@traced("crawl.generate_article")
+def _generate_article_from_item(
+    user_id: int,
+    user: User,
+    item: dict,
+    client,
+    known_words: set[str] | None = None,
+) -> Article | None:
     content = _item_content(item)
     if not content:
         return None
-
-    simplified = generate_simplified_article(content, user.level, user.openai_model, client)
-    ruby_text, vocab, translation, title, emoji = generate_all_content(simplified, user.openai_model, client)
     source_url = _item_url(item)
     if not source_url:
         return None
 
+    simplified = generate_simplified_article(content, user.level, user.openai_model, client, source_url=source_url)
+    ruby_text, vocab, translation, title, emoji = generate_all_content(
+        simplified, user.openai_model, client, level=user.level, known_words=known_words
+    )
+
     return Article(
         user_id=user_id,
         title=title,
@@ -225,11 +311,13 @@ def _save_articles_from_items(
     db.commit()
 
     client = get_openai_client(user.openai_api_key, user.openai_base_url)
+    # 已掌握的词只在本地选词模式下用得上
+    known_words = list_mastered_words(db, user_id) if uses_local_vocab() else None
     processed_count = 0
 
     for item in items:
         try:
-            article = _generate_article_from_item(user_id, user, item, client)
+            article = _generate_article_from_item(user_id, user, item, client, known_words)
             if not article:
                 log_with_time(f"⚠️ 条目缺少可用正文，跳过: {item.get('title')}")
                 continue
@@ -239,15 +327,13 @@ def _save_articles_from_items(
             task.processed_articles = processed_count
             task.updated_at = utc_now()
             db.commit()
+            schedule_article_presynthesis(article.id, article.original)
             log_with_time(f"✅ 已处理 {processed_count}/{task.total_articles} 篇文章: {item.get('title')}")
         except AIClientError as e:
             log_with_time(f"⚠️ 处理文章时 AI 请求失败，已跳过该条: {item.get('title')}, 错误: {e}")
             continue
         except Exception as e:
-            log_with_time(f"❌ 处理文章失败: {item.get('title')}, 错误: {e}")
-            import traceback
-
-            traceback.print_exc()
+            log_with_time(f"❌ 处理文章失败: {item.get('title')}, 错误: {e}", level="ERROR", exc_info=True)
             continue
 
     task.status = "completed" if processed_count > 0 else "failed"
@@ -294,6 +380,7 @@ def get_houkago_news():
         return []
 
 
+@traced("crawl.background")
 def _crawl_feed_background(
     user_id: int,
     task_id: int,
@@ -304,6 +391,7 @@ def _crawl_feed_background(
     selected_url_list = _normalize_selected_urls(selected_urls)
     task = None
     normalized_source = source_url or DEFAULT_NEWS_SOURCE_URL
+    task_token = task_id_var.set(str(task_id))
 
     try:
         task = db.query(CrawlTask).filter(CrawlTask.id == task_id).first()
@@ -357,10 +445,7 @@ def _crawl_feed_background(
         return result
     except Exception as e:
         failure_message = _format_rsshub_failure_message(e, f"新闻生成失败：{str(e)}")
-        log_with_time(f"❌ 后台处理失败: {e}")
-        import traceback
-
-        traceback.print_exc()
+        log_with_time(f"❌ 后台处理失败: {e}", level="ERROR", exc_info=True)
         if task:
             task.status = "failed"
             task.updated_at = utc_now()
@@ -381,6 +466,7 @@ def _crawl_feed_background(
             return _build_crawl_result(False, failure_message, task.id, task.processed_articles)
         return _build_crawl_result(False, failure_message, task_id, 0)
     finally:
+        task_id_var.reset(task_token)
         db.close()
 
 
@@ -408,9 +494,10 @@ def crawl_feed(user_id: int, source_url: str | None = None, selected_urls: Itera
         db.commit()
         db.refresh(task)
 
+        # 复制发起请求时的上下文，request_id 等 contextvars 才能带进后台线程
         thread = threading.Thread(
-            target=_crawl_feed_background,
-            args=(user_id, task.id, normalized_source, selected_url_list or None),
+            target=contextvars.copy_context().run,
+            args=(_crawl_feed_background, user_id, task.id, normalized_source, selected_url_list or None),
         )
         thread.daemon = True
         thread.start()
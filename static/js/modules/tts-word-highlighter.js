@@ -89,6 +89,24 @@
       const match = wordRanges.find((range) => charIndex >= range.start && charIndex < range.end);
       return match ? match.wordIndex : -1;
     }
+
+    /**
+     * 用服务端时间轴（GET /api/tts/timings/{key}）定位当前词：
+     * 取 start_ms <= ms 的最后一个 token，再按它的 char_start 映射到词块
+     */
+    findWordIndexAtTime(timings, wordRanges, ms) {
+      const tokens = timings && Array.isArray(timings.tokens) ? timings.tokens : [];
+      if (!tokens.length || typeof ms !== 'number' || Number.isNaN(ms)) {
+        return -1;
+      }
+
+      let current = null;
+      for (const token of tokens) {
+        if (token.start_ms > ms) break;
+        current = token;
+      }
+      return current ? this.findWordIndexAtCharIndex(wordRanges, current.char_start) : -1;
+    }
   }
 
   return { TTSWordHighlighter };
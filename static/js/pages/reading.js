@@ -8,6 +8,9 @@ let textHighlighter;
 let pdfExporter;
 let ttsWordHighlighter;
 
+// 朗读语速；服务端预合成用同一个值（app/services/tts_presynth.py READER_TTS_SPEED），两边要一起改
+const READER_TTS_SPEED = 1.0;
+
 class ReadingPageController {
   constructor() {
     this.storageKey = 'yomu-reading-state';
@@ -24,6 +27,8 @@ class ReadingPageController {
     this.audio = null;
     this.currentAudioUrl = null;
     this.currentAbortController = null;
+    // 当前句的服务端词级时间轴（/api/tts/timings），到达前为 null
+    this.currentTimings = null;
     this.root = document.body;
     this.wordHighlighter = null;
     this.evaluationDetailEl = null;
@@ -441,6 +446,21 @@ class ReadingPageController {
       return;
     }
     // 用 char index 比例映射 → currentTime / duration
+    if (this.currentTimings && this.wordHighlighter?.findWordIndexAtTime) {
+      // 服务端时间轴：句子边界来自实际音频，不随篇幅漂移
+      const timedIndex = this.wordHighlighter.findWordIndexAtTime(
+        this.currentTimings,
+        sentenceItem.wordRanges,
+        audio.currentTime * 1000
+      );
+      if (timedIndex >= 0) {
+        if (timedIndex !== this.currentWordIndex) {
+          this.currentWordIndex = timedIndex;
+          this.syncSentenceHighlight();
+        }
+        return;
+      }
+    }
     const totalChars = sentenceItem.wordRanges[sentenceItem.wordRanges.length - 1].end || 1;
     const currentChar = Math.max(0, Math.min(totalChars, (audio.currentTime / duration) * totalChars));
     let wordIndex = this.wordHighlighter?.findWordIndexAtCharIndex(sentenceItem.wordRanges, currentChar) ?? -1;
@@ -476,7 +496,8 @@ class ReadingPageController {
     const controller = new AbortController();
     this.currentAbortController = controller;
 
-    const body = { text };
+    const body = { text, timings: true };
+    this.currentTimings = null;
     if (typeof options.speed === 'number') body.speed = options.speed;
     if (options.language) body.language = options.language;
 
@@ -512,6 +533,19 @@ class ReadingPageController {
       return;
     }
 
+    const timingsUrl = response.headers.get('X-TTS-Timings');
+    if (timingsUrl) {
+      // 时间轴与音频并行拉取；没拿到之前按字数比例估算
+      fetch(timingsUrl, { signal: controller.signal })
+        .then((res) => (res.ok ? res.json() : null))
+        .then((timings) => {
+          if (timings && this.isActivePlayback(sessionId) && this.currentAbortController === controller) {
+            this.currentTimings = timings;
+          }
+        })
+        .catch(() => { /* 回退到估算 */ });
+    }
+
     const blob = await response.blob();
     if (!this.isActivePlayback(sessionId)) {
       return;
@@ -559,7 +593,7 @@ class ReadingPageController {
     this.syncSentenceHighlight();
     this.updateTtsButtons(true);
 
-    await this.fetchAndPlayAudio(sessionId, sentenceItem.text, { speed: 1.0 });
+    await this.fetchAndPlayAudio(sessionId, sentenceItem.text, { speed: READER_TTS_SPEED });
     if (!this.isActivePlayback(sessionId)) {
       return;
     }
@@ -711,7 +745,7 @@ class ReadingPageController {
     this.syncSentenceHighlight();
     this.updateTtsButtons(true);
 
-    await this.fetchAndPlayAudio(sessionId, text, { speed: 1.0 });
+    await this.fetchAndPlayAudio(sessionId, text, { speed: READER_TTS_SPEED });
     if (!this.isActivePlayback(sessionId) || !this.audio) {
       this.updateTtsButtons(false);
       return;
@@ -163,6 +163,363 @@ def test_openai_timeout_exhaustion_raises_clean_error(monkeypatch):
     assert exception_calls == []
 
 
+def test_fallback_endpoint_is_remembered_per_provider(monkeypatch):
+    ai_client_async.endpoint_memo.clear()
+    fake_client = SequencedAsyncClient(
+        steps=[
+            FakeResponse({"error": "not found"}, status_code=404),
+            FakeResponse(_openai_payload()),
+            FakeResponse(_openai_payload()),
+        ],
+    )
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+
+    client = OpenAICompatClient({"api_url": "https://example.com/custom", "api_key": "sk-test", "model": "gpt-test"})
+    for _ in range(2):
+        result = asyncio.run(client.chat([{"role": "user", "content": "hello"}]))
+        assert result["text"] == "ok"
+
+    assert [request["url"] for request in fake_client.requests] == [
+        "https://example.com/custom/v1/chat/completions",
+        "https://example.com/custom",
+        "https://example.com/custom",
+    ]
+    ai_client_async.endpoint_memo.clear()
+
+
+def test_remembered_endpoint_is_invalidated_and_reprobed(monkeypatch):
+    ai_client_async.endpoint_memo.clear()
+    monkeypatch.setattr(ai_client_async.settings, "AI_REQUEST_RETRIES", 1)
+    monkeypatch.setattr(ai_client_async.settings, "AI_ENDPOINT_MEMO_MAX_FAILURES", 2)
+    fake_client = SequencedAsyncClient(
+        steps=[
+            # 学到 fallback
+            FakeResponse({"error": "not found"}, status_code=404),
+            FakeResponse(_openai_payload()),
+            # 记忆的 fallback 连续 500 两次 → 第二次作废并重新探测构造路径
+            FakeResponse({"error": "boom"}, status_code=500),
+            FakeResponse({"error": "boom"}, status_code=500),
+            FakeResponse(_gemini_payload()),
+        ],
+    )
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+    monkeypatch.setattr(ai_client_async.logger, "exception", lambda *args, **kwargs: None)
+
+    client = GeminiClient({"api_url": "https://example.com", "api_key": "key", "model": "gemini-test"})
+    messages = [{"role": "user", "content": "hello"}]
+    assert asyncio.run(client.chat(messages))["text"] == "ok"
+    with pytest.raises(AIClientError, match="HTTP 500"):
+        asyncio.run(client.chat(messages))
+    assert asyncio.run(client.chat(messages))["text"] == "ok"
+
+    urls = [request["url"] for request in fake_client.requests]
+    assert urls == [
+        "https://example.com/v1/models/gemini-test:generateMessage",
+        "https://example.com/v1/chat/completions",
+        "https://example.com/v1/chat/completions",
+        "https://example.com/v1/chat/completions",
+        "https://example.com/v1/models/gemini-test:generateMessage",
+    ]
+    # fallback 用的是 OpenAI 形状的请求体
+    assert fake_client.requests[1]["json"]["model"] == "gemini-test"
+    ai_client_async.endpoint_memo.clear()
+
+
+def test_validate_provider_is_cached_until_auth_failure(monkeypatch):
+    ai_client_async.validation_cache.clear()
+    monkeypatch.setattr(ai_client_async.settings, "AI_REQUEST_RETRIES", 1)
+    fake_client = SequencedAsyncClient(
+        steps=[
+            FakeResponse(_openai_payload()),
+            FakeResponse({"error": "invalid key"}, status_code=401),
+            FakeResponse(_openai_payload()),
+        ],
+    )
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+    monkeypatch.setattr(ai_client_async.logger, "exception", lambda *args, **kwargs: None)
+    provider = {"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"}
+
+    assert asyncio.run(ai_client_async.validate_provider(provider))["text"] == "ok"
+    # 缓存有效：不再探测
+    assert asyncio.run(ai_client_async.validate_provider(dict(provider))) is None
+    assert fake_client.calls == 1
+    # 同 key 不同模型是另一份配置
+    assert not ai_client_async.validation_cache.is_valid({**provider, "model": "other"})
+
+    # 真实调用遇到 401 → 作废，下次重新探测
+    with pytest.raises(AIClientError, match="HTTP 401"):
+        asyncio.run(OpenAICompatClient(dict(provider)).chat([{"role": "user", "content": "translate"}]))
+    assert asyncio.run(ai_client_async.validate_provider(provider))["text"] == "ok"
+    assert fake_client.calls == 3
+    ai_client_async.validation_cache.clear()
+
+
+class FakeStreamResponse:
+    def __init__(self, lines, status_code: int = 200):
+        self.lines = lines
+        self.status_code = status_code
+        self.headers = {"content-type": "text/event-stream"}
+        self.consumed = 0
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.closed = True
+        return False
+
+    async def aiter_lines(self):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+
+
+class StreamingAsyncClient(SequencedAsyncClient):
+    def stream(self, method, url, headers=None, json=None, params=None):
+        self.requests.append({"url": url, "headers": headers, "json": json, "params": params})
+        step = self.steps[self.calls]
+        self.calls += 1
+        return step
+
+
+def _sse(event) -> str:
+    return "data: " + json.dumps(event, ensure_ascii=False)
+
+
+def test_stream_stops_reading_once_predicate_is_satisfied(monkeypatch):
+    ai_client_async.endpoint_memo.clear()
+    cases = [
+        (
+            OpenAICompatClient,
+            {"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"},
+            lambda piece: {"choices": [{"delta": {"content": piece}}]},
+            "https://example.com/v1/chat/completions",
+        ),
+        (
+            GeminiClient,
+            {"api_url": "https://generativelanguage.googleapis.com", "api_key": "gemini-key", "model": "gemini-test"},
+            lambda piece: {"candidates": [{"content": {"parts": [{"text": piece}]}}]},
+            "https://generativelanguage.googleapis.com/v1/models/gemini-test:streamGenerateContent",
+        ),
+    ]
+    for client_cls, provider, event, expected_url in cases:
+        response = FakeStreamResponse([_sse(event("🍣")), "", _sse(event(" 寿司的说明")), _sse(event("……")), "data: [DONE]"])
+        fake_client = StreamingAsyncClient(steps=[response])
+        monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+
+        result = asyncio.run(
+            client_cls(provider).chat(
+                [{"role": "user", "content": "emoji"}],
+                stream=True,
+                stop_when=lambda text: bool(text.strip()),
+                max_chunks=8,
+            )
+        )
+
+        assert result["text"] == "🍣"
+        assert result["stopped_early"] is True
+        assert response.consumed == 1
+        assert response.closed is True
+        assert fake_client.requests[0]["url"] == expected_url
+
+    # 块数上限只在本地生效，不当作 token 上限下发
+    assert "generationConfig" not in fake_client.requests[0]["json"]
+    assert fake_client.requests[0]["params"] == {"key": "gemini-key", "alt": "sse"}
+
+
+def test_stream_falls_back_to_plain_request_on_404(monkeypatch):
+    ai_client_async.endpoint_memo.clear()
+    fake_client = StreamingAsyncClient(
+        steps=[FakeStreamResponse([], status_code=404), FakeResponse(_openai_payload())],
+    )
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+
+    client = OpenAICompatClient({"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"})
+    result = asyncio.run(client.chat([{"role": "user", "content": "hi"}], stream=True, max_chunks=4))
+
+    assert result["text"] == "ok"
+    assert fake_client.requests[0]["json"]["stream"] is True
+    assert "stream" not in fake_client.requests[1]["json"]
+    assert "max_tokens" not in fake_client.requests[1]["json"]
+
+
+def test_stream_stops_after_max_chunks(monkeypatch):
+    ai_client_async.endpoint_memo.clear()
+    event = lambda piece: {"choices": [{"delta": {"content": piece}}]}
+    response = FakeStreamResponse([_sse(event("一")), _sse(event("二")), _sse(event("三")), "data: [DONE]"])
+    fake_client = StreamingAsyncClient(steps=[response])
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+
+    client = OpenAICompatClient({"api_url": "https://api.openai.com/v1", "api_key": "sk-test", "model": "gpt-test"})
+    result = asyncio.run(client.chat([{"role": "user", "content": "hi"}], stream=True, max_chunks=2))
+
+    assert result["text"] == "一二"
+    assert result["stopped_early"] is True
+    body = fake_client.requests[0]["json"]
+    assert "max_tokens" not in body and "max_completion_tokens" not in body
+
+
+def test_short_subtask_predicates():
+    from app.services.services import _emoji_complete, _title_complete
+
+    assert not _emoji_complete("  ")
+    assert _emoji_complete("📝")
+    assert not _emoji_complete("👨\u200d")
+    assert not _emoji_complete("🇯")
+    assert _emoji_complete("🇯🇵")
+    assert not _title_complete("东京樱花")
+    assert _title_complete("东京樱花提前开放\n说明")
+
+
+class SlowAsyncClient:
+    """每次 post 按 delays 依次睡眠后返回 payload，记录被取消的请求。"""
+
+    def __init__(self, delays, payload):
+        self.delays = list(delays)
+        self.payload = payload
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def post(self, url, headers=None, json=None, params=None):
+        delay = self.delays[self.calls]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return FakeResponse(self.payload)
+
+
+def test_subtask_deadline_cancels_slow_request(monkeypatch):
+    fake_client = SlowAsyncClient([5.0], _openai_payload())
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+    monkeypatch.setattr(ai_client_async.settings, "AI_SUBTASK_DEADLINES", "emoji=0.05")
+    client = OpenAICompatClient({"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"})
+
+    async def run():
+        with ai_client_async.subtask_budget("emoji"):
+            return await client.chat([{"role": "user", "content": "emoji"}])
+
+    with pytest.raises(AIClientError, match="emoji 超过时限"):
+        asyncio.run(run())
+    assert fake_client.cancelled == 1
+
+
+def test_hedged_request_wins_and_loser_is_cancelled(monkeypatch):
+    ai_client_async.latency_tracker.clear()
+    monkeypatch.setattr(ai_client_async.settings, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(ai_client_async.settings, "AI_HEDGE_MIN_SAMPLES", 5)
+    key = ("openai", "gpt-test", "title")
+    for _ in range(5):
+        ai_client_async.latency_tracker.record(key, 0.02)
+
+    fake_client = SlowAsyncClient([5.0, 0.0], _openai_payload())
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+    client = OpenAICompatClient({"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"})
+
+    async def run():
+        with ai_client_async.subtask_budget("title", 3.0):
+            return await client.chat([{"role": "user", "content": "title"}])
+
+    assert asyncio.run(run())["text"] == "ok"
+    assert fake_client.calls == 2
+    assert fake_client.cancelled == 1
+    ai_client_async.latency_tracker.clear()
+
+
+def test_generate_all_content_degrades_cheap_subtasks_past_deadline(monkeypatch):
+    import threading
+
+    from app.services import services as service_module
+
+    release = threading.Event()
+    monkeypatch.setattr(service_module.settings, "AI_SUBTASK_DEADLINES", "title=0.05,emoji=0.05")
+    monkeypatch.setattr(service_module, "_SUBTASK_GRACE_SECONDS", 0.0)
+    monkeypatch.setattr(service_module, "generate_ruby", lambda text, model, client: "ruby")
+    monkeypatch.setattr(service_module, "extract_vocabulary", lambda text, model, client: [])
+    monkeypatch.setattr(service_module, "translate_to_chinese", lambda text, model, client: "翻译")
+    monkeypatch.setattr(service_module, "generate_title", lambda text, model, client: release.wait(5) and "不会用到")
+    monkeypatch.setattr(service_module, "generate_emoji", lambda text, model, client: release.wait(5) and "🍣")
+
+    try:
+        result = service_module.generate_all_content("東京で桜が咲いた。東京の桜は美しい。", "gpt-test", object())
+    finally:
+        release.set()
+
+    assert result[:3] == ("ruby", [], "翻译")
+    assert result[3] == service_module.local_title("東京で桜が咲いた。東京の桜は美しい。")
+    # emoji 先查关键词表，查不到才是 📝
+    assert result[4] == "🌸"
+    assert service_module.local_title("ひらがなだけ") == "朗读练习"
+
+
+def test_subtask_prompts_share_the_article_prefix(monkeypatch):
+    from app.services import services as service_module
+
+    seen = []
+
+    class RecordingCompletions:
+        def create(self, model, messages, **kwargs):
+            seen.append(messages)
+            content = '[{"word": "世界", "meaning": "世界", "pronunciation": "sekai"}]'
+            return type("Resp", (), {"choices": [type("C", (), {"message": type("M", (), {"content": content})()})()]})()
+
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": RecordingCompletions()})()})()
+    monkeypatch.setattr(service_module.settings, "FURIGANA_MODE", "hybrid")
+    text = "世界の経済について話します。"
+    for generator in (
+        service_module.generate_ruby,
+        service_module.extract_vocabulary,
+        service_module.translate_to_chinese,
+        service_module.generate_title,
+        service_module.generate_emoji,
+    ):
+        generator(text, "gpt-test", client)
+
+    prefixes = {messages[0]["content"] for messages in seen}
+    assert len(prefixes) == 1
+    assert text in prefixes.pop()
+    assert all(messages[0]["role"] == "system" and text not in messages[1]["content"] for messages in seen)
+
+
+def test_cache_hints_and_cached_token_reporting(monkeypatch):
+    payload = {
+        "choices": [{"message": {"content": "ok"}}],
+        "usage": {"prompt_tokens": 1200, "prompt_tokens_details": {"cached_tokens": 1024}},
+    }
+    fake_client = SequencedAsyncClient(steps=[FakeResponse(payload), FakeResponse(payload)])
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", lambda timeout=None: fake_client)
+    messages = [{"role": "system", "content": "<article>本文</article>"}, {"role": "user", "content": "翻译"}]
+
+    result = asyncio.run(
+        OpenAICompatClient({"api_url": "https://api.openai.com/v1", "api_key": "sk", "model": "gpt"}).chat(messages)
+    )
+    assert result["usage"] == {"prompt_tokens": 1200, "cached_tokens": 1024}
+    assert len(fake_client.requests[0]["json"]["prompt_cache_key"]) == 16
+
+    asyncio.run(
+        OpenAICompatClient({"api_url": "https://openrouter.ai/api/v1", "api_key": "sk", "model": "anthropic/claude-x"}).chat(messages)
+    )
+    system = fake_client.requests[1]["json"]["messages"][0]["content"]
+    assert system == [{"type": "text", "text": "<article>本文</article>", "cache_control": {"type": "ephemeral"}}]
+    # 调用方的消息列表不被改写
+    assert messages[0]["content"] == "<article>本文</article>"
+
+    assert ai_client_async._usage_tokens({"usage": {"prompt_tokens": 10, "prompt_cache_hit_tokens": 8}})["cached_tokens"] == 8
+    assert ai_client_async._usage_tokens({"usageMetadata": {"promptTokenCount": 10, "cachedContentTokenCount": 6}}) == {
+        "prompt_tokens": 10,
+        "cached_tokens": 6,
+    }
+
+
 def test_generate_simplified_article_falls_back_to_original_text():
     class RaisingCompletions:
         def create(self, *args, **kwargs):
@@ -172,12 +529,52 @@ def test_generate_simplified_article_falls_back_to_original_text():
         def __init__(self):
             self.chat = type("Chat", (), {"completions": RaisingCompletions()})()
 
-    original = "今日は天気です"
+    original = "経済の影響で物価が上昇した"
     result = generate_simplified_article(original, 3, "gpt-test", RaisingClient())
 
     assert result == original
 
 
+def test_generate_simplified_article_skips_easy_text_and_caches_by_level():
+    from spider import rsshub_spider
+
+    rsshub_spider.simplified_cache.clear()
+    calls = []
+
+    class CountingCompletions:
+        def create(self, model, messages, **kwargs):
+            calls.append((model, messages))
+            message = type("M", (), {"content": f"简化版{len(calls)}"})()
+            return type("Resp", (), {"choices": [type("C", (), {"message": message})()]})()
+
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": CountingCompletions()})()})()
+
+    # 汉字都在 N5 常用表内：不调模型
+    assert generate_simplified_article("今日は天気です。先生と学校へ行きます。", 1, "gpt-test", client) == "今日は天気です。先生と学校へ行きます。"
+    assert calls == []
+
+    hard = "経済の影響で物価が上昇した"
+    url = "https://example.com/news/1"
+    assert generate_simplified_article(hard, 1, "gpt-test", client, source_url=url) == "简化版1"
+    # 同等级、同模型的另一个用户：命中缓存
+    assert generate_simplified_article(hard, 1, "gpt-test", client, source_url=url) == "简化版1"
+    assert len(calls) == 1
+    # 等级或模型不同时重新简化
+    assert generate_simplified_article(hard, 2, "gpt-test", client, source_url=url) == "简化版2"
+    assert generate_simplified_article(hard, 1, "other-model", client, source_url=url) == "简化版3"
+    # 同一个 URL 的正文变了：不能复用旧的简化结果
+    assert generate_simplified_article(hard + "と報じた", 1, "gpt-test", client, source_url=url) == "简化版4"
+
+    # N2 / N1：原文落在 N3 表内时跳过，超出 N3 的照常简化（N1 不会一律跳过）
+    n3_text = "感想を調べる"
+    assert generate_simplified_article(n3_text, 4, "gpt-test", client) == n3_text
+    assert generate_simplified_article(n3_text, 5, "gpt-test", client) == n3_text
+    assert len(calls) == 4
+    assert generate_simplified_article(hard, 4, "gpt-test", client, source_url=url) == "简化版5"
+    assert generate_simplified_article(hard, 5, "gpt-test", client, source_url=url) == "简化版6"
+    rsshub_spider.simplified_cache.clear()
+
+
 def test_get_article_content_returns_none_when_fetch_fails(monkeypatch):
     monkeypatch.setattr("app.services.rsshub_feed.requests.get", lambda *args, **kwargs: (_ for _ in ()).throw(httpx.ReadTimeout("read timed out")))
 
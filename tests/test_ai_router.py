@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.services import ai_router
+from app.services import services as service_module
+from app.services.ai_client_async import AIClientError, subtask_budget
+
+
+@pytest.fixture(autouse=True)
+def _reset_router(monkeypatch):
+    monkeypatch.setattr(
+        ai_router.settings,
+        "AI_PROVIDERS",
+        json.dumps(
+            [
+                {"name": "cheap", "api_url": "https://cheap.example.com/v1", "api_key": "sk-cheap", "model": "mini"},
+                {"name": "strong", "api_url": "https://strong.example.com/v1", "api_key_env": "STRONG_KEY", "model": "large"},
+            ]
+        ),
+    )
+    monkeypatch.setattr(ai_router.settings, "AI_SUBTASK_ROUTES", "emoji=cheap,translation=strong|cheap")
+    monkeypatch.setattr(ai_router.settings, "AI_PROVIDER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setenv("STRONG_KEY", "sk-strong")
+    ai_router.router.reset()
+    yield
+    ai_router.router.reset()
+
+
+def _install_fake_clients(monkeypatch, failing: set[str]):
+    calls = []
+
+    class FakeClient:
+        def __init__(self, provider):
+            self.provider = provider
+
+        async def chat(self, messages, **kwargs):
+            calls.append((self.provider["api_url"], self.provider["model"]))
+            if self.provider["api_url"] in failing:
+                raise AIClientError("HTTP 500")
+            return {"text": f"from {self.provider['model']}", "raw": None}
+
+    monkeypatch.setattr(service_module.AIClient, "factory", staticmethod(FakeClient))
+    return calls
+
+
+def _create(subtask: str | None):
+    client = service_module.SyncCompatClient({"api_url": "https://user.example.com/v1", "api_key": "sk-user", "model": None})
+    messages = [{"role": "user", "content": "hi"}]
+    if subtask is None:
+        return client.chat.completions.create(model="user-model", messages=messages).choices[0].message.content
+    with subtask_budget(subtask, 30):
+        return client.chat.completions.create(model="user-model", messages=messages).choices[0].message.content
+
+
+def test_subtasks_use_their_routed_provider(monkeypatch):
+    calls = _install_fake_clients(monkeypatch, failing=set())
+
+    assert _create("emoji") == "from mini"
+    assert _create("translation") == "from large"
+    # 未配置路由的子任务只用用户自己的配置
+    assert _create("ruby") == "from user-model"
+    assert _create(None) == "from user-model"
+    assert calls[1] == ("https://strong.example.com/v1", "large")
+
+
+def test_failover_and_health_demotes_failing_provider(monkeypatch):
+    calls = _install_fake_clients(monkeypatch, failing={"https://strong.example.com/v1"})
+
+    assert _create("translation") == "from mini"
+    assert [url for url, _model in calls] == ["https://strong.example.com/v1", "https://cheap.example.com/v1"]
+    assert ai_router.router.health("strong") < ai_router.router.health("cheap")
+
+    # 健康度更低的 strong 排到 cheap 后面，之后不再先打它
+    calls.clear()
+    assert _create("translation") == "from mini"
+    assert [url for url, _model in calls] == ["https://cheap.example.com/v1"]
+
+
+def test_all_candidates_failing_raises_last_error(monkeypatch):
+    _install_fake_clients(
+        monkeypatch,
+        failing={"https://cheap.example.com/v1", "https://user.example.com/v1"},
+    )
+
+    with pytest.raises(AIClientError):
+        _create("emoji")
+    plan = [name for name, _provider in ai_router.router.plan("emoji", {"model": "m"})]
+    assert plan == ["cheap", "user"]
+
+
+def test_user_stays_last_and_demoted_provider_is_probed_after_cooldown(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ai_router.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(ai_router.settings, "AI_PROVIDER_COOLDOWN_SECONDS", 60)
+    failing = {"https://strong.example.com/v1"}
+    calls = _install_fake_clients(monkeypatch, failing=failing)
+
+    assert _create("translation") == "from mini"
+    # 用户配置一直固定兜底，不会因为 provider 失败一次被排到前面
+    plan = [name for name, _provider in ai_router.router.plan("translation", {"model": "m"})]
+    assert plan == ["cheap", "strong", "user"]
+
+    # 冷却期过后 strong 按原顺序被探测一次；恢复了就回到第一位
+    failing.clear()
+    clock[0] += 61
+    calls.clear()
+    assert _create("translation") == "from large"
+    assert [url for url, _model in calls] == ["https://strong.example.com/v1"]
+    plan = [name for name, _provider in ai_router.router.plan("translation", {"model": "m"})]
+    assert plan == ["strong", "cheap", "user"]
+
+
+def test_failover_stops_once_subtask_deadline_has_passed(monkeypatch):
+    from app.services import ai_client_async
+
+    clock = [1000.0]
+    monkeypatch.setattr(ai_client_async.time, "monotonic", lambda: clock[0])
+    outcomes = []
+    monkeypatch.setattr(ai_router, "record_outcome", lambda name, subtask, ok: outcomes.append((name, ok)))
+    calls = []
+
+    class SlowFailingClient:
+        def __init__(self, provider):
+            self.provider = provider
+
+        async def chat(self, messages, **kwargs):
+            calls.append(self.provider["api_url"])
+            # 第一个候选把整个子任务时限耗光后才失败
+            clock[0] += 31
+            raise AIClientError("HTTP 504")
+
+    monkeypatch.setattr(service_module.AIClient, "factory", staticmethod(SlowFailingClient))
+
+    with pytest.raises(AIClientError):
+        _create("translation")
+    # 时限已过，cheap 和 user 没有发出请求，也不记失败
+    assert calls == ["https://strong.example.com/v1"]
+    assert outcomes == [("strong", False)]
@@ -173,7 +173,7 @@ def app_client(client: TestClient, db_session, monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(
         articles_router,
         "generate_all_content",
-        lambda text, model, client: (
+        lambda text, model, client, **kwargs: (
             "<ruby>今天<rt>きょう</rt></ruby>",
             [{"word": "天气", "meaning": "天气", "pronunciation": "てんき"}],
             "今天天气很好",
@@ -262,7 +262,7 @@ def app_client(client: TestClient, db_session, monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(
         service_module,
         "generate_all_content",
-        lambda text, model, client: (
+        lambda text, model, client, **kwargs: (
             "<ruby>今天<rt>きょう</rt></ruby>",
             [{"word": "天气", "meaning": "天气", "pronunciation": "てんき"}],
             "今天天气很好",
@@ -543,6 +543,29 @@ def test_process_text_async_creates_article_and_vocab(app_client: TestClient, us
     assert vocab_entry.word == "天气"
 
 
+def test_process_text_async_only_loads_mastered_words_in_local_vocab_mode(
+    app_client: TestClient, user_factory, monkeypatch: pytest.MonkeyPatch
+):
+    user = user_factory(api_key="sk-test", base_url="https://example.com/v1", model="gpt-test")
+    _login(app_client, user.email)
+    seen = []
+    queried = []
+    monkeypatch.setattr(articles_router, "list_mastered_words", lambda db, user_id: queried.append(user_id) or {"天気"})
+    monkeypatch.setattr(
+        articles_router,
+        "generate_all_content",
+        lambda text, model, client, **kwargs: seen.append(kwargs["known_words"]) or ("", [], "", "标题", "📝"),
+    )
+
+    monkeypatch.setattr(settings, "AI_VOCAB_MODE", "llm")
+    assert app_client.post("/process_text_async", data={"text": "今日は天気です"}).status_code == 200
+    monkeypatch.setattr(settings, "AI_VOCAB_MODE", "local")
+    assert app_client.post("/process_text_async", data={"text": "今日は天気です"}).status_code == 200
+
+    assert seen == [None, {"天気"}]
+    assert queried == [user.id]
+
+
 def test_view_article_requires_login(app_client: TestClient, user_factory, db_session):
     user = user_factory()
     article = _create_article(db_session, user.id)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from benchmarks.micro import MicroResult, find_regressions, load_baseline, run_micro
+
+pytestmark = pytest.mark.benchmark
+
+# 共享 CI 机器上吞吐抖动较大，这里默认放宽；本地对比用 python -m benchmarks.micro
+THRESHOLD = float(os.getenv("MICRO_BENCH_THRESHOLD", "0.5"))
+
+
+def test_find_regressions_flags_throughput_and_allocations():
+    baseline = {"case": {"relative": 1.0, "alloc_peak_kib": 10.0}}
+    assert find_regressions([MicroResult("case", 100.0, 0.9, 12.0)], baseline, 0.25) == []
+    problems = find_regressions([MicroResult("case", 100.0, 0.5, 40.0)], baseline, 0.25)
+    assert len(problems) == 2
+    assert find_regressions([MicroResult("new-case", 1.0, 0.01, 999.0)], baseline, 0.25) == []
+
+
+def test_baseline_covers_every_case():
+    names = {result.name for result in run_micro(min_time=0.01, repeat=1)}
+    assert names <= set(load_baseline())
+
+
+def test_no_regression_against_baseline():
+    results = run_micro(min_time=0.2, repeat=5)
+    assert find_regressions(results, load_baseline(), THRESHOLD) == []
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from benchmarks.mock_llm_server import MockLLMConfig, MockLLMServer
+from benchmarks.pipeline import BenchResult, run_benchmarks
+
+pytestmark = pytest.mark.benchmark
+
+
+def test_mock_server_injects_429():
+    with MockLLMServer(MockLLMConfig(latency_ms=1, jitter_ms=0, rate_429=1.0)) as server:
+        resp = httpx.post(f"{server.base_url}/chat/completions", json={"messages": []})
+        assert resp.status_code == 429
+        assert server.stats.injected_429 == 1
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert BenchResult._percentile(values, 50) == 50.0
+    assert BenchResult._percentile(values, 99) == 99.0
+    assert BenchResult._percentile([], 95) == 0.0
+
+
+@pytest.mark.parametrize("target", ["generate", "process", "crawl"])
+def test_pipeline_benchmark_smoke(target):
+    config = MockLLMConfig(latency_ms=5, jitter_ms=2)
+    (result,) = run_benchmarks([target], [2], 4, config)
+    report = result.as_dict()
+    assert report["errors"] == 0
+    assert report["articles"] == 4
+    assert report["articles_per_sec"] > 0
+    # 每篇文章 5 个子任务（ruby 走 hybrid 模式时多一次修正调用）
+    assert report["server_requests"] >= 4 * 5
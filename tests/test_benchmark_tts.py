@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.tts import StubConfig, build_workload, compare_variants, run_tts_benchmarks
+
+pytestmark = pytest.mark.benchmark
+
+
+def test_workload_is_deterministic_and_repeats_texts():
+    workload = build_workload(40, hit_ratio=0.5)
+    assert workload == build_workload(40, hit_ratio=0.5)
+    assert len(set(workload)) < len(workload)
+    assert len(set(build_workload(10, hit_ratio=0.0))) == 10
+
+
+def test_tts_benchmark_stub_smoke():
+    results = run_tts_benchmarks(
+        model="stub",
+        targets=["service", "api"],
+        concurrency_levels=[1, 3],
+        requests=9,
+        hit_ratio=0.3,
+        stub=StubConfig(compute_ms=5, per_char_ms=0),
+    )
+    assert len(results) == 4
+    for result in results:
+        report = result.as_dict()
+        assert report["errors"] == 0 and report["rejected"] == 0
+        assert report["req_per_sec"] > 0
+        # 重复文本命中缓存或被 singleflight 合并，推理次数少于请求数
+        assert 0 < report["inferences"] < report["requests"]
+    concurrent_service = next(r for r in results if r.target == "service" and r.concurrency == 3)
+    assert concurrent_service.as_dict()["lock_wait_max_ms"] > 0
+    # stub 模式只有一个 variant，没有 int8 / fp32 可比
+    assert compare_variants(results) == []
@@ -1,4 +1,4 @@
-from app.services.furigana_filter import apply_furigana_filter, should_show_furigana
+from app.services.furigana_filter import apply_furigana_filter, estimate_text_level, should_show_furigana
 
 
 def test_should_show_furigana_hides_common_kanji_for_low_levels():
@@ -17,3 +17,12 @@ def test_apply_furigana_filter_keeps_common_and_removes_advanced_ruby():
     assert "<rt>かんそう</rt>" in level_one
     assert "<rt>にほん</rt>" in level_four
     assert "<rt>かんそう</rt>" in level_four
+
+
+def test_estimate_text_level_uses_kanji_coverage():
+    assert estimate_text_level("きょうはいいてんきです") == 1
+    assert estimate_text_level("今日は天気です。先生と学校へ行きます。") == 1
+    assert estimate_text_level("来週、病院へ薬を買いに行きます。") == 2
+    # 常用表覆盖不到的与 kanji_level 一致，记为"超出 N3"
+    assert estimate_text_level("感想を調べる") == 3
+    assert estimate_text_level("経済の影響で物価が上昇した") == 4
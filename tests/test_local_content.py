@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from app.services import local_content
+from app.services import services as service_module
+
+
+def test_title_from_translation_uses_first_sentence():
+    assert local_content.title_from_translation("大阪世博会今天正式开幕。很多人前往参观。") == "大阪世博会今天正式开幕"
+    # 过长时取第一个分句
+    assert local_content.title_from_translation("政府决定提高最低工资标准，从明年四月开始实施新的制度。") == "政府决定提高最低工资标准"
+    assert local_content.title_from_translation("翻译失败，请检查AI配置") is None
+    assert local_content.title_from_translation("你好。") is None
+
+
+def test_title_from_nouns_and_emoji_keywords():
+    text = "台風が沖縄に近づいています。台風の影響で飛行機が欠航しました。"
+    assert local_content.title_from_nouns(text).startswith("台風")
+    assert local_content.title_from_nouns("ひらがなだけ") is None
+    assert local_content.pick_emoji(text) == "🌀"
+    assert local_content.pick_emoji("きょうはいい日です") is None
+
+
+def test_generate_all_content_local_mode_skips_title_and_emoji_calls(monkeypatch):
+    monkeypatch.setattr(service_module.settings, "AI_TITLE_EMOJI_MODE", "local")
+    monkeypatch.setattr(service_module.settings, "AI_TITLE_EMOJI_LLM_FALLBACK", False)
+    calls = []
+
+    def fake(name, value):
+        def generator(text, model, client):
+            calls.append(name)
+            return value
+
+        return generator
+
+    monkeypatch.setattr(service_module, "generate_ruby", fake("ruby", "ruby"))
+    monkeypatch.setattr(service_module, "extract_vocabulary", fake("vocab", []))
+    monkeypatch.setattr(service_module, "translate_to_chinese", fake("translation", "京都红叶迎来最佳观赏期。游客很多。"))
+    monkeypatch.setattr(service_module, "generate_title", fake("title", "不应调用"))
+    monkeypatch.setattr(service_module, "generate_emoji", fake("emoji", "❌"))
+
+    _ruby, _vocab, translation, title, emoji = service_module.generate_all_content(
+        "京都の紅葉が見頃を迎えました。", "gpt-test", object()
+    )
+
+    assert sorted(calls) == ["ruby", "translation", "vocab"]
+    assert title == "京都红叶迎来最佳观赏期"
+    assert emoji == "🍁"
+
+
+def test_local_mode_falls_back_to_llm_when_enabled(monkeypatch):
+    monkeypatch.setattr(service_module.settings, "AI_TITLE_EMOJI_LLM_FALLBACK", True)
+    monkeypatch.setattr(service_module, "generate_title", lambda text, model, client: "模型标题")
+    monkeypatch.setattr(service_module, "generate_emoji", lambda text, model, client: "🎈")
+
+    title, emoji = service_module._local_title_and_emoji("ひらがなだけ", "翻译失败，请检查AI配置", "gpt-test", object())
+
+    assert (title, emoji) == ("模型标题", "🎈")
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.model.models import VocabGloss
+from app.services import gloss_cache, local_vocab
+from app.services import services as service_module
+
+TEXT = "経済の影響で物価が上がりました。病院も経済の問題に困っています。学生も大変です。"
+
+
+class RecordingCompletions:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = []
+
+    def create(self, model, messages, **kwargs):
+        self.calls.append(messages)
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture(autouse=True)
+def _no_gloss_cache(monkeypatch):
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_CACHE_ENABLED", False)
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_DATASET", "")
+
+
+def _client(content: str):
+    completions = RecordingCompletions(content)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+
+def test_select_vocabulary_filters_by_level_and_known_words(monkeypatch):
+    monkeypatch.setattr(local_vocab, "get_tagger", lambda: None)
+
+    words = [candidate.word for candidate in local_vocab.select_vocabulary(TEXT, level=1)]
+    # 表外汉字的词排在前面，同级按出现次数；学生只含 N5 汉字，不算生词
+    assert words[0] == "経済"
+    assert "病院" in words and "学生" not in words
+    # N4 用户已经认识病院里的汉字
+    assert "病院" not in [candidate.word for candidate in local_vocab.select_vocabulary(TEXT, level=2)]
+
+    known = local_vocab.select_vocabulary(TEXT, level=1, known_words={"経済"})
+    assert "経済" not in [candidate.word for candidate in known]
+    assert local_vocab.select_vocabulary(TEXT, level=1, limit=2)[1].romaji == "eikyou"
+
+
+def test_local_extract_vocabulary_fills_meanings_in_one_call(monkeypatch):
+    monkeypatch.setattr(local_vocab, "get_tagger", lambda: None)
+    monkeypatch.setattr(service_module.settings, "AI_VOCAB_MODE", "local")
+    client, completions = _client('```json\n[{"word": "経済", "meaning": "经济"}, {"word": "影響", "meaning": "影响"}]\n```')
+
+    vocab = service_module.extract_vocabulary(TEXT, "gpt-test", client, level=1, known_words={"物価"})
+
+    assert len(completions.calls) == 1
+    assert vocab[0] == {"word": "経済", "meaning": "经济", "pronunciation": "keizai"}
+    assert vocab[1]["meaning"] == "影响"
+    # 模型漏掉的词用占位释义，读音仍然本地生成
+    missing = [item for item in vocab if item["word"] == "病院"][0]
+    assert missing == {"word": "病院", "meaning": "释义待补充", "pronunciation": "byouin"}
+    assert "物価" not in [item["word"] for item in vocab]
+
+
+def test_local_extract_vocabulary_skips_model_when_nothing_selected(monkeypatch):
+    monkeypatch.setattr(service_module.settings, "AI_VOCAB_MODE", "local")
+    client, completions = _client("[]")
+
+    assert service_module.extract_vocabulary("きょうはいい天気です。", "gpt-test", client, level=1) == []
+    assert completions.calls == []
+
+
+def test_gloss_table_and_dataset_are_consulted_before_prompting(monkeypatch, db_session, tmp_path):
+    monkeypatch.setattr(local_vocab, "get_tagger", lambda: None)
+    monkeypatch.setattr(service_module.settings, "AI_VOCAB_MODE", "local")
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_CACHE_ENABLED", True)
+    dataset = tmp_path / "glosses.tsv"
+    dataset.write_text("# 词\t读音\t释义\n物価\tブッカ\t物价\n", encoding="utf-8")
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_DATASET", str(dataset))
+    text = "経済の影響で物価が上がりました。"
+
+    client, completions = _client('[{"word": "経済", "meaning": "经济"}, {"word": "影響", "meaning": "影响"}]')
+    first = service_module.extract_vocabulary(text, "gpt-test", client, level=1)
+    # 词典里有的物価不进提示词
+    assert "物価" not in completions.calls[0][1]["content"]
+    assert {row.word: row.meaning for row in db_session.query(VocabGloss).all()} == {"経済": "经济", "影響": "影响"}
+
+    # 另一个用户读到同样的词：全部命中，不再调用模型
+    client, completions = _client("[]")
+    second = service_module.extract_vocabulary(text, "gpt-test", client, level=1)
+    assert completions.calls == []
+    assert second == first
+    assert gloss_cache.lookup([("経済", "けいざい"), ("経済", "きょうざい")]) == {("経済", "けいざい"): ("经济", "gloss")}
+
+
+def test_shared_glosses_are_context_free_and_expire(monkeypatch, db_session):
+    from datetime import timedelta
+
+    from app.utils.time import utc_now
+
+    monkeypatch.setattr(local_vocab, "get_tagger", lambda: None)
+    monkeypatch.setattr(service_module.settings, "AI_VOCAB_MODE", "local")
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_CACHE_ENABLED", True)
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_TTL_DAYS", 30)
+    stale = utc_now() - timedelta(days=31)
+    db_session.add(VocabGloss(word="経済", reading="けいざい", meaning="旧释义", source="llm", created_at=stale, updated_at=stale))
+    db_session.commit()
+    text = "経済の影響で物価が上がりました。"
+
+    client, completions = _client('[{"word": "経済", "meaning": "经济"}, {"word": "影響", "meaning": "影响"}, {"word": "物価", "meaning": "物价"}]')
+    vocab = service_module.extract_vocabulary(text, "gpt-test", client, level=1)
+
+    prompt = completions.calls[0][1]["content"]
+    # 要写进共享表的释义按词典义问，不按本文语境；过期的経済重新问
+    assert "词典释义" in prompt and "文中语境" not in prompt
+    assert "経済" in prompt
+    assert vocab[0]["meaning"] == "经济"
+    db_session.expire_all()
+    assert db_session.query(VocabGloss).filter_by(word="経済").one().meaning == "经济"
+    assert gloss_cache.lookup([("経済", "けいざい")]) == {("経済", "けいざい"): ("经济", "gloss")}
+
+
+def test_default_llm_mode_reads_and_fills_gloss_table(monkeypatch, db_session):
+    from app.core.config import Settings
+
+    monkeypatch.setattr(local_vocab, "get_tagger", lambda: None)
+    monkeypatch.setattr(service_module.settings, "AI_VOCAB_MODE", Settings.AI_VOCAB_MODE)
+    monkeypatch.setattr(service_module.settings, "VOCAB_GLOSS_CACHE_ENABLED", True)
+    assert service_module.settings.AI_VOCAB_MODE == "llm"
+    gloss_cache.store({("経済", "けいざい"): "经济"})
+
+    client, completions = _client(
+        '[{"word": "経済", "meaning": "经济状况", "pronunciation": "keizai"},'
+        ' {"word": "影響", "meaning": "影响", "pronunciation": "eikyou"}]'
+    )
+    vocab = service_module.extract_vocabulary(TEXT, "gpt-test", client, level=1)
+
+    assert "词典释义" in completions.calls[0][1]["content"]
+    # 表里有的用表里的释义，没有的写回表里
+    assert [(item["word"], item["meaning"]) for item in vocab] == [("経済", "经济"), ("影響", "影响")]
+    assert gloss_cache.lookup([("影響", "えいきょう")]) == {("影響", "えいきょう"): ("影响", "gloss")}
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import sys
+
+from app.core import logging_config
+from app.core.logging_config import JsonFormatter, _ContextFilter, _DebugSampler, _LightQueueHandler, request_id_var, task_id_var
+
+
+def _record(level: int = logging.INFO, msg: str = "hello %s", args=("world",)) -> logging.LogRecord:
+    return logging.LogRecord("yomu", level, __file__, 1, msg, args, None)
+
+
+def test_level_from_name_accepts_legacy_strings():
+    assert logging_config.level_from_name("warn") == logging.WARNING
+    assert logging_config.level_from_name("ERROR") == logging.ERROR
+    assert logging_config.level_from_name(None) == logging.INFO
+    assert logging_config.level_from_name("unknown") == logging.INFO
+
+
+def test_queue_handler_captures_context_ids_in_caller_thread():
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LightQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    rid_token = request_id_var.set("req-1")
+    task_token = task_id_var.set("42")
+    try:
+        handler.handle(_record())
+    finally:
+        request_id_var.reset(rid_token)
+        task_id_var.reset(task_token)
+
+    queued = log_queue.get_nowait()
+    payload = json.loads(JsonFormatter().format(queued))
+    assert payload["msg"] == "hello world"
+    assert payload["request_id"] == "req-1"
+    assert payload["task_id"] == "42"
+
+
+def test_queue_handler_keeps_exception_text_out_of_message():
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LightQueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("yomu", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+    handler.handle(record)
+
+    payload = json.loads(JsonFormatter().format(log_queue.get_nowait()))
+    assert payload["msg"] == "failed"
+    assert "ValueError: boom" in payload["exc"]
+
+
+def test_debug_sampler_only_drops_debug_records():
+    sampler = _DebugSampler(0.0)
+    assert sampler.filter(_record(logging.DEBUG)) is False
+    assert sampler.filter(_record(logging.INFO)) is True
+    assert _DebugSampler(1.0).filter(_record(logging.DEBUG)) is True
+
+
+def test_request_id_header_is_echoed(client):
+    resp = client.get("/health", headers={"X-Request-ID": "abc123"})
+    assert resp.headers["X-Request-ID"] == "abc123"
+
+    generated = client.get("/health")
+    assert generated.headers["X-Request-ID"]
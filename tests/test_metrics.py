@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import metrics
+from app.services import ai_client_async
+from app.services.ai_client_async import AIClientError, OpenAICompatClient
+
+pytestmark = pytest.mark.skipif(not metrics.is_enabled(), reason="prometheus_client 未安装")
+
+
+def _sample(name: str, labels: dict[str, str]) -> float:
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_endpoint_exposes_http_route_template(client):
+    before = _sample(
+        "yomu_http_request_seconds_count",
+        {"method": "GET", "route": "/health", "status": "200"},
+    )
+
+    assert client.get("/health").status_code == 200
+    resp = client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "yomu_http_request_seconds" in resp.text
+    after = _sample(
+        "yomu_http_request_seconds_count",
+        {"method": "GET", "route": "/health", "status": "200"},
+    )
+    assert after == before + 1
+
+
+def test_track_duration_records_error_outcome():
+    labels = {"subtask": "emoji", "outcome": "error"}
+    before = _sample("yomu_ai_subtask_seconds_count", labels)
+
+    with pytest.raises(RuntimeError):
+        with metrics.track_duration(metrics.AI_SUBTASK_SECONDS, subtask="emoji"):
+            raise RuntimeError("boom")
+
+    assert _sample("yomu_ai_subtask_seconds_count", labels) == before + 1
+
+
+def test_ai_chat_records_http_status_label(monkeypatch):
+    class FailingAsyncClient:
+        def __init__(self, timeout=None):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+        async def post(self, url, headers=None, json=None, params=None):
+            request = httpx.Request("POST", url)
+            return httpx.Response(401, request=request, text="unauthorized")
+
+    monkeypatch.setattr(ai_client_async.httpx, "AsyncClient", FailingAsyncClient)
+    monkeypatch.setattr(ai_client_async.logger, "exception", lambda *args, **kwargs: None)
+    labels = {"provider": "openai", "status": "401"}
+    before = _sample("yomu_ai_chat_seconds_count", labels)
+
+    client = OpenAICompatClient({"api_url": "https://example.com/v1", "api_key": "sk-test", "model": "gpt-test"})
+    with pytest.raises(AIClientError):
+        asyncio.run(client.chat([{"role": "user", "content": "hello"}]))
+
+    assert _sample("yomu_ai_chat_seconds_count", labels) == before + 1
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import threading
+
+import pytest
+
+from app.core import tracing
+from app.core.config import settings
+
+
+@pytest.fixture()
+def trace_file(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "TRACING_FILE_PATH", str(path))
+    tracing.configure_tracing("file")
+    yield path
+    tracing.configure_tracing("none")
+
+
+def _read_spans(path) -> dict[str, dict]:
+    tracing.configure_tracing("none")  # 关掉 exporter 会刷完队列
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    return {span["name"]: span for span in spans}
+
+
+def test_noop_span_by_default():
+    tracing.configure_tracing("none")
+    with tracing.span("noop", foo="bar") as current:
+        current.set_attribute("x", 1)
+    assert tracing.is_enabled() is False
+
+
+def test_file_exporter_links_children_across_threads(trace_file):
+    def worker():
+        with tracing.span("worker"):
+            pass
+
+    with tracing.span("root", user_id=1):
+        with tracing.span("child"):
+            pass
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+        thread.start()
+        thread.join()
+
+    spans = _read_spans(trace_file)
+    root = spans["root"]
+    assert root["parent_span_id"] is None
+    assert root["attributes"] == {"user_id": 1}
+    assert spans["child"]["parent_span_id"] == root["span_id"]
+    assert spans["child"]["trace_id"] == root["trace_id"]
+    assert spans["worker"]["parent_span_id"] == root["span_id"]
+
+
+def test_span_records_error_status(trace_file):
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+
+    failing = _read_spans(trace_file)["failing"]
+    assert failing["status"] == "ERROR"
+    assert "boom" in failing["error"]
+
+
+def test_generate_all_content_emits_subtask_spans(trace_file, monkeypatch):
+    from app.services import services as service_module
+
+    for name in ("generate_ruby", "extract_vocabulary", "translate_to_chinese", "generate_title", "generate_emoji"):
+        monkeypatch.setattr(service_module, name, lambda text, model, client, _name=name: _name)
+
+    with tracing.span("request"):
+        service_module.generate_all_content("今日は天気です", "gpt-test", object())
+
+    spans = _read_spans(trace_file)
+    parent = spans["ai.generate_all_content"]
+    assert parent["parent_span_id"] == spans["request"]["span_id"]
+    for subtask in ("ruby", "vocab", "translation", "title", "emoji"):
+        assert spans[f"ai.subtask.{subtask}"]["parent_span_id"] == parent["span_id"]
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import os
+import time
+
+from app.services.tts_cache import TTSCacheManager
+
+
+def _write(directory, name: str, size: int) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb") as fh:
+        fh.write(b"\0" * size)
+    return path
+
+
+def test_record_evicts_least_recently_used_down_to_watermark(tmp_path):
+    cache = TTSCacheManager(str(tmp_path), max_bytes=1000, min_age_seconds=0)
+    oldest = _write(tmp_path, "a.wav", 400)
+    cache.record(oldest)
+    newer = _write(tmp_path, "b.wav", 400)
+    cache.record(newer)
+    time.sleep(0.01)
+    # 读一次 a，让 b 变成最久未访问
+    assert cache.lookup(oldest)
+
+    cache.record(_write(tmp_path, "c.wav", 400))
+
+    assert os.path.exists(oldest)
+    assert not os.path.exists(newer)
+    assert cache.lookup(newer) is False
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 800
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_recently_accessed_entries_are_not_evicted(tmp_path):
+    cache = TTSCacheManager(str(tmp_path), max_bytes=100, min_age_seconds=60)
+    first = _write(tmp_path, "a.wav", 80)
+    cache.record(first)
+    cache.record(_write(tmp_path, "b.wav", 80))
+    assert os.path.exists(first)
+    assert cache.stats()["evictions"] == 0
+
+
+def test_reconcile_syncs_index_with_directory(tmp_path):
+    cache = TTSCacheManager(str(tmp_path), max_bytes=0)
+    gone = _write(tmp_path, "gone.wav", 10)
+    cache.record(gone)
+    os.remove(gone)
+    _write(tmp_path, "orphan.wav", 20)
+    stale_tmp = _write(tmp_path, ".x.wav.1234.tmp.wav", 5)
+    os.utime(stale_tmp, (time.time() - 7200, time.time() - 7200))
+
+    cache.reconcile()
+
+    assert cache.lookup(os.path.join(tmp_path, "orphan.wav"))
+    assert cache.lookup(gone) is False
+    assert not os.path.exists(stale_tmp)
+    assert cache.stats()["entries"] == 1
+
+
+def test_lookup_is_read_only_until_access_is_flushed(tmp_path):
+    cache = TTSCacheManager(str(tmp_path), max_bytes=0)
+    cache.flush_interval = 0  # 不起后台线程，手动写回
+    path = _write(tmp_path, "a.wav", 10)
+    cache.record(path)
+    conn = cache._connection()
+    before = conn.execute("SELECT last_access FROM entries").fetchone()[0]
+    time.sleep(0.01)
+
+    changes = conn.total_changes
+    assert cache.lookup(path)
+    assert conn.total_changes == changes
+
+    cache.flush_access()
+    assert conn.execute("SELECT last_access FROM entries").fetchone()[0] > before
+
+
+def test_record_keeps_a_running_total_instead_of_summing_the_index(tmp_path):
+    cache = TTSCacheManager(str(tmp_path), max_bytes=10_000, min_age_seconds=0)
+    cache.reconcile()
+    statements = []
+    cache._connection().set_trace_callback(statements.append)
+
+    first = _write(tmp_path, "a.wav", 100)
+    cache.record(first)
+    cache.record(_write(tmp_path, "b.wav", 200))
+    # 覆盖写同一个文件按差值计
+    cache.record(_write(tmp_path, "a.wav", 150))
+    cache.forget(first)
+
+    assert not any("SUM(" in statement for statement in statements)
+    assert cache._total == cache.total_bytes() == 200
@@ -14,6 +14,7 @@ from __future__ import annotations
 import os
 import tempfile
 import types
+import wave
 
 import pytest
 
@@ -46,9 +47,12 @@ def _install_mock_melotts(monkeypatch, calls):
 
         def tts_to_file(self, text, spk_id, path, speed):
             calls.append({"text": text, "spk_id": spk_id, "path": path, "speed": speed})
-            # 写一点内容到目标文件，模拟生成的 WAV
-            with open(path, "wb") as f:
-                f.write(b"RIFF" + b"\x00" * 36)
+            # 写一个最小的合法 WAV（每个字符 10 帧），句级拼接要能读回来
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(1000)
+                f.writeframes(b"\x01\x00" * 10 * len(text))
 
     fake_module = types.SimpleNamespace(api=types.SimpleNamespace(TTS=FakeTTSModel))
     monkeypatch.setattr(tts_module, "_MeloTTS", FakeTTSModel)
@@ -182,3 +186,430 @@ def test_api_tts_empty_text_422(monkeypatch, tts_cache_dir, db_session):
 
     # Pydantic min_length=1 直接拦在 router 之前
     assert resp.status_code == 422
+
+
+def test_pool_rejects_when_queue_full(monkeypatch, tts_cache_dir):
+    """槽位 + 队列都占满后，新请求立即 TTSBusyError，而不是继续排队。"""
+    import threading
+
+    import app.services.tts as tts_module
+    from app.services.tts_pool import TTSBusyError, TTSWorkerPool
+
+    release = threading.Event()
+    calls = []
+    FakeModel = _install_mock_melotts(monkeypatch, calls)
+    original = FakeModel.tts_to_file
+
+    def blocking_tts(self, text, spk_id, path, speed):
+        release.wait(5)
+        original(self, text, spk_id, path, speed)
+
+    monkeypatch.setattr(FakeModel, "tts_to_file", blocking_tts)
+    tts_module.MeloTTSService._instance = None
+
+    pool = TTSWorkerPool(workers=0, queue_size=1).start()
+    try:
+        running = pool.submit("いち", 1.0, "JP")
+        queued = pool.submit("に", 1.0, "JP")
+        with pytest.raises(TTSBusyError) as excinfo:
+            pool.submit("さん", 1.0, "JP")
+        assert excinfo.value.retry_after >= 1
+
+        release.set()
+        assert os.path.exists(running.result(timeout=5))
+        assert os.path.exists(queued.result(timeout=5))
+        assert pool.in_flight == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_api_tts_returns_429_with_retry_after(monkeypatch, tts_cache_dir, client):
+    import app.services.tts_pool as pool_module
+
+    class BusyPool:
+        async def synthesize(self, text, speed, language, align=False):
+            raise pool_module.TTSBusyError(7)
+
+    import app.routers.tts as tts_router
+
+    monkeypatch.setattr(tts_router, "get_tts_pool", lambda: BusyPool())
+
+    resp = client.post("/api/tts", json={"text": "こんにちは"})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "7"
+    assert resp.json()["error"] == "tts_busy"
+
+
+def test_split_sentences_keeps_punctuation():
+    from app.services.tts import split_sentences
+
+    assert split_sentences("今日は晴れ。明日は雨！\n本当？") == ["今日は晴れ。", "明日は雨！", "本当？"]
+    assert split_sentences("こんにちは") == ["こんにちは"]
+    assert split_sentences("終わり。。」") == ["終わり。。」"]
+
+
+def test_multi_sentence_text_is_cached_per_sentence(monkeypatch, tts_cache_dir):
+    import app.services.tts as tts_module
+    calls = []
+    _install_mock_melotts(monkeypatch, calls)
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    path = service.synthesize_to_file("今日は晴れ。明日は雨。", 1.0, "JP")
+    assert [call["text"] for call in calls] == ["今日は晴れ。", "明日は雨。"]
+    with wave.open(path, "rb") as reader:
+        # 两句各 6 / 5 个字符 × 10 帧，中间 0.05s × 1000Hz = 50 帧静音
+        assert reader.getnframes() == 60 + 50 + 50
+
+    # 另一篇文章只改了第二句：第一句直接复用句级缓存
+    service.synthesize_to_file("今日は晴れ。週末も晴れ。", 1.0, "JP")
+    assert [call["text"] for call in calls[2:]] == ["週末も晴れ。"]
+
+
+def test_api_tts_stream_emits_sentences_as_one_wav(monkeypatch, tts_cache_dir, client):
+    import struct
+
+    import app.services.tts as tts_module
+    calls = []
+    _install_mock_melotts(monkeypatch, calls)
+    tts_module.MeloTTSService._instance = None
+
+    resp = client.post("/api/tts/stream", json={"text": "今日は晴れ。明日は雨。", "speed": 1.0})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("audio/wav")
+    assert resp.headers["X-TTS-Sentences"] == "2"
+    body = resp.content
+    assert body[:4] == b"RIFF" and body[36:40] == b"data"
+    channels, rate = struct.unpack("<HI", body[22:28])
+    assert (channels, rate) == (1, 1000)
+    # 与整段合成一致：60 + 50 帧语音，中间 50 帧静音，每帧 2 字节
+    assert len(body) - 44 == (60 + 50 + 50) * 2
+    assert [call["text"] for call in calls] == ["今日は晴れ。", "明日は雨。"]
+
+
+def test_concurrent_identical_requests_share_one_synthesis(monkeypatch, tts_cache_dir):
+    import threading
+    import time
+
+    import app.services.tts as tts_module
+    calls = []
+    FakeModel = _install_mock_melotts(monkeypatch, calls)
+    original = FakeModel.tts_to_file
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_tts(self, text, spk_id, path, speed):
+        started.set()
+        release.wait(5)
+        original(self, text, spk_id, path, speed)
+
+    monkeypatch.setattr(FakeModel, "tts_to_file", slow_tts)
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(service.synthesize_to_file("同じ文です。", 1.0, "JP")))
+        for _ in range(3)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # 给后两个请求一点时间越过缓存检查、挂到进行中的合成上再放行
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1 and len(results) == 3
+
+
+def test_synthesis_writes_through_temp_file(monkeypatch, tts_cache_dir):
+    import app.services.tts as tts_module
+    calls = []
+    _install_mock_melotts(monkeypatch, calls)
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    path = service.synthesize_to_file("こんにちは", 1.0, "JP")
+    # 模型写的是临时文件，最终路径由 os.replace 原子落位，目录里不留临时文件
+    assert calls[0]["path"] != path
+    assert calls[0]["path"].endswith(".tmp.wav")
+    assert [name for name in os.listdir(tts_cache_dir) if not name.startswith(".index")] == [os.path.basename(path)]
+
+
+def _install_fake_encoder(monkeypatch, encoded):
+    """假编码器：把 WAV 字节原样加个前缀写出，记录调用。"""
+    import app.services.tts as tts_module
+    import app.services.tts_encoding as encoding_module
+
+    def encoder_for(fmt):
+        if fmt == "wav":
+            return None
+
+        def encode(wav_path, output_path):
+            encoded.append(fmt)
+            with open(wav_path, "rb") as src, open(output_path, "wb") as dst:
+                dst.write(fmt.encode() + src.read()[:16])
+
+        return encode
+
+    monkeypatch.setattr(encoding_module, "encoder_for", encoder_for)
+    monkeypatch.setattr(tts_module, "encoder_for", encoder_for)
+
+
+def test_negotiate_format_prefers_field_then_accept(monkeypatch):
+    from app.services import tts_encoding
+
+    _install_fake_encoder(monkeypatch, [])
+    assert tts_encoding.negotiate_format("flac", "audio/mpeg") == "flac"
+    assert tts_encoding.negotiate_format(None, "audio/mpeg;q=0.5, audio/ogg") == "opus"
+    assert tts_encoding.negotiate_format(None, "*/*") == "wav"
+    assert tts_encoding.negotiate_format(None, None) == "wav"
+    with pytest.raises(tts_encoding.UnsupportedFormatError):
+        tts_encoding.negotiate_format("aac", None)
+
+    # 没有编码器时 Accept 里的压缩格式被跳过，显式 format 则报错
+    monkeypatch.setattr(tts_encoding, "encoder_for", lambda fmt: None)
+    assert tts_encoding.negotiate_format(None, "audio/ogg, audio/wav;q=0.1") == "wav"
+    with pytest.raises(tts_encoding.UnsupportedFormatError):
+        tts_encoding.negotiate_format("opus", None)
+
+
+def test_api_tts_encodes_and_caches_variant(monkeypatch, tts_cache_dir, client):
+    import app.services.tts as tts_module
+    calls, encoded = [], []
+    _install_mock_melotts(monkeypatch, calls)
+    _install_fake_encoder(monkeypatch, encoded)
+    tts_module.MeloTTSService._instance = None
+
+    resp = client.post("/api/tts", json={"text": "こんにちは"}, headers={"Accept": "audio/ogg"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("audio/ogg")
+    assert resp.headers["Vary"] == "Accept"
+    assert resp.content.startswith(b"opusRIFF")
+
+    # 第二次：WAV 与 Opus 都命中缓存，不再推理也不再转码
+    resp = client.post("/api/tts", json={"text": "こんにちは", "format": "opus"})
+    assert resp.status_code == 200
+    assert len(calls) == 1 and encoded == ["opus"]
+    names = sorted(name for name in os.listdir(tts_cache_dir) if not name.startswith(".index"))
+    assert [os.path.splitext(name)[1] for name in names] == [".opus", ".wav"]
+
+    resp = client.post("/api/tts", json={"text": "こんにちは"})
+    assert resp.headers["content-type"].startswith("audio/wav")
+
+
+def test_api_tts_format_without_encoder_returns_406(monkeypatch, tts_cache_dir, client):
+    import app.services.tts_encoding as encoding_module
+
+    monkeypatch.setattr(encoding_module, "encoder_for", lambda fmt: None)
+    resp = client.post("/api/tts", json={"text": "こんにちは", "format": "mp3"})
+    assert resp.status_code == 406
+    assert resp.json()["error"] == "tts_format_unavailable"
+
+
+def test_build_timings_anchors_sentences_and_splits_by_mora():
+    from app.services.tts_timing import build_timings, mora_count
+
+    assert mora_count("きょう") == 2
+    assert mora_count("がっこう") == 4
+    text = "今日は晴れ。明日は雨。"
+    # 两句各 600 / 500 帧，第一句前 100 帧静音；句间 50 帧
+    timings = build_timings(
+        text,
+        ["今日は晴れ。", "明日は雨。"],
+        [(600, 100, 600), (500, 0, 500)],
+        total_frames=1150,
+        frame_rate=1000,
+        gap_frames=50,
+    )
+    first, second = timings["sentences"]
+    assert (first["start_ms"], first["end_ms"]) == (0, 600)
+    assert (second["start_ms"], second["end_ms"], second["char_start"]) == (650, 1150, 6)
+    tokens = timings["tokens"]
+    assert tokens[0]["start_ms"] == 100 and tokens[0]["char_start"] == 0
+    second_tokens = [token for token in tokens if token["sentence"] == 1]
+    assert second_tokens[0]["start_ms"] == 650
+    assert second_tokens[-1]["end_ms"] <= 1150
+    assert "".join(token["text"] for token in tokens) == "今日は晴れ明日は雨"
+
+
+def test_build_timings_prefers_alignment_over_mora():
+    from app.services.tts_timing import build_timings
+
+    text = "今日は晴れ。明日は雨。"
+    # 第一句有对齐：今日 占 0-300 帧，は 300-350，晴れ 350-550（pykakasi 把 今日は 切成一个词）；第二句没有，按拍数
+    alignment = [[0, 2, 0, 300], [2, 3, 300, 350], [3, 5, 350, 550], [5, 6, 550, 600]]
+    timings = build_timings(
+        text,
+        ["今日は晴れ。", "明日は雨。"],
+        [(600, 100, 600), (500, 0, 500)],
+        total_frames=1150,
+        frame_rate=1000,
+        gap_frames=50,
+        sentence_alignments=[alignment, None],
+    )
+    first = [(token["text"], token["start_ms"], token["end_ms"]) for token in timings["tokens"] if token["sentence"] == 0]
+    assert first == [("今日は", 0, 350), ("晴れ", 350, 550)]
+    second = [token for token in timings["tokens"] if token["sentence"] == 1]
+    assert second[0]["start_ms"] == 650
+
+    # 对齐缺字时整句退回按拍数（句首 100 帧静音）
+    partial = build_timings(
+        text, ["今日は晴れ。"], [(600, 100, 600)], total_frames=600, frame_rate=1000, gap_frames=0,
+        sentence_alignments=[[[0, 2, 0, 300]]],
+    )
+    assert partial["tokens"][0]["start_ms"] == 100
+
+
+def test_single_sentence_uses_tts_to_file_without_timings_or_batching(monkeypatch, tts_cache_dir):
+    import app.services.tts as tts_module
+    from app.core import config as cfg
+
+    calls, batched_calls = [], []
+    _install_mock_melotts(monkeypatch, calls)
+    monkeypatch.setattr(cfg.settings, "TTS_BATCH_MAX_SIZE", 1)
+    monkeypatch.setattr(tts_module, "melo_batched_tts", lambda *args: batched_calls.append(args))
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    service.synthesize_to_file("今日は晴れ。", 1.0, "JP")
+    # 不要时间轴、也没开微批：走 MeloTTS 的公开接口，不碰内部 infer
+    assert [call["text"] for call in calls] == ["今日は晴れ。"]
+    assert batched_calls == []
+
+
+def test_timings_use_alignment_saved_at_synthesis(monkeypatch, tts_cache_dir):
+    import json
+
+    import app.services.tts as tts_module
+
+    calls = []
+    FakeModel = _install_mock_melotts(monkeypatch, calls)
+
+    def batched(model, sentences, spk_id, speed, paths):
+        for sentence, path in zip(sentences, paths):
+            FakeModel.tts_to_file(model, sentence, spk_id, path, speed)
+        # 每个字 10 帧，但让 今日は 占满前 45 帧
+        return [[[0, 2, 0, 40], [2, 3, 40, 45], [3, 5, 45, 55], [5, 6, 55, 60]]]
+
+    monkeypatch.setattr(tts_module, "melo_batched_tts", batched)
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    service.synthesize_to_file("今日は晴れ。", 1.0, "JP", align=True)
+    key = service.ensure_timings("今日は晴れ。", 1.0, "JP")
+    with open(service.timings_path(key), encoding="utf-8") as fh:
+        tokens = json.load(fh)["tokens"]
+    assert (tokens[0]["text"], tokens[0]["start_ms"], tokens[0]["end_ms"]) == ("今日は", 0, 45)
+
+
+def test_api_tts_returns_timings_link(monkeypatch, tts_cache_dir, client):
+    import app.services.tts as tts_module
+    calls = []
+    _install_mock_melotts(monkeypatch, calls)
+    tts_module.MeloTTSService._instance = None
+
+    resp = client.post("/api/tts", json={"text": "今日は晴れ。明日は雨。", "timings": True})
+    assert resp.status_code == 200
+    url = resp.headers["X-TTS-Timings"]
+    timings = client.get(url).json()
+    # 句级 WAV 是 60 / 50 帧（1000Hz），句间 50 帧静音
+    assert timings["duration_ms"] == 160
+    assert [(s["start_ms"], s["end_ms"]) for s in timings["sentences"]] == [(0, 60), (110, 160)]
+    assert timings["tokens"][0]["char_start"] == 0
+
+    assert client.get("/api/tts/timings/" + "0" * 40).status_code == 404
+    assert client.get("/api/tts/timings/../secret").status_code == 404
+
+
+def test_reading_sentences_matches_client_split():
+    from app.services.tts_presynth import reading_sentences
+
+    text = "来源: https://example.com\n\n今日は晴れ。「本当？」と聞いた。\n明日は雨"
+    assert reading_sentences(text) == ["今日は晴れ。", "「本当？", "」と聞いた。", "明日は雨"]
+    assert reading_sentences("  ") == []
+
+
+def test_presynthesis_waits_for_interactive_requests(monkeypatch, tts_cache_dir):
+    import threading
+
+    import app.services.tts as tts_module
+    from app.services.tts_pool import TTSWorkerPool
+    from app.services.tts_presynth import TTSPresynthesizer
+
+    calls = []
+    FakeModel = _install_mock_melotts(monkeypatch, calls)
+    original = FakeModel.tts_to_file
+    release = threading.Event()
+
+    def tts(self, text, spk_id, path, speed):
+        if text == "対話":
+            release.wait(5)
+        original(self, text, spk_id, path, speed)
+
+    monkeypatch.setattr(FakeModel, "tts_to_file", tts)
+    # 预合成跟阅读页的朗读语速走，不受默认语速影响
+    monkeypatch.setattr(tts_module.settings, "TTS_DEFAULT_SPEED", 1.3)
+    tts_module.MeloTTSService._instance = None
+    pool = TTSWorkerPool(workers=0, queue_size=4).start()
+    presynth = TTSPresynthesizer(pool=pool)
+    try:
+        interactive = pool.submit("対話", 1.0, "JP")
+        assert presynth.enqueue("一文目。二文目。", article_id=1) == 2
+        # 交互请求没完成之前，预合成一句都不跑
+        assert not presynth.join(timeout=0.3)
+        assert [call["text"] for call in calls] == []
+
+        release.set()
+        interactive.result(timeout=5)
+        assert presynth.join(timeout=5)
+        assert [call["text"] for call in calls] == ["対話", "一文目。", "二文目。"]
+        service = tts_module.get_tts_service()
+        assert service.get_cached_path("二文目。", 1.0, "JP")
+
+        # 已缓存的句子不再合成
+        presynth.enqueue("一文目。", article_id=2)
+        assert presynth.join(timeout=5)
+        assert len(calls) == 3
+    finally:
+        release.set()
+        presynth.stop()
+        pool.shutdown()
+
+
+def test_multi_sentence_text_is_micro_batched(monkeypatch, tts_cache_dir):
+    import app.services.tts as tts_module
+    from app.core import config as cfg
+
+    calls, batches = [], []
+    FakeModel = _install_mock_melotts(monkeypatch, calls)
+    monkeypatch.setattr(cfg.settings, "TTS_BATCH_MAX_SIZE", 8)
+    monkeypatch.setattr(cfg.settings, "TTS_BATCH_MAX_WAIT_MS", 50)
+
+    def batched(model, sentences, spk_id, speed, paths):
+        batches.append(list(sentences))
+        for sentence, path in zip(sentences, paths):
+            FakeModel.tts_to_file(model, sentence, spk_id, path, speed)
+
+    monkeypatch.setattr(tts_module, "melo_batched_tts", batched)
+    tts_module.MeloTTSService._instance = None
+    service = tts_module.MeloTTSService()
+
+    path = service.synthesize_to_file("一つ目。二つ目。三つ目。", 1.0, "JP")
+    assert batches == [["一つ目。", "二つ目。", "三つ目。"]]
+    with wave.open(path, "rb") as reader:
+        assert reader.getnframes() == 40 * 3 + 50 * 2
+
+    # 批量前向不可用时整批退回逐句推理
+    def broken(*args, **kwargs):
+        raise RuntimeError("no batched infer")
+
+    monkeypatch.setattr(tts_module, "melo_batched_tts", broken)
+    calls.clear()
+    service.synthesize_to_file("四つ目。五つ目。", 1.0, "JP")
+    assert [call["text"] for call in calls] == ["四つ目。", "五つ目。"]